@@ -3,12 +3,10 @@ SmartQuail - IoT Dashboard for Quail House Monitoring
 Apple-inspired UI, bilingual (ID/EN), Supabase + MQTT.
 """
 
+import time
 from datetime import datetime
 
 import streamlit as st
-import pandas as pd
-import plotly.graph_objects as go
-from plotly.subplots import make_subplots
 
 from config import (
     REFRESH_INTERVAL_SEC,
@@ -179,9 +177,15 @@ def render_trend_chart(history: list, lang: str):
     if not history:
         st.info(t("no_data", lang))
         return
+    # Heavy imports deferred to first chart so the page shell paints fast
+    import pandas as pd
+    import plotly.graph_objects as go
+    from plotly.subplots import make_subplots
+
     df = pd.DataFrame(history)
-    df["created_at"] = pd.to_datetime(df["created_at"])
-    df = df.sort_values("created_at")
+    # int64 epoch ms -> datetime64 is a cast, not a string parse
+    df = df.sort_values("sampled_ms")
+    df["created_at"] = pd.to_datetime(df["sampled_ms"].astype("int64"), unit="ms", utc=True)
     fig = make_subplots(
         rows=2, cols=1,
         shared_xaxes=True,
@@ -204,6 +208,8 @@ def render_trend_chart(history: list, lang: str):
 
 
 def render_thi_gauge(thi_val: float, lang: str):
+    import plotly.graph_objects as go
+
     if thi_val is None:
         thi_val = 0
     if thi_val <= THI_NORMAL_MAX:
@@ -260,7 +266,7 @@ if not latest and not SUPABASE_URL:
         "thi": 78.9,
         "relay": "ON",
         "status": "OK",
-        "created_at": datetime.utcnow().isoformat(),
+        "sampled_ms": int(time.time() * 1000),
     }
 
 render_kpis(latest or {}, lang)
@@ -273,9 +279,9 @@ render_trend_chart(history, lang)
 st.markdown(f'<p class="section-title">📊 {t("gauge_title", lang)}</p>', unsafe_allow_html=True)
 render_thi_gauge(thi_val, lang)
 
-if latest and latest.get("created_at"):
+if latest and latest.get("sampled_ms"):
     try:
-        ts = pd.to_datetime(latest["created_at"])
+        ts = datetime.fromtimestamp(latest["sampled_ms"] / 1000)
         st.caption(f"{t('last_update', lang)}: {ts.strftime('%H:%M:%S')} ({t('device', lang)}: {latest.get('device','-')})")
     except Exception:
         pass
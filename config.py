@@ -2,6 +2,7 @@
 # Set SUPABASE_URL and SUPABASE_KEY in Streamlit Cloud Secrets or .env
 
 import os
+import tempfile
 from dotenv import load_dotenv
 
 load_dotenv()
@@ -16,6 +17,14 @@ MQTT_PORT = int(os.getenv("MQTT_PORT", "1883"))
 MQTT_TOPIC = os.getenv("MQTT_TOPIC", "iot/smartquail/dht")
 MQTT_KEEPALIVE = 60
 
+# Leader election: only one replica ingests MQTT (file | db | none)
+LEADER_BACKEND = os.getenv("LEADER_BACKEND", "file")
+LEADER_LOCK_FILE = os.getenv("LEADER_LOCK_FILE", os.path.join(tempfile.gettempdir(), "smartquail-ingest.lock"))
+LEADER_LEASE_SEC = int(os.getenv("LEADER_LEASE_SEC", "10"))
+LEADER_RENEW_SEC = float(os.getenv("LEADER_RENEW_SEC", "3"))
+# Leader steps down this long before its lease would expire (default: one renew interval)
+LEADER_MARGIN_SEC = float(os.getenv("LEADER_MARGIN_SEC", str(LEADER_RENEW_SEC)))
+
 # App
 REFRESH_INTERVAL_SEC = 2
 HISTORY_HOURS = 24
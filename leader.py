@@ -0,0 +1,182 @@
+"""
+SmartQuail - single-writer leader election for the embedded MQTT listener.
+Several Streamlit replicas may run app.py; only the replica holding the
+ingest lease subscribes and writes. Standbys retry every LEADER_RENEW_SEC
+and take over once the leader dies (file lock) or its lease expires (DB).
+The leader steps down LEADER_MARGIN_SEC before its lease could expire,
+counted from when its last successful renew request was sent, and each
+acquire/renew call gets a deadline so a hung backend cannot delay that.
+
+Backends (LEADER_BACKEND):
+  file - fcntl lock on LEADER_LOCK_FILE; replicas on one host / local volume.
+         The OS releases the lock the moment the leader process dies.
+  db   - lease row in Supabase (see README); replicas on different hosts.
+         PostgREST pools connections, so session advisory locks cannot be
+         held across calls; a TTL lease renewed by the leader is used instead.
+  none - every replica ingests (old behaviour, single replica only).
+"""
+
+import os
+import socket
+import threading
+import time
+import uuid
+from typing import Callable, Optional
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+
+from config import (
+    LEADER_BACKEND,
+    LEADER_LOCK_FILE,
+    LEADER_LEASE_SEC,
+    LEADER_MARGIN_SEC,
+    LEADER_RENEW_SEC,
+)
+
+LEASE_NAME = "mqtt-ingest"
+
+
+class FileLease:
+    """Exclusive non-blocking flock; held for as long as the process lives."""
+
+    def __init__(self, path: str):
+        self.path = path
+        self._fd: Optional[int] = None
+
+    def acquire_or_renew(self) -> bool:
+        if self._fd is not None:
+            return True
+        if fcntl is None:
+            return True
+        fd = os.open(self.path, os.O_RDWR | os.O_CREAT, 0o644)
+        try:
+            fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            os.close(fd)
+            return False
+        os.ftruncate(fd, 0)
+        os.write(fd, f"{socket.gethostname()} pid={os.getpid()}\n".encode())
+        self._fd = fd
+        return True
+
+    def release(self):
+        if self._fd is not None:
+            try:
+                fcntl.flock(self._fd, fcntl.LOCK_UN)
+            finally:
+                os.close(self._fd)
+                self._fd = None
+
+
+class DbLease:
+    """TTL lease row in Supabase, acquired/renewed atomically by an RPC."""
+
+    def __init__(self, holder: str, ttl_sec: int):
+        self.holder = holder
+        self.ttl_sec = ttl_sec
+
+    def acquire_or_renew(self) -> bool:
+        from supabase_client import get_client
+
+        client = get_client()
+        if not client:
+            return False
+        r = client.rpc(
+            "try_acquire_lease",
+            {"p_name": LEASE_NAME, "p_holder": self.holder, "p_ttl_sec": self.ttl_sec},
+        ).execute()
+        return bool(r.data)
+
+    def release(self):
+        from supabase_client import get_client
+
+        client = get_client()
+        if client:
+            client.rpc("release_lease", {"p_name": LEASE_NAME, "p_holder": self.holder}).execute()
+
+
+class LeaderElector:
+    """Background loop that starts ingest on winning the lease and stops it on losing."""
+
+    def __init__(self, lease, on_elected: Callable[[], None], on_demoted: Callable[[], None],
+                 renew_sec: float = LEADER_RENEW_SEC, lease_sec: float = LEADER_LEASE_SEC,
+                 margin_sec: float = LEADER_MARGIN_SEC):
+        self.lease = lease
+        self.on_elected = on_elected
+        self.on_demoted = on_demoted
+        self.renew_sec = renew_sec
+        self.lease_sec = lease_sec
+        self.margin_sec = margin_sec
+        self.is_leader = False
+        self._step_down_at = 0.0
+        self._call: Optional[threading.Thread] = None
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="leader-elector", daemon=True)
+
+    def start(self):
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join(timeout=self.renew_sec + 1)
+        if self.is_leader:
+            self._demote()
+        self.lease.release()
+
+    def _run(self):
+        while not self._stop.is_set():
+            sent = time.monotonic()
+            timeout = self.renew_sec
+            if self.is_leader:
+                timeout = min(timeout, self._step_down_at - sent)
+            held = self._acquire(timeout) if timeout > 0 else None
+            now = time.monotonic()
+            if held:
+                # The backend starts the TTL after it receives the request,
+                # so counting from when it was sent is on the safe side
+                self._step_down_at = sent + self.lease_sec - self.margin_sec
+                if not self.is_leader:
+                    self.is_leader = True
+                    self.on_elected()
+            elif self.is_leader and (held is False or now >= self._step_down_at):
+                # Lost the lease, or could not renew in time: step down
+                # before it can expire so two replicas never write at once.
+                self._demote()
+            wait = self.renew_sec
+            if self.is_leader:
+                wait = min(wait, max(self._step_down_at - now, 0.0))
+            self._stop.wait(wait)
+
+    def _acquire(self, timeout: float) -> Optional[bool]:
+        """lease.acquire_or_renew() with a deadline; None if it failed or is still running."""
+        if self._call is not None and self._call.is_alive():
+            return None  # previous call still hung
+        result = [None]
+
+        def call():
+            try:
+                result[0] = self.lease.acquire_or_renew()
+            except Exception:
+                pass  # unknown: backend unreachable
+
+        self._call = threading.Thread(target=call, name="leader-lease-call", daemon=True)
+        self._call.start()
+        self._call.join(timeout)
+        return None if self._call.is_alive() else result[0]
+
+    def _demote(self):
+        self.is_leader = False
+        self.on_demoted()
+
+
+def make_lease():
+    """Lease for LEADER_BACKEND, or None when election is disabled."""
+    if LEADER_BACKEND == "file":
+        return FileLease(LEADER_LOCK_FILE)
+    if LEADER_BACKEND == "db":
+        holder = f"{socket.gethostname()}-{os.getpid()}-{uuid.uuid4().hex[:8]}"
+        return DbLease(holder, LEADER_LEASE_SEC)
+    return None
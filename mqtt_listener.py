@@ -1,11 +1,13 @@
 """
 SmartQuail - MQTT subscriber. Receives messages from broker.hivemq.com
 topic: iot/smartquail/dht and saves to Supabase.
-Run in background thread from Streamlit.
+Run in background thread from Streamlit. With several replicas only the
+elected leader subscribes (see leader.py).
 """
 
 import json
 import threading
+import time
 from typing import Callable, Optional
 
 try:
@@ -15,6 +17,11 @@ except ImportError:
 
 from config import MQTT_BROKER, MQTT_PORT, MQTT_TOPIC, MQTT_KEEPALIVE
 from supabase_client import insert_reading
+from leader import LeaderElector, make_lease
+
+_lock = threading.Lock()
+_client = None
+_elector = None
 
 
 def _on_connect(client, userdata, flags, rc):
@@ -22,6 +29,16 @@ def _on_connect(client, userdata, flags, rc):
         client.subscribe(MQTT_TOPIC)
 
 
+def _sample_ms(ts) -> Optional[int]:
+    """Device ts (epoch s or ms) in ms if it is within 5 min of our clock, else None (= now)"""
+    try:
+        ts = float(ts)
+    except (TypeError, ValueError):
+        return None
+    ms = int(ts if ts >= 1e12 else ts * 1000)
+    return ms if abs(ms - time.time() * 1000) <= 300_000 else None
+
+
 def _on_message(client, userdata, msg):
     try:
         payload = json.loads(msg.payload.decode())
@@ -31,23 +48,53 @@ def _on_message(client, userdata, msg):
         thi = float(payload.get("thi", 0))
         relay = str(payload.get("relay", "OFF")).upper()
         status = str(payload.get("status", "OK"))
-        insert_reading(device, temp, rh, thi, relay, status)
+        insert_reading(device, temp, rh, thi, relay, status, _sample_ms(payload.get("ts")))
     except Exception:
         pass
 
 
-def start_mqtt_thread():
-    """Start MQTT subscriber in a daemon thread. Idempotent."""
-    if not mqtt:
-        return
-    if getattr(start_mqtt_thread, "_started", False):
-        return
+def _start_client():
+    """Connect and subscribe (called when this replica becomes leader)."""
+    global _client
     client = mqtt.Client()
     client.on_connect = _on_connect
     client.on_message = _on_message
     try:
         client.connect(MQTT_BROKER, MQTT_PORT, MQTT_KEEPALIVE)
         client.loop_start()
-        start_mqtt_thread._started = True
+        _client = client
     except Exception:
         pass
+
+
+def _stop_client():
+    """Stop ingesting (called when this replica loses the lease)."""
+    global _client
+    if _client is not None:
+        try:
+            _client.loop_stop()
+            _client.disconnect()
+        except Exception:
+            pass
+        _client = None
+
+
+def is_ingest_leader() -> bool:
+    """True if this process is currently the one writing MQTT data."""
+    return _client is not None
+
+
+def start_mqtt_thread():
+    """Start MQTT subscriber (behind leader election) in a daemon thread. Idempotent."""
+    global _elector
+    if not mqtt:
+        return
+    with _lock:
+        if _elector is not None or _client is not None:
+            return
+        lease = make_lease()
+        if lease is None:
+            _start_client()
+            return
+        _elector = LeaderElector(lease, on_elected=_start_client, on_demoted=_stop_client)
+        _elector.start()
@@ -0,0 +1,328 @@
+"""
+SmartQuail Alert Engine
+=======================
+Server-side alerts evaluated in the bridge as readings stream in
+
+Each reading is checked against a fixed list of threshold rules, so the
+cost per reading is constant no matter how many devices exist. Every
+(device, rule) pair has a small state machine:
+
+- hysteresis: once firing, a rule clears only after the value crosses the
+  clear level (threshold -/+ ALERT_HYSTERESIS), not the threshold itself
+- debounce:   a breach must last ALERT_DEBOUNCE_SEC before it fires
+- cooldown:   the same rule on the same device notifies at most once per
+  ALERT_COOLDOWN_SEC, so a flapping sensor cannot spam
+
+Device silence (no message for ALERT_SILENCE_SEC; sensor errors still
+count as messages) is checked by a periodic tick. Readings that are
+SENSOR_ERROR or flagged stuck/jump skip the threshold rules and drive the
+sensor_fault rule instead. Notifications go to pluggable sinks; WebhookSink posts
+JSON from a background thread so ingest is never blocked.
+
+Local webhook stand-in (prints whatever the bridge posts):
+    python alerts.py --serve 8765
+    ALERT_WEBHOOK_URL=http://127.0.0.1:8765/alerts python mqtt_bridge.py
+"""
+
+import json
+import math
+import queue
+import threading
+import time
+import urllib.request
+from datetime import datetime
+from http.server import BaseHTTPRequestHandler, HTTPServer
+from typing import Any, Dict, List, Optional, Tuple
+
+import config
+import telemetry
+
+ALERTS_SENT = telemetry.counter("smartquail_alerts_total", "Alert notifications by rule and state")
+
+
+# =============================================================================
+# RULES
+# =============================================================================
+class ThresholdRule:
+    """Fires when metric goes above (or below) threshold; clears past the clear level"""
+
+    __slots__ = ("name", "metric", "above", "threshold", "clear", "severity")
+
+    def __init__(self, name: str, metric: str, threshold: float, above: bool = True,
+                 severity: str = "warning", hysteresis: Optional[float] = None):
+        if hysteresis is None:
+            hysteresis = config.ALERT_HYSTERESIS.get(metric, 0.0)
+        self.name = name
+        self.metric = metric
+        self.above = above
+        self.threshold = threshold
+        self.clear = threshold - hysteresis if above else threshold + hysteresis
+        self.severity = severity
+
+    def breached(self, value: float, active: bool) -> bool:
+        limit = self.clear if active else self.threshold
+        return value > limit if self.above else value < limit
+
+
+def default_rules() -> List[ThresholdRule]:
+    """THI levels and the optimal temperature/humidity band from config"""
+    return [
+        ThresholdRule("thi_warning", "thi", config.THI_WARNING, severity="warning"),
+        ThresholdRule("thi_danger", "thi", config.THI_DANGER, severity="critical"),
+        ThresholdRule("temp_high", "temp", config.TEMP_MAX_OPTIMAL, severity="warning"),
+        ThresholdRule("temp_low", "temp", config.TEMP_MIN_OPTIMAL, above=False, severity="warning"),
+        ThresholdRule("rh_high", "rh", config.HUMIDITY_MAX_OPTIMAL, severity="info"),
+        ThresholdRule("rh_low", "rh", config.HUMIDITY_MIN_OPTIMAL, above=False, severity="info"),
+        # Early warning: forecast (FORECAST_HORIZON_MIN ahead) crosses THI_WARNING
+        ThresholdRule("thi_forecast_warning", "thi_forecast", config.THI_WARNING, severity="info", hysteresis=1.0),
+    ]
+
+
+class _RuleState:
+    __slots__ = ("active", "pending_since", "last_notified", "notified")
+
+    def __init__(self):
+        self.active = False
+        self.pending_since: Optional[float] = None
+        self.last_notified = float("-inf")
+        self.notified = False
+
+
+# =============================================================================
+# SINKS
+# =============================================================================
+class NotificationSink:
+    """Receives alert dicts; send() must not block the ingest thread"""
+
+    def send(self, alert: Dict[str, Any]):
+        raise NotImplementedError
+
+
+class ConsoleSink(NotificationSink):
+    def send(self, alert: Dict[str, Any]):
+        icon = "🚨" if alert["state"] == "firing" else "✅"
+        print(f"[{icon}] ALERT {alert['state'].upper()} {alert['device']} {alert['rule']}: {alert['message']}")
+
+
+class WebhookSink(NotificationSink):
+    """POSTs each alert as JSON from a background worker with a bounded queue"""
+
+    def __init__(self, url: str, timeout: float = 5.0, max_queue: int = 1000):
+        self.url = url
+        self.timeout = timeout
+        self._queue: "queue.Queue[Dict[str, Any]]" = queue.Queue(maxsize=max_queue)
+        threading.Thread(target=self._worker, name="alert-webhook", daemon=True).start()
+
+    def send(self, alert: Dict[str, Any]):
+        try:
+            self._queue.put_nowait(alert)
+        except queue.Full:
+            print(f"[⚠️] Alert webhook queue full, dropped {alert['rule']} for {alert['device']}")
+
+    def _worker(self):
+        while True:
+            alert = self._queue.get()
+            request = urllib.request.Request(
+                self.url,
+                data=json.dumps(alert).encode(),
+                headers={"Content-Type": "application/json"},
+                method="POST",
+            )
+            try:
+                urllib.request.urlopen(request, timeout=self.timeout).close()
+            except Exception as e:
+                print(f"[❌] Alert webhook failed: {e}")
+
+
+# =============================================================================
+# ENGINE
+# =============================================================================
+class AlertEngine:
+    """Evaluates rules per reading and device silence per tick"""
+
+    def __init__(self, sinks: List[NotificationSink], rules: Optional[List[ThresholdRule]] = None,
+                 device_rules: Optional[Dict[str, List[ThresholdRule]]] = None,
+                 debounce_sec: float = config.ALERT_DEBOUNCE_SEC,
+                 cooldown_sec: float = config.ALERT_COOLDOWN_SEC,
+                 silence_sec: float = config.ALERT_SILENCE_SEC):
+        self.sinks = sinks
+        self.rules = rules if rules is not None else default_rules()
+        self.device_rules = device_rules or {}
+        self.debounce_sec = debounce_sec
+        self.cooldown_sec = cooldown_sec
+        self.silence_sec = silence_sec
+        self._state: Dict[Tuple[str, str], _RuleState] = {}
+        self._last_seen: Dict[str, float] = {}
+        self._silent: Dict[str, _RuleState] = {}
+        self._lock = threading.Lock()
+
+    def seen(self, device: str, now: Optional[float] = None):
+        """
+        Mark device as alive; call for every message it sends, sensor
+        errors included, so only a device that stops talking goes silent.
+        """
+        now = time.time() if now is None else now
+        alert = None
+        with self._lock:
+            self._last_seen[device] = now
+            silent = self._silent.get(device)
+            if silent is not None and silent.active:
+                alert = self._transition(device, "device_silent", silent, False, now,
+                                         "critical", None, "device is reporting again")
+        self._dispatch([alert])
+
+    def evaluate_sensor(self, device: str, fault: Optional[str], now: Optional[float] = None):
+        """
+        sensor_fault rule for one reading: fault is what is wrong with it
+        (SENSOR_ERROR, or stuck/jump flags), None for a good reading. Fires
+        once faults last ALERT_DEBOUNCE_SEC and clears once good readings
+        do, with the usual cooldown.
+        """
+        now = time.time() if now is None else now
+        alert = None
+        with self._lock:
+            state = self._state.get((device, "sensor_fault"))
+            if state is None:
+                state = self._state[(device, "sensor_fault")] = _RuleState()
+            if (fault is not None) == state.active:
+                state.pending_since = None
+            else:
+                if state.pending_since is None:
+                    state.pending_since = now
+                if now - state.pending_since >= self.debounce_sec:
+                    message = f"sensor fault: {fault}" if fault is not None else "sensor readings are valid again"
+                    alert = self._transition(device, "sensor_fault", state, fault is not None, now,
+                                             "critical", None, message)
+        self._dispatch([alert])
+
+    def evaluate(self, device: str, reading: Dict[str, Any], now: Optional[float] = None):
+        """Evaluate all threshold rules for one valid reading; O(number of rules)"""
+        now = time.time() if now is None else now
+        self.seen(device, now)
+        alerts = []
+        with self._lock:
+            for rule in self.device_rules.get(device, self.rules):
+                try:
+                    value = float(reading.get(rule.metric))
+                except (TypeError, ValueError):
+                    continue
+                if math.isnan(value):
+                    continue
+                state = self._state.get((device, rule.name))
+                if state is None:
+                    state = self._state[(device, rule.name)] = _RuleState()
+
+                if rule.breached(value, state.active):
+                    if state.active:
+                        continue
+                    if state.pending_since is None:
+                        state.pending_since = now
+                    if now - state.pending_since >= self.debounce_sec:
+                        op = ">" if rule.above else "<"
+                        alerts.append(self._transition(device, rule.name, state, True, now, rule.severity,
+                                                       value, f"{rule.metric} {value:g} {op} {rule.threshold:g}"))
+                else:
+                    state.pending_since = None
+                    if state.active:
+                        alerts.append(self._transition(device, rule.name, state, False, now, rule.severity,
+                                                       value, f"{rule.metric} back to {value:g}"))
+        self._dispatch(alerts)
+
+    def tick(self, now: Optional[float] = None):
+        """Check every known device for silence; call every few seconds"""
+        now = time.time() if now is None else now
+        alerts = []
+        with self._lock:
+            for device, last_seen in self._last_seen.items():
+                state = self._silent.get(device)
+                if state is None:
+                    state = self._silent[device] = _RuleState()
+                if not state.active and now - last_seen > self.silence_sec:
+                    alerts.append(self._transition(device, "device_silent", state, True, now, "critical", None,
+                                                   f"no message for {int(now - last_seen)} s"))
+        self._dispatch(alerts)
+
+    def run_silence_watch(self, interval: float = 5.0):
+        """Start a daemon thread calling tick() every interval seconds"""
+        def loop():
+            while True:
+                time.sleep(interval)
+                self.tick()
+
+        threading.Thread(target=loop, name="alert-silence-watch", daemon=True).start()
+
+    def _transition(self, device: str, rule: str, state: _RuleState, firing: bool, now: float,
+                    severity: str, value: Optional[float], message: str) -> Optional[Dict[str, Any]]:
+        """Flip state; return the alert to send, or None if suppressed by cooldown"""
+        state.active = firing
+        state.pending_since = None
+        if firing:
+            if now - state.last_notified < self.cooldown_sec:
+                state.notified = False
+                return None
+            state.last_notified = now
+            state.notified = True
+        elif not state.notified:
+            # Firing was never announced, so stay quiet on resolve too
+            return None
+        else:
+            state.notified = False
+        return {
+            "device": device,
+            "rule": rule,
+            "severity": severity,
+            "state": "firing" if firing else "resolved",
+            "value": value,
+            "message": message,
+            "at": datetime.fromtimestamp(now).isoformat(timespec="seconds"),
+        }
+
+    def _dispatch(self, alerts: List[Optional[Dict[str, Any]]]):
+        for alert in alerts:
+            if alert is None:
+                continue
+            ALERTS_SENT.inc(rule=alert["rule"], state=alert["state"])
+            for sink in self.sinks:
+                try:
+                    sink.send(alert)
+                except Exception as e:
+                    print(f"[❌] Alert sink {type(sink).__name__} failed: {e}")
+
+
+def build_engine() -> AlertEngine:
+    """Engine with the console sink plus a webhook if ALERT_WEBHOOK_URL is set"""
+    sinks: List[NotificationSink] = [ConsoleSink()]
+    if config.ALERT_WEBHOOK_URL:
+        sinks.append(WebhookSink(config.ALERT_WEBHOOK_URL))
+    return AlertEngine(sinks)
+
+
+# =============================================================================
+# LOCAL WEBHOOK STAND-IN
+# =============================================================================
+class _WebhookReceiver(BaseHTTPRequestHandler):
+    def do_POST(self):
+        body = self.rfile.read(int(self.headers.get("Content-Length", 0)))
+        print(f"[📨] {self.path} {body.decode(errors='replace')}")
+        self.send_response(204)
+        self.end_headers()
+
+    def log_message(self, format, *args):
+        pass
+
+
+def serve_webhook(port: int):
+    """Print every alert POSTed to http://127.0.0.1:<port>/"""
+    print(f"[🚀] Webhook stand-in listening on http://127.0.0.1:{port}/alerts")
+    HTTPServer(("127.0.0.1", port), _WebhookReceiver).serve_forever()
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="SmartQuail alert webhook stand-in")
+    parser.add_argument("--serve", type=int, default=8765, metavar="PORT")
+    try:
+        serve_webhook(parser.parse_args().serve)
+    except KeyboardInterrupt:
+        print("\n[👋] Stopped.")
@@ -0,0 +1,160 @@
+"""
+SmartQuail Analytics
+====================
+Vectorized analytics over the per-minute rollups (sensor_rollup_1m)
+
+Rollups hold one row per device per minute regardless of how often the
+ESP32 reports, so results do not depend on the sampling rate and a month
+of data is at most ~43k rows. Short windows can also be analysed from raw
+reading timestamps (data_gaps).
+"""
+
+from datetime import datetime, timezone
+from typing import Any, Dict, Optional, Sequence, TYPE_CHECKING
+
+import numpy as np
+
+import config
+
+if TYPE_CHECKING:
+    import pandas as pd
+
+
+# =============================================================================
+# RELAY DUTY CYCLE
+# =============================================================================
+def _runs(values: np.ndarray, breaks: np.ndarray):
+    """Start index and length of runs of equal values; breaks[i] forces a new run at i"""
+    change = np.empty(len(values), dtype=bool)
+    change[0] = True
+    change[1:] = (values[1:] != values[:-1]) | breaks[1:]
+    starts = np.flatnonzero(change)
+    lengths = np.diff(np.append(starts, len(values)))
+    return starts, lengths
+
+
+def relay_duty_cycle(rollups: "pd.DataFrame", watts: float = config.RELAY_LOAD_WATTS) -> Dict[str, Any]:
+    """
+    Relay on-time, switch cycles and energy from 1-minute rollups.
+
+    rollups needs columns bucket (datetime), n and relay_on. A minute counts
+    toward on-time by its fraction of ON samples; for run lengths a minute is
+    ON when at least half its samples were. A missing minute ends a run, so
+    gaps in the data are never counted as on or off time.
+    """
+    import pandas as pd
+
+    empty = {
+        "on_minutes": 0.0, "covered_minutes": 0, "duty_cycle": 0.0, "cycles": 0,
+        "mean_on_minutes": 0.0, "mean_cycle_minutes": 0.0, "energy_kwh": 0.0,
+        "hourly": pd.Series(dtype=float), "daily": pd.Series(dtype=float),
+    }
+    if rollups is None or rollups.empty:
+        return empty
+
+    df = rollups.sort_values("bucket")
+    buckets = pd.to_datetime(df["bucket"], utc=True)
+    n = df["n"].to_numpy(dtype=float)
+    fraction = np.divide(df["relay_on"].to_numpy(dtype=float), n, out=np.zeros_like(n), where=n > 0)
+    minute = (buckets.to_numpy(dtype="datetime64[m]").astype(np.int64))
+
+    on = fraction >= 0.5
+    gap = np.empty(len(minute), dtype=bool)
+    gap[0] = False
+    gap[1:] = np.diff(minute) > 1
+    starts, lengths = _runs(on, gap)
+    on_runs = on[starts]
+
+    # Switch-on to next switch-on, only within a stretch without gaps
+    on_starts = starts[on_runs]
+    segment = np.cumsum(gap)[on_starts]
+    periods = np.diff(minute[on_starts])[np.diff(segment) == 0]
+
+    on_minutes = float(fraction.sum())
+    per_minute = pd.Series(fraction, index=buckets.to_numpy())
+    return {
+        "on_minutes": round(on_minutes, 1),
+        "covered_minutes": int(len(minute)),
+        "duty_cycle": round(on_minutes / len(minute), 3),
+        "cycles": int(on_runs.sum()),
+        "mean_on_minutes": round(float(lengths[on_runs].mean()), 1) if on_runs.any() else 0.0,
+        "mean_cycle_minutes": round(float(periods.mean()), 1) if len(periods) else 0.0,
+        "energy_kwh": round(on_minutes / 60 * watts / 1000, 3),
+        "hourly": per_minute.resample("1h").sum(),
+        "daily": per_minute.resample("1D").sum(),
+    }
+
+
+# =============================================================================
+# DATA GAPS / UPTIME
+# =============================================================================
+def _gap_report(starts: np.ndarray, ends: np.ndarray, window_sec: float, messages: int,
+                last_seen: Optional[float]) -> Dict[str, Any]:
+    durations = ends - starts
+    gap_sec = float(durations.sum())
+    covered_min = max(window_sec - gap_sec, 0.0) / 60
+    return {
+        "uptime_pct": round(100 * (1 - gap_sec / window_sec), 1) if window_sec > 0 else 0.0,
+        "gap_count": int(len(durations)),
+        "gap_minutes": round(gap_sec / 60, 1),
+        "longest_gap_min": round(float(durations.max()) / 60, 1) if len(durations) else 0.0,
+        "gaps": [
+            {"start": datetime.fromtimestamp(a, timezone.utc), "end": datetime.fromtimestamp(b, timezone.utc),
+             "minutes": round((b - a) / 60, 1)}
+            for a, b in zip(starts.tolist(), ends.tolist())
+        ],
+        "messages": int(messages),
+        "rate_per_min": round(messages / covered_min, 2) if covered_min > 0 else 0.0,
+        "expected_rate_per_min": round(60 / config.EXPECTED_INTERVAL_SEC, 2),
+        "last_seen": datetime.fromtimestamp(last_seen, timezone.utc) if last_seen is not None else None,
+    }
+
+
+def data_gaps(timestamps: Sequence, window_start: float, window_end: float,
+              min_gap_sec: float = config.GAP_MIN_SEC) -> Dict[str, Any]:
+    """
+    Gaps, uptime and message rate from raw reading times (epoch seconds or datetimes).
+
+    A gap is any silence longer than min_gap_sec between two readings, or
+    between the window edges and the first/last reading.
+    """
+    import pandas as pd
+
+    values = np.asarray(timestamps)
+    if not len(values):
+        ts = np.empty(0)
+    elif values.dtype.kind in "iuf":
+        ts = np.sort(values.astype(float))
+    else:
+        ts = np.sort(pd.to_datetime(pd.Series(timestamps), utc=True).to_numpy(dtype="datetime64[ms]")
+                     .astype(np.int64) / 1000.0)
+    ts = ts[(ts >= window_start) & (ts <= window_end)]
+    edges = np.concatenate(([window_start], ts, [window_end]))
+    silence = np.diff(edges)
+    mask = silence > min_gap_sec
+    return _gap_report(edges[:-1][mask], edges[1:][mask], window_end - window_start,
+                       len(ts), float(ts[-1]) if len(ts) else None)
+
+
+def rollup_gaps(rollups: "pd.DataFrame", window_start: float, window_end: float,
+                min_gap_sec: float = config.GAP_MIN_SEC) -> Dict[str, Any]:
+    """
+    Same report from 1-minute rollups (bucket, n), for long windows.
+
+    Resolution is one minute: a gap is a run of minutes without any reading.
+    """
+    import pandas as pd
+
+    if rollups is None or rollups.empty:
+        return data_gaps([], window_start, window_end, min_gap_sec)
+    df = rollups.sort_values("bucket")
+    starts = pd.to_datetime(df["bucket"], utc=True).to_numpy(dtype="datetime64[s]").astype(np.int64).astype(float)
+    keep = (starts + 60 > window_start) & (starts <= window_end)
+    starts, n = starts[keep], df["n"].to_numpy()[keep]
+    # Each bucket covers [start, start + 60); silence lies between covered minutes
+    edges_from = np.concatenate(([window_start], np.minimum(starts + 60, window_end)))
+    edges_to = np.concatenate((np.maximum(starts, window_start), [window_end]))
+    silence = edges_to - edges_from
+    mask = silence > min_gap_sec
+    last_seen = float(min(starts[-1] + 59, window_end)) if len(starts) else None
+    return _gap_report(edges_from[mask], edges_to[mask], window_end - window_start, int(n.sum()), last_seen)
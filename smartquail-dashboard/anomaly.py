@@ -0,0 +1,115 @@
+"""
+SmartQuail Streaming Anomaly Detection
+======================================
+Flags or drops bad sensor samples before they are written
+
+Runs per device in the ingest path with O(1) work per reading:
+- invalid:  NaN, out of physical range or a 0 reading from a failed DHT read -> dropped
+- stuck:    the same value repeated ANOMALY_STUCK_COUNT times in a row     -> flagged
+- jump:     change faster than the metric can physically move              -> flagged
+- outlier:  rolling (EWMA) z-score above ANOMALY_ZSCORE                    -> flagged
+
+Flags are stored as "metric:kind" pairs, e.g. "temp:stuck,rh:jump".
+"stuck" and "jump" indicate a faulty sensor and are excluded from
+statistics; "outlier" only marks a suspect reading (it may be a real heat
+spike, so it is kept).
+"""
+
+import math
+import threading
+from typing import Dict, List, Optional, Tuple
+
+import config
+
+METRICS = ("temp", "rh", "thi")
+FAULT_KINDS = ("stuck", "jump")
+
+
+class _MetricState:
+    """EWMA mean/variance, last value/time and repeat count for one metric"""
+
+    __slots__ = ("n", "mean", "var", "last", "last_t", "repeats")
+
+    def __init__(self):
+        self.n = 0
+        self.mean = 0.0
+        self.var = 0.0
+        self.last: Optional[float] = None
+        self.last_t: Optional[float] = None
+        self.repeats = 0
+
+
+class StreamingDetector:
+    """Per-device streaming checks; state is a few floats per metric"""
+
+    def __init__(self,
+                 alpha: float = config.ANOMALY_EWMA_ALPHA,
+                 zscore: float = config.ANOMALY_ZSCORE,
+                 warmup: int = config.ANOMALY_WARMUP,
+                 stuck_count: int = config.ANOMALY_STUCK_COUNT):
+        self.alpha = alpha
+        self.zscore = zscore
+        self.warmup = warmup
+        self.stuck_count = stuck_count
+        self._state: Dict[str, Dict[str, _MetricState]] = {}
+        self._lock = threading.Lock()
+
+    def check(self, device: str, reading: Dict[str, float], t: float) -> Tuple[bool, List[str]]:
+        """
+        Update state with one reading taken at t (epoch seconds).
+
+        Returns (drop, flags). Dropped readings do not update the baseline.
+        """
+        flags: List[str] = []
+        with self._lock:
+            states = self._state.setdefault(device, {m: _MetricState() for m in METRICS})
+            for metric in METRICS:
+                value = reading.get(metric)
+                low, high = config.ANOMALY_VALID_RANGE[metric]
+                if value is None or math.isnan(value) or not low <= value <= high:
+                    flags.append(f"{metric}:invalid")
+            if flags:
+                return True, flags
+
+            for metric in METRICS:
+                flags.extend(f"{metric}:{kind}" for kind in self._update(states[metric], metric, reading[metric], t))
+        return False, flags
+
+    def _update(self, s: _MetricState, metric: str, value: float, t: float) -> List[str]:
+        kinds = []
+
+        # Stuck sensor: identical value over and over
+        if s.last is not None and value == s.last:
+            s.repeats += 1
+            if s.repeats >= self.stuck_count:
+                kinds.append("stuck")
+        else:
+            s.repeats = 0
+
+        # Rate of change: noise tolerance + max physical rate * elapsed minutes
+        if s.last is not None and s.last_t is not None:
+            minutes = max(t - s.last_t, 0.0) / 60
+            rate, tolerance = config.ANOMALY_MAX_RATE[metric]
+            if abs(value - s.last) > tolerance + rate * minutes:
+                kinds.append("jump")
+
+        # Rolling z-score against the EWMA baseline (checked before updating it)
+        if s.n >= self.warmup and s.var > 0:
+            if abs(value - s.mean) / math.sqrt(s.var) > self.zscore:
+                kinds.append("outlier")
+
+        if s.n == 0:
+            s.mean = value
+        else:
+            delta = value - s.mean
+            s.mean += self.alpha * delta
+            s.var = (1 - self.alpha) * (s.var + self.alpha * delta * delta)
+        s.n += 1
+        s.last = value
+        s.last_t = t
+        return kinds
+
+
+def has_fault(flags: Optional[str]) -> bool:
+    """True if a stored flags string marks the reading as a sensor fault"""
+    return isinstance(flags, str) and any(f.endswith(f":{kind}") for f in flags.split(",") for kind in FAULT_KINDS)
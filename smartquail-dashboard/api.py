@@ -0,0 +1,312 @@
+"""
+SmartQuail Read API
+===================
+Small JSON API over database.py for the Flutter app on slow farm links
+
+Endpoints (all GET, device defaults to DEFAULT_DEVICE):
+    /v1/latest?device=esp32-01
+    /v1/history?device=esp32-01&hours=24&points=200&since=<t ms>
+    /v1/stats?device=esp32-01&hours=24
+    /v1/fleet
+    /v1/devices
+    /metrics
+
+hours is rounded to whole quarter hours (0.25 at least).
+
+History is downsampled from the per-minute rollups into at most `points`
+bins aligned to fixed boundaries, returned column-wise:
+    {"step_ms": 300000, "t": [...], "temp": [...], "rh": [...], "thi": [...],
+     "thi_max": [...], "relay": [...]}
+where relay is the fraction of ON samples. With since=<last t the client
+has> only bins from that one on are sent (the last bin may still be
+filling, so it is repeated).
+
+Every response carries an ETag; If-None-Match answers 304 with no body.
+Bodies are gzipped when the client accepts it. Responses are cached for
+API_CACHE_TTL seconds and shared by all clients, so many phones polling
+the same device cost one database read per TTL.
+
+Usage:
+    python api.py                 # 0.0.0.0:8787
+    python api.py --port 9000 --host 127.0.0.1
+"""
+
+import gzip
+import hashlib
+import json
+import math
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Callable, Dict, Optional, Tuple
+from urllib.parse import parse_qs, urlsplit
+
+import config
+import telemetry
+
+API_REQUESTS = telemetry.counter("smartquail_api_requests_total", "Read API requests by endpoint and status")
+API_BYTES = telemetry.counter("smartquail_api_bytes_total", "Read API response body bytes sent")
+
+METRICS = ("temp", "rh", "thi")
+
+
+class BadRequest(ValueError):
+    pass
+
+
+# =============================================================================
+# PAYLOADS
+# =============================================================================
+def _hours(params: Dict[str, list], high: float) -> float:
+    """hours rounded to whole quarter hours, so clients can't mint endless cache keys"""
+    hours = _param(params, "hours", float, config.HISTORY_HOURS, 0.1, high)
+    return max(round(hours * 4) / 4, 0.25)
+
+
+def _param(params: Dict[str, list], name: str, cast: Callable, default: Any, low: float, high: float):
+    raw = params.get(name, [None])[0]
+    if raw is None:
+        return default
+    try:
+        value = cast(raw)
+    except ValueError:
+        raise BadRequest(f"{name} must be a number")
+    if not low <= value <= high:
+        raise BadRequest(f"{name} must be between {low} and {high}")
+    return value
+
+
+def downsample(rollups, start_ms: int, end_ms: int, points: int) -> Dict[str, Any]:
+    """Per-minute rollups -> column-wise bins of a fixed, whole-minute step"""
+    import numpy as np
+
+    step = max(1, math.ceil((end_ms - start_ms) / points / 60_000)) * 60_000
+    out: Dict[str, Any] = {"step_ms": step, "t": []}
+    if rollups is None or rollups.empty:
+        return {**out, **{m: [] for m in METRICS}, "thi_max": [], "relay": []}
+
+    bucket_ms = rollups["bucket"].to_numpy(dtype="datetime64[ms]").astype(np.int64)
+    # Bins aligned to multiples of step, so they don't shift between polls
+    bins = bucket_ms // step
+    first = bins.min()
+    idx = bins - first
+    size = int(idx.max()) + 1
+    n = np.bincount(idx, weights=rollups["n"].to_numpy(dtype=float), minlength=size)
+    has = n > 0
+    safe_n = np.where(has, n, 1)
+
+    out["t"] = ((np.arange(size) + first) * step)[has].tolist()
+    for m in METRICS:
+        sums = np.bincount(idx, weights=rollups[f"{m}_sum"].to_numpy(dtype=float), minlength=size)
+        out[m] = np.round(sums / safe_n, 1)[has].tolist()
+    thi_max = np.full(size, -np.inf)
+    np.maximum.at(thi_max, idx, rollups["thi_max"].to_numpy(dtype=float))
+    out["thi_max"] = np.round(thi_max, 1)[has].tolist()
+    relay = np.bincount(idx, weights=rollups["relay_on"].to_numpy(dtype=float), minlength=size)
+    out["relay"] = np.round(relay / safe_n, 2)[has].tolist()
+    return out
+
+
+def history_payload(device: str, hours: float, points: int) -> Dict[str, Any]:
+    import database as db
+
+    end_ms = int(time.time() * 1000)
+    payload = downsample(db.get_rollup_series(device, hours), end_ms - int(hours * 3_600_000), end_ms, points)
+    return {"device": device, "hours": hours, **payload}
+
+
+def since_slice(payload: Dict[str, Any], since: int) -> Dict[str, Any]:
+    """Bins of a history payload from t >= since on"""
+    import bisect
+
+    start = bisect.bisect_left(payload["t"], since)
+    return {k: v[start:] if isinstance(v, list) else v for k, v in payload.items()}
+
+
+def latest_payload(device: str) -> Dict[str, Any]:
+    import database as db
+
+    row = db.get_latest_data(device) or {}
+    keys = ("temp", "rh", "thi", "relay", "status", "flags", "thi_forecast", "thi_eta_min")
+    return {"device": device, "t": row.get("sampled_ms"), **{k: row.get(k) for k in keys},
+            "stale": db.get_backend_status()["stale"]}
+
+
+def stats_payload(device: str, hours: float) -> Dict[str, Any]:
+    import database as db
+
+    return {"device": device, "hours": hours, **db.get_statistics(device, hours)}
+
+
+def fleet_payload() -> Dict[str, Any]:
+    import database as db
+
+    keys = ("device", "temp", "rh", "thi", "relay", "status", "thi_eta_min", "updated_at")
+    return {"devices": [{k: row.get(k) for k in keys} for row in db.get_fleet_latest()]}
+
+
+def devices_payload() -> Dict[str, Any]:
+    import database as db
+
+    return {"devices": db.get_device_list()}
+
+
+# =============================================================================
+# RESPONSE CACHE
+# =============================================================================
+class Encoded:
+    """A JSON body with its ETag and (lazily) gzipped form"""
+
+    __slots__ = ("payload", "body", "etag", "_gz")
+
+    def __init__(self, payload: Dict[str, Any]):
+        self.payload = payload
+        self.body = json.dumps(payload, separators=(",", ":"), default=str).encode()
+        self.etag = '"' + hashlib.blake2b(self.body, digest_size=8).hexdigest() + '"'
+        self._gz: Optional[bytes] = None
+
+    def gzipped(self) -> bytes:
+        if self._gz is None:
+            self._gz = gzip.compress(self.body, compresslevel=6)
+        return self._gz
+
+
+class ResponseCache:
+    """Encoded responses by key for ttl seconds; one fetch per key at a time"""
+
+    def __init__(self, ttl: float = config.API_CACHE_TTL, max_keys: int = config.API_CACHE_MAX_KEYS):
+        self.ttl = ttl
+        self.max_keys = max_keys
+        self._entries: Dict[Tuple, Tuple[float, Encoded]] = {}
+        self._locks: Dict[Tuple, threading.Lock] = {}
+        self._lock = threading.Lock()
+
+    def get(self, key: Tuple, build: Callable[[], Dict[str, Any]]) -> Encoded:
+        entry = self._entries.get(key)
+        if entry is not None and entry[0] > time.monotonic():
+            telemetry.CACHE_REQUESTS.inc(cache="api", result="hit")
+            return entry[1]
+        with self._lock:
+            key_lock = self._locks.setdefault(key, threading.Lock())
+        with key_lock:
+            # Another request may have refreshed it while we waited
+            entry = self._entries.get(key)
+            if entry is not None and entry[0] > time.monotonic():
+                telemetry.CACHE_REQUESTS.inc(cache="api", result="hit")
+                return entry[1]
+            telemetry.CACHE_REQUESTS.inc(cache="api", result="miss")
+            encoded = Encoded(build())
+            with self._lock:
+                self._entries.pop(key, None)
+                self._entries[key] = (time.monotonic() + self.ttl, encoded)
+                if len(self._entries) > self.max_keys:
+                    self._evict(key)
+            return encoded
+
+    def _evict(self, keep: Tuple):
+        """Drop expired entries, then the oldest, and idle locks of keys no longer cached"""
+        now = time.monotonic()
+        live = [(k, v) for k, v in self._entries.items() if v[0] > now]
+        self._entries = dict(live[-self.max_keys:])
+        for key, lock in list(self._locks.items()):
+            if key != keep and key not in self._entries and not lock.locked():
+                del self._locks[key]
+
+
+cache = ResponseCache()
+
+
+def respond(path: str, params: Dict[str, list]) -> Encoded:
+    """Encoded response for a route; raises KeyError for unknown paths, BadRequest for bad params"""
+    device = params.get("device", [config.DEFAULT_DEVICE])[0]
+    if path == "/v1/latest":
+        return cache.get(("latest", device), lambda: latest_payload(device))
+    if path == "/v1/history":
+        hours = _hours(params, config.API_MAX_HOURS)
+        points = _param(params, "points", int, 200, 1, config.API_MAX_POINTS)
+        since = _param(params, "since", int, None, 0, 2 ** 63)
+        full = cache.get(("history", device, hours, points), lambda: history_payload(device, hours, points))
+        return full if since is None else Encoded(since_slice(full.payload, since))
+    if path == "/v1/stats":
+        hours = _hours(params, config.STATS_MAX_HOURS)
+        return cache.get(("stats", device, hours), lambda: stats_payload(device, hours))
+    if path == "/v1/fleet":
+        return cache.get(("fleet",), fleet_payload)
+    if path == "/v1/devices":
+        return cache.get(("devices",), devices_payload)
+    raise KeyError(path)
+
+
+# =============================================================================
+# HTTP
+# =============================================================================
+class _ApiHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"  # keep-alive: one TCP/TLS setup per phone, not per poll
+    disable_nagle_algorithm = True  # headers and body are separate writes; don't wait for an ACK between them
+
+    def do_GET(self):
+        url = urlsplit(self.path)
+        if url.path == "/metrics":
+            self._send(200, telemetry.render().encode(), "text/plain; version=0.0.4; charset=utf-8")
+            return
+        try:
+            encoded = respond(url.path, parse_qs(url.query))
+        except KeyError:
+            self._error(404, url.path, "not found")
+            return
+        except BadRequest as e:
+            self._error(400, url.path, str(e))
+            return
+        except Exception as e:
+            print(f"[❌] API {url.path} failed: {e}")
+            self._error(500, url.path, "internal error")
+            return
+
+        headers = {"ETag": encoded.etag, "Cache-Control": "no-cache", "Vary": "Accept-Encoding"}
+        if encoded.etag in self.headers.get("If-None-Match", ""):
+            API_REQUESTS.inc(endpoint=url.path, status="304")
+            self._send(304, b"", None, headers)
+            return
+        body = encoded.body
+        if len(body) >= config.API_GZIP_MIN_BYTES and "gzip" in self.headers.get("Accept-Encoding", ""):
+            body = encoded.gzipped()
+            headers["Content-Encoding"] = "gzip"
+        API_REQUESTS.inc(endpoint=url.path, status="200")
+        self._send(200, body, "application/json", headers)
+
+    def _error(self, status: int, path: str, message: str):
+        API_REQUESTS.inc(endpoint=path if status != 404 else "unknown", status=str(status))
+        self._send(status, json.dumps({"error": message}).encode(), "application/json")
+
+    def _send(self, status: int, body: bytes, content_type: Optional[str], headers: Optional[Dict[str, str]] = None):
+        self.send_response(status)
+        if content_type:
+            self.send_header("Content-Type", content_type)
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        if body:
+            self.wfile.write(body)
+            API_BYTES.inc(len(body))
+
+    def log_message(self, format, *args):
+        pass
+
+
+def serve(host: str = config.API_HOST, port: int = config.API_PORT):
+    print(f"[🚀] SmartQuail read API on http://{host}:{port}/v1/latest")
+    ThreadingHTTPServer((host, port), _ApiHandler).serve_forever()
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="SmartQuail read API")
+    parser.add_argument("--host", default=config.API_HOST)
+    parser.add_argument("--port", type=int, default=config.API_PORT)
+    args = parser.parse_args()
+    try:
+        serve(args.host, args.port)
+    except KeyboardInterrupt:
+        print("\n[👋] Stopped.")
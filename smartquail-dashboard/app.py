@@ -9,18 +9,23 @@ Supervisor: Prof. Dr. Ir. Widodo Budiharto
 """
 
 import streamlit as st
-import pandas as pd
-import plotly.express as px
 import plotly.graph_objects as go
-from datetime import datetime, timedelta
+from datetime import datetime, timedelta, timezone
+from typing import Optional, TYPE_CHECKING
 import time
 import json
 import base64
 from pathlib import Path
 
 # Import local modules
+import budget
 import config
 import database as db
+import telemetry
+
+# pandas is imported on first use: the fleet page and cold start don't need it
+if TYPE_CHECKING:
+    import pandas as pd
 
 # =============================================================================
 # PAGE CONFIG
@@ -35,11 +40,18 @@ st.set_page_config(
 # =============================================================================
 # LOAD CUSTOM CSS
 # =============================================================================
-def load_css():
+@st.cache_resource
+def read_css() -> str:
+    """Read the stylesheet once per process"""
     css_file = Path(__file__).parent / "styles" / "apple_style.css"
     if css_file.exists():
-        with open(css_file) as f:
-            st.markdown(f"<style>{f.read()}</style>", unsafe_allow_html=True)
+        return css_file.read_text()
+    return ""
+
+def load_css():
+    css = read_css()
+    if css:
+        st.markdown(f"<style>{css}</style>", unsafe_allow_html=True)
     
     # Additional inline styles for Streamlit components
     st.markdown("""
@@ -82,6 +94,16 @@ def load_css():
 
 load_css()
 
+# =============================================================================
+# METRICS ENDPOINT
+# =============================================================================
+@st.cache_resource
+def start_metrics_endpoint() -> bool:
+    """Serve /metrics once per process, shared by all sessions"""
+    return telemetry.start_metrics_server(config.DASHBOARD_METRICS_PORT)
+
+start_metrics_endpoint()
+
 # =============================================================================
 # SESSION STATE
 # =============================================================================
@@ -94,6 +116,15 @@ if 'last_data' not in st.session_state:
 if 'history_hours' not in st.session_state:
     st.session_state.history_hours = 24
 
+if 'chart_cache' not in st.session_state:
+    st.session_state.chart_cache = {}
+
+if 'device' not in st.session_state:
+    st.session_state.device = config.DEFAULT_DEVICE
+
+if 'page' not in st.session_state:
+    st.session_state.page = "dashboard"
+
 # =============================================================================
 # HELPER FUNCTIONS
 # =============================================================================
@@ -112,27 +143,73 @@ def get_thi_status(thi: float) -> tuple:
     else:
         return "critical", "#AF52DE", t("critical")
 
+@st.cache_resource
 def get_logo_base64():
-    """Get logo as base64 for embedding"""
+    """Get logo as base64 for embedding (encoded once per process)"""
     logo_path = Path(__file__).parent / "assets" / "smartquail.png"
     if logo_path.exists():
         with open(logo_path, "rb") as f:
             return base64.b64encode(f.read()).decode()
     return None
 
+def open_device(device: str):
+    """Switch the main dashboard to device (button callback)"""
+    st.session_state.device = device
+    st.session_state.page = "dashboard"
+    st.session_state.chart_cache = {}
+
 def format_timestamp(ts):
-    """Format timestamp for display"""
-    if isinstance(ts, str):
+    """Format timestamp (datetime, epoch ms or ISO string) for display"""
+    if isinstance(ts, (int, float)):
+        ts = datetime.fromtimestamp(ts / 1000)
+    elif isinstance(ts, str):
         ts = datetime.fromisoformat(ts.replace('Z', '+00:00'))
     return ts.strftime("%H:%M:%S")
 
-def create_gauge_chart(value: float, title: str, min_val: float = 0, max_val: float = 100) -> go.Figure:
-    """Create Apple-style gauge chart"""
-    status, color, _ = get_thi_status(value)
-    
+# =============================================================================
+# CHARTS
+# =============================================================================
+def use_webgl(n_points: int) -> bool:
+    """WebGL traces for large windows, smooth SVG splines for small ones"""
+    if config.CHART_RENDER_MODE == "webgl":
+        return True
+    if config.CHART_RENDER_MODE == "svg":
+        return False
+    return n_points >= config.CHART_WEBGL_THRESHOLD
+
+def _rgba(color: str, alpha: float) -> str:
+    """Convert #RRGGBB to an rgba() string"""
+    return f'rgba({int(color[1:3], 16)}, {int(color[3:5], 16)}, {int(color[5:7], 16)}, {alpha})'
+
+def sparkline_svg(values: list, color: str, width: int = 140, height: int = 32) -> str:
+    """Inline SVG sparkline; cheap enough to draw hundreds per page"""
+    values = [v for v in values if v is not None]
+    if len(values) < 2:
+        return ""
+    lo, hi = min(values), max(values)
+    span = (hi - lo) or 1.0
+    step = width / (len(values) - 1)
+    points = " ".join(
+        f"{i * step:.1f},{height - 2 - (v - lo) / span * (height - 4):.1f}" for i, v in enumerate(values)
+    )
+    return (
+        f'<svg width="{width}" height="{height}" viewBox="0 0 {width} {height}">'
+        f'<polyline points="{points}" fill="none" stroke="{color}" stroke-width="1.5"/></svg>'
+    )
+
+def _line_trace(webgl: bool, **kwargs):
+    """Scattergl for WebGL mode (no spline support), Scatter otherwise"""
+    if webgl:
+        kwargs["line"].pop("shape", None)
+        return go.Scattergl(**kwargs)
+    return go.Scatter(**kwargs)
+
+@st.cache_resource
+def _gauge_skeleton(min_val: float, max_val: float) -> go.Figure:
+    """THI gauge with axis, zones and layout; built once per process"""
     fig = go.Figure(go.Indicator(
         mode="gauge+number",
-        value=value,
+        value=min_val,
         number={'font': {'size': 48, 'color': '#1D1D1F', 'family': 'Inter'}, 'suffix': ''},
         gauge={
             'axis': {
@@ -141,7 +218,7 @@ def create_gauge_chart(value: float, title: str, min_val: float = 0, max_val: fl
                 'tickcolor': "#E5E5EA",
                 'tickfont': {'size': 12, 'color': '#86868B'}
             },
-            'bar': {'color': color, 'thickness': 0.75},
+            'bar': {'thickness': 0.75},
             'bgcolor': "white",
             'borderwidth': 0,
             'steps': [
@@ -152,7 +229,6 @@ def create_gauge_chart(value: float, title: str, min_val: float = 0, max_val: fl
             'threshold': {
                 'line': {'color': "#1D1D1F", 'width': 3},
                 'thickness': 0.8,
-                'value': value
             }
         }
     ))
@@ -167,22 +243,10 @@ def create_gauge_chart(value: float, title: str, min_val: float = 0, max_val: fl
     
     return fig
 
-def create_line_chart(df: pd.DataFrame, y_columns: list, colors: list, title: str) -> go.Figure:
-    """Create Apple-style line chart"""
+@st.cache_resource
+def _line_skeleton() -> go.Figure:
+    """Empty line chart layout; built once per process"""
     fig = go.Figure()
-    
-    for col, color in zip(y_columns, colors):
-        if col in df.columns:
-            fig.add_trace(go.Scatter(
-                x=df['created_at'],
-                y=df[col],
-                mode='lines',
-                name=col.upper(),
-                line=dict(color=color, width=2.5, shape='spline'),
-                fill='tozeroy',
-                fillcolor=f'rgba({int(color[1:3], 16)}, {int(color[3:5], 16)}, {int(color[5:7], 16)}, 0.1)'
-            ))
-    
     fig.update_layout(
         height=350,
         margin=dict(l=0, r=0, t=20, b=0),
@@ -209,27 +273,15 @@ def create_line_chart(df: pd.DataFrame, y_columns: list, colors: list, title: st
             font=dict(size=12)
         ),
         hovermode='x unified',
-        font={'family': 'Inter'}
+        font={'family': 'Inter'},
+        uirevision='trend'  # keep zoom/pan across reruns
     )
-    
     return fig
 
-def create_area_chart(df: pd.DataFrame) -> go.Figure:
-    """Create THI area chart with zones"""
+@st.cache_resource
+def _area_skeleton() -> go.Figure:
+    """Empty THI chart with threshold lines and zones; built once per process"""
     fig = go.Figure()
-    
-    # Add THI line
-    fig.add_trace(go.Scatter(
-        x=df['created_at'],
-        y=df['thi'],
-        mode='lines',
-        name='THI',
-        line=dict(color='#007AFF', width=3, shape='spline'),
-        fill='tozeroy',
-        fillcolor='rgba(0, 122, 255, 0.1)'
-    ))
-    
-    # Add threshold lines
     fig.add_hline(y=config.THI_NORMAL, line_dash="dash", line_color="#34C759", 
                   annotation_text="Normal", annotation_position="right")
     fig.add_hline(y=config.THI_WARNING, line_dash="dash", line_color="#FFCC00",
@@ -253,11 +305,102 @@ def create_area_chart(df: pd.DataFrame) -> go.Figure:
         ),
         showlegend=False,
         hovermode='x unified',
-        font={'family': 'Inter'}
+        font={'family': 'Inter'},
+        uirevision='thi'
     )
+    return fig
+
+def create_gauge_chart(value: float, title: str, min_val: float = 0, max_val: float = 100,
+                       forecast: Optional[float] = None) -> go.Figure:
+    """Create Apple-style gauge chart; the marker shows the forecast when there is one"""
+    status, color, _ = get_thi_status(value)
+    
+    fig = go.Figure(_gauge_skeleton(min_val, max_val))
+    marker = value if forecast is None else min(max(forecast, min_val), max_val)
+    fig.update_traces(value=value, gauge_bar_color=color, gauge_threshold_value=marker)
+    return fig
+
+def create_line_chart(df: "pd.DataFrame", y_columns: list, colors: list, title: str,
+                      webgl: Optional[bool] = None) -> go.Figure:
+    """Create Apple-style line chart"""
+    if webgl is None:
+        webgl = use_webgl(len(df))
+    fig = go.Figure(_line_skeleton())
+    
+    for col, color in zip(y_columns, colors):
+        if col in df.columns:
+            fig.add_trace(_line_trace(
+                webgl,
+                x=df['created_at'],
+                y=df[col],
+                mode='lines',
+                name=col.upper(),
+                meta=col,
+                line=dict(color=color, width=2.5, shape='spline'),
+                fill='tozeroy',
+                fillcolor=_rgba(color, 0.1)
+            ))
     
     return fig
 
+def create_area_chart(df: "pd.DataFrame", webgl: Optional[bool] = None) -> go.Figure:
+    """Create THI area chart with zones"""
+    if webgl is None:
+        webgl = use_webgl(len(df))
+    fig = go.Figure(_area_skeleton())
+    
+    # Add THI line
+    fig.add_trace(_line_trace(
+        webgl,
+        x=df['created_at'],
+        y=df['thi'],
+        mode='lines',
+        name='THI',
+        meta='thi',
+        line=dict(color='#007AFF', width=3, shape='spline'),
+        fill='tozeroy',
+        fillcolor='rgba(0, 122, 255, 0.1)'
+    ))
+    
+    return fig
+
+def update_chart(key: str, df: "pd.DataFrame", build) -> go.Figure:
+    """
+    Reuse this session's figure for key and push only rows newer than the
+    last drawn point into its traces. build(df, webgl) is called when there
+    is no figure yet, the render mode flips, or the window grows backwards.
+    """
+    cache = st.session_state.chart_cache
+    webgl = use_webgl(len(df))
+    state = cache.get(key)
+    
+    if (state is None or state["webgl"] != webgl
+            or df['created_at'].iloc[0] < state["df"]['created_at'].iloc[0]):
+        telemetry.CACHE_REQUESTS.inc(cache="chart", result="miss")
+        fig = build(df, webgl)
+        cache[key] = {"fig": fig, "df": df, "webgl": webgl}
+        return fig
+    
+    drawn = state["df"]
+    last_ts = drawn['created_at'].iloc[-1]
+    new_rows = df[df['created_at'] > last_ts]
+    window_start = df['created_at'].iloc[0]
+    if new_rows.empty and drawn['created_at'].iloc[0] == window_start:
+        telemetry.CACHE_REQUESTS.inc(cache="chart", result="hit")
+        return state["fig"]
+    telemetry.CACHE_REQUESTS.inc(cache="chart", result="miss")
+    
+    # Append new points and drop those that fell out of the window
+    import pandas as pd
+    drawn = pd.concat([drawn[drawn['created_at'] >= window_start], new_rows], ignore_index=True)
+    fig = state["fig"]
+    with fig.batch_update():
+        for trace in fig.data:
+            trace.x = drawn['created_at']
+            trace.y = drawn[trace.meta]
+    state["df"] = drawn
+    return fig
+
 # =============================================================================
 # COMPONENTS
 # =============================================================================
@@ -374,6 +517,34 @@ def render_relay_status(relay: str):
     </style>
     """, unsafe_allow_html=True)
 
+def render_debug_panel():
+    """Render timings and cache hit ratios from this process's metrics"""
+    rows = []
+    for hist, kind, label in [
+        (telemetry.RENDER_SECONDS, "render", "section"),
+        (telemetry.DB_QUERY_SECONDS, "query", "query"),
+    ]:
+        for labels in hist.label_sets():
+            s = hist.summary(**labels)
+            rows.append({
+                "metric": f"{kind}:{labels[label]}",
+                "count": int(s["count"]),
+                "mean ms": round(s["mean"] * 1000, 1),
+                "p95 ms ≤": round(s["p95"] * 1000, 1),
+            })
+    if rows:
+        st.dataframe(rows, hide_index=True, use_container_width=True)
+    for cache in ("chart", "snapshot", "hot"):
+        ratio = telemetry.cache_hit_ratio(cache)
+        if ratio is not None:
+            st.caption(f"{cache} cache hit ratio: {ratio:.0%}")
+    usage = db.get_budget_usage()
+    if usage["budget_rps"]:
+        rates = ", ".join(f"{c} {r}" for c, r in usage["rps"].items())
+        st.caption(f"query budget: {usage['total_rps']}/{usage['budget_rps']} req/s ({rates}); "
+                   f"shed {sum(usage['shed'].values())}")
+    st.caption(f"/metrics → http://127.0.0.1:{config.DASHBOARD_METRICS_PORT}/metrics")
+
 # =============================================================================
 # SIDEBAR
 # =============================================================================
@@ -402,6 +573,16 @@ def render_sidebar():
         else:
             st.markdown("## 🐦 SmartQuail")
         
+        # Page
+        pages = {"dashboard": f"📊 {t('dashboard')}", "fleet": f"🏠 {t('fleet')}"}
+        st.radio(
+            "Page",
+            options=list(pages.keys()),
+            format_func=pages.get,
+            key="page",
+            label_visibility="collapsed"
+        )
+        
         st.markdown("---")
         
         # Language selector
@@ -458,7 +639,10 @@ def render_sidebar():
         
         # Download button
         st.markdown(f"### 💾 {t('download')}")
-        df = db.get_history_data(hours=st.session_state.history_hours)
+        # Lowest priority: near the query budget this reuses the chart's snapshot
+        with budget.caller("export"):
+            df = db.get_history_data(st.session_state.device, hours=st.session_state.history_hours,
+                                     metrics=config.DASHBOARD_METRICS)
         if not df.empty:
             csv = df.to_csv(index=False)
             st.download_button(
@@ -471,6 +655,11 @@ def render_sidebar():
         
         st.markdown("---")
         
+        # Debug metrics
+        if st.checkbox(f"🛠️ {t('debug_metrics')}", value=False):
+            render_debug_panel()
+            st.markdown("---")
+        
         # Footer
         st.markdown("""
         <div style="
@@ -490,6 +679,19 @@ def render_sidebar():
 def render_dashboard():
     """Render main dashboard"""
     
+    # Get latest data
+    data = db.get_latest_data(st.session_state.device)
+    
+    # Age of the newest reading, so a flat chart can't hide a dead ESP32
+    last_seen = None
+    if data and data.get('sampled_ms'):
+        last_seen = datetime.fromtimestamp(data['sampled_ms'] / 1000, timezone.utc)
+    elif data and data.get('created_at'):
+        last_seen = datetime.fromisoformat(data['created_at'].replace('Z', '+00:00'))
+        if last_seen.tzinfo is None:
+            last_seen = last_seen.replace(tzinfo=timezone.utc)
+    silent_sec = (datetime.now(timezone.utc) - last_seen).total_seconds() if last_seen else None
+    
     # Header
     col1, col2 = st.columns([3, 1])
     with col1:
@@ -511,12 +713,16 @@ def render_dashboard():
         st.markdown(f"""
         <div style="text-align: right; padding-top: 0.5rem;">
             <div style="font-size: 0.75rem; color: #86868B;">{t('last_update')}</div>
-            <div style="font-size: 0.875rem; font-weight: 500; color: #1D1D1F;">{datetime.now().strftime('%H:%M:%S')}</div>
+            <div style="font-size: 0.875rem; font-weight: 500; color: #1D1D1F;">{format_timestamp(last_seen.astimezone()) if last_seen else '--:--:--'}</div>
+            <div style="font-size: 0.75rem; color: #86868B;">{t('device')}: {st.session_state.device}</div>
         </div>
         """, unsafe_allow_html=True)
     
-    # Get latest data
-    data = db.get_latest_data()
+    # Backend incident: data below is the last good snapshot
+    backend_status = db.get_backend_status()
+    if backend_status["stale"]:
+        stale_since = datetime.fromtimestamp(backend_status["stale_since"]).strftime("%H:%M:%S")
+        render_status_banner(t('stale_data'), f"{t('backend_unavailable')} {stale_since}", "warning")
     
     if data:
         temp = data.get('temp', 0)
@@ -529,8 +735,13 @@ def render_dashboard():
         thi_status, thi_color, thi_text = get_thi_status(thi)
         
         # Status Banner
-        if status == "SENSOR_ERROR":
+        if silent_sec is not None and silent_sec > config.DEVICE_OFFLINE_SECONDS:
+            render_status_banner(t('disconnected'), f"{t('no_reading_since')} {format_timestamp(last_seen.astimezone())} "
+                                 f"({int(silent_sec // 60)} min)", "error")
+        elif status == "SENSOR_ERROR":
             render_status_banner(t('sensor_error'), t('check_environment'), "error")
+        elif data.get('flags'):
+            render_status_banner(t('sensor_suspect'), data['flags'].replace(',', ', '), "warning")
         elif thi >= config.THI_WARNING:
             render_status_banner(t('danger'), t('cooling_active'), "warning")
         else:
@@ -595,10 +806,15 @@ def render_dashboard():
                 </h3>
             """, unsafe_allow_html=True)
             
-            df = db.get_history_data(hours=st.session_state.history_hours)
+            df = db.get_history_data(st.session_state.device, hours=st.session_state.history_hours,
+                                     metrics=config.DASHBOARD_METRICS)
             if not df.empty:
-                fig = create_line_chart(df, ['temp', 'rh'], ['#FF9500', '#007AFF'], 'Trend')
-                st.plotly_chart(fig, use_container_width=True, config={'displayModeBar': False})
+                with telemetry.RENDER_SECONDS.time(section="trend_chart"):
+                    fig = update_chart(
+                        "trend", df,
+                        lambda d, gl: create_line_chart(d, ['temp', 'rh'], ['#FF9500', '#007AFF'], 'Trend', webgl=gl)
+                    )
+                    st.plotly_chart(fig, use_container_width=True, config={'displayModeBar': False})
             else:
                 st.info(t('no_data'))
             
@@ -618,8 +834,20 @@ def render_dashboard():
                 </h3>
             """, unsafe_allow_html=True)
             
-            fig = create_gauge_chart(thi, "THI", 50, 100)
-            st.plotly_chart(fig, use_container_width=True, config={'displayModeBar': False})
+            with telemetry.RENDER_SECONDS.time(section="gauge"):
+                thi_forecast = data.get("thi_forecast")
+                fig = create_gauge_chart(thi, "THI", 50, 100,
+                                         forecast=float(thi_forecast) if thi_forecast is not None else None)
+                st.plotly_chart(fig, use_container_width=True, config={'displayModeBar': False})
+            
+            if thi_forecast is not None:
+                eta = data.get("thi_eta_min")
+                eta_text = f" · {t('warning')} ~{float(eta):.0f} min" if eta is not None else ""
+                st.markdown(f"""
+                <div style="text-align: center; font-size: 0.8rem; color: #86868B; margin-top: -1rem;">
+                    {t('forecast')} {config.FORECAST_HORIZON_MIN} min: <b style="color: #1D1D1F;">{float(thi_forecast):.1f}</b>{eta_text}
+                </div>
+                """, unsafe_allow_html=True)
             
             # THI Legend
             st.markdown(f"""
@@ -647,8 +875,9 @@ def render_dashboard():
         """, unsafe_allow_html=True)
         
         if not df.empty:
-            fig = create_area_chart(df)
-            st.plotly_chart(fig, use_container_width=True, config={'displayModeBar': False})
+            with telemetry.RENDER_SECONDS.time(section="thi_chart"):
+                fig = update_chart("thi", df, lambda d, gl: create_area_chart(d, webgl=gl))
+                st.plotly_chart(fig, use_container_width=True, config={'displayModeBar': False})
         else:
             st.info(t('no_data'))
         
@@ -667,7 +896,9 @@ def render_dashboard():
             </h3>
         """, unsafe_allow_html=True)
         
-        stats = db.get_statistics(hours=st.session_state.history_hours)
+        with telemetry.RENDER_SECONDS.time(section="statistics"):
+            stats = db.get_statistics(st.session_state.device, hours=st.session_state.history_hours)
+            relay_stats = db.get_relay_analytics(st.session_state.device, hours=st.session_state.history_hours)
         
         col1, col2, col3, col4 = st.columns(4)
         
@@ -702,11 +933,35 @@ def render_dashboard():
             st.markdown(f"""
             <div style="text-align: center; padding: 1rem; background: #F5F5F7; border-radius: 12px;">
                 <div style="font-size: 0.75rem; color: #86868B; margin-bottom: 0.25rem;">💨 {t('relay')} {t('on')}</div>
-                <div style="font-size: 1.5rem; font-weight: 600; color: #1D1D1F;">{stats['relay_on_count']}</div>
-                <div style="font-size: 0.75rem; color: #86868B;">Total: {stats['data_points']} data</div>
+                <div style="font-size: 1.5rem; font-weight: 600; color: #1D1D1F;">{relay_stats['on_minutes'] / 60:.1f} h</div>
+                <div style="font-size: 0.75rem; color: #86868B;">{relay_stats['duty_cycle']:.0%} · {relay_stats['cycles']} {t('cycles')} · {relay_stats['energy_kwh']:.2f} kWh</div>
             </div>
             """, unsafe_allow_html=True)
         
+        # THI over several windows at once, all answered from the same in-memory series
+        with telemetry.RENDER_SECONDS.time(section="window_stats"):
+            windows = db.get_window_statistics(st.session_state.device)
+        chips = "".join(f"""
+            <div style="flex: 1; text-align: center; padding: 0.5rem; background: #F5F5F7; border-radius: 12px;">
+                <div style="font-size: 0.75rem; color: #86868B;">THI {hours} h</div>
+                <div style="font-size: 1rem; font-weight: 600; color: #1D1D1F;">{w['thi']['avg']}</div>
+                <div style="font-size: 0.7rem; color: #86868B;">{w['thi']['min']} – {w['thi']['max']}</div>
+            </div>""" for hours, w in windows.items())
+        st.markdown(f'<div style="display: flex; gap: 0.5rem; margin-top: 0.75rem;">{chips}</div>',
+                    unsafe_allow_html=True)
+        
+        # Data completeness for the same window as the statistics above
+        with telemetry.RENDER_SECONDS.time(section="uptime"):
+            uptime = db.get_uptime(st.session_state.device, hours=st.session_state.history_hours)
+        uptime_color = "#34C759" if uptime['uptime_pct'] >= 99 else "#FF9500" if uptime['uptime_pct'] >= 90 else "#FF3B30"
+        st.markdown(f"""
+        <div style="font-size: 0.8rem; color: #86868B; margin-top: 0.75rem;">
+            <span style="color: {uptime_color};">●</span> {t('uptime')} <b style="color: #1D1D1F;">{uptime['uptime_pct']}%</b>
+            · {uptime['gap_count']} {t('gaps')} ({t('longest')} {uptime['longest_gap_min']:.0f} min)
+            · {uptime['rate_per_min']:.1f}/{uptime['expected_rate_per_min']:.0f} msg/min
+        </div>
+        """, unsafe_allow_html=True)
+        
         st.markdown("</div>", unsafe_allow_html=True)
     
     else:
@@ -725,12 +980,95 @@ def render_dashboard():
         </div>
         """, unsafe_allow_html=True)
 
+# =============================================================================
+# FLEET OVERVIEW
+# =============================================================================
+def render_fleet():
+    """Render one tile per device from two batched queries (state + sparklines)"""
+    st.markdown(f"""
+    <h1 style="
+        font-size: 2rem;
+        font-weight: 700;
+        color: #1D1D1F;
+        margin: 0;
+    ">{t('fleet')}</h1>
+    <p style="
+        font-size: 1rem;
+        color: #86868B;
+        margin: 0.25rem 0 1.5rem 0;
+    ">{t('subtitle')}</p>
+    """, unsafe_allow_html=True)
+    
+    states = db.get_fleet_latest()
+    sparks = db.get_fleet_sparklines(config.FLEET_SPARKLINE_HOURS, config.FLEET_SPARKLINE_POINTS)
+    
+    if not states:
+        st.info(t('no_data'))
+        return
+    
+    now = datetime.now(timezone.utc)
+    tiles = []
+    for row in states:
+        device = row["device"]
+        thi = float(row.get("thi") or 0)
+        _, color, thi_text = get_thi_status(thi)
+        is_on = (row.get("relay") or "OFF").upper() == "ON"
+        updated = row.get("updated_at")
+        offline = True
+        if updated:
+            updated_at = datetime.fromisoformat(updated.replace('Z', '+00:00'))
+            offline = (now - updated_at).total_seconds() > config.DEVICE_OFFLINE_SECONDS
+        eta = row.get("thi_eta_min")
+        eta_text = f' · ⏱ {float(eta):.0f} min' if eta is not None and not offline else ''
+        tiles.append(
+            f'<div class="sq-tile" style="border-top: 4px solid {"#86868B" if offline else color};'
+            f'{" opacity: 0.55;" if offline else ""}">'
+            f'<div class="sq-tile-head"><span>{device}</span>'
+            f'<span style="color: {"#007AFF" if is_on else "#86868B"};">● {t("on") if is_on else t("off")}</span></div>'
+            f'<div class="sq-tile-thi">{thi:.1f} <span style="color: {color};">{t("disconnected") if offline else thi_text}</span></div>'
+            f'<div class="sq-tile-sub">🌡️ {float(row.get("temp") or 0):.1f}°C · 💧 {float(row.get("rh") or 0):.0f}%{eta_text}</div>'
+            f'{sparkline_svg(sparks.get(device, []), color)}'
+            f'</div>'
+        )
+    
+    st.markdown(
+        '<style>'
+        '.sq-fleet { display: grid; grid-template-columns: repeat(auto-fill, minmax(180px, 1fr)); gap: 12px; }'
+        '.sq-tile { background: white; border-radius: 12px; padding: 0.75rem 1rem;'
+        ' box-shadow: 0 4px 12px rgba(0,0,0,0.08); }'
+        '.sq-tile-head { display: flex; justify-content: space-between; font-size: 0.75rem;'
+        ' font-weight: 600; color: #86868B; }'
+        '.sq-tile-thi { font-size: 1.5rem; font-weight: 600; color: #1D1D1F; }'
+        '.sq-tile-thi span { font-size: 0.75rem; font-weight: 500; }'
+        '.sq-tile-sub { font-size: 0.75rem; color: #86868B; margin-bottom: 0.25rem; }'
+        '</style>'
+        f'<div class="sq-fleet">{"".join(tiles)}</div>',
+        unsafe_allow_html=True
+    )
+    
+    st.markdown("<div style='height: 1rem;'></div>", unsafe_allow_html=True)
+    col1, col2 = st.columns([3, 1])
+    with col1:
+        selected = st.selectbox(
+            t('device'),
+            options=[row["device"] for row in states],
+            label_visibility="collapsed"
+        )
+    with col2:
+        st.button(f"📊 {t('open_device')}", on_click=open_device, args=(selected,), use_container_width=True)
+
 # =============================================================================
 # MAIN APP
 # =============================================================================
 def main():
-    render_sidebar()
-    render_dashboard()
+    with telemetry.RENDER_SECONDS.time(section="sidebar"):
+        render_sidebar()
+    if st.session_state.page == "fleet":
+        with telemetry.RENDER_SECONDS.time(section="fleet"):
+            render_fleet()
+    else:
+        with telemetry.RENDER_SECONDS.time(section="dashboard"):
+            render_dashboard()
     
     # Auto-refresh every 2 seconds
     time.sleep(config.REFRESH_INTERVAL)
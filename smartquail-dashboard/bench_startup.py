@@ -0,0 +1,79 @@
+"""
+SmartQuail Startup Benchmark
+============================
+Guards cold-start cost of the data layer and the bridge
+
+Each check imports a module in a fresh interpreter, takes the median wall
+time over several runs and fails if it exceeds its budget or if a heavy
+dependency (pandas, plotly, supabase) was imported eagerly.
+
+Usage:
+    python bench_startup.py
+    python bench_startup.py --runs 7 --scale 1.5   # looser budgets on slow VMs
+"""
+
+import argparse
+import json
+import statistics
+import subprocess
+import sys
+from pathlib import Path
+
+HERE = Path(__file__).parent
+
+# module -> (budget in seconds, modules that must NOT be loaded after import)
+CHECKS = {
+    "config": (0.10, ["pandas", "plotly", "supabase"]),
+    "telemetry": (0.15, ["pandas", "plotly", "supabase"]),
+    "database": (0.25, ["pandas", "plotly", "supabase"]),
+}
+
+PROBE = """
+import json, sys, time
+start = time.perf_counter()
+import {module}
+elapsed = time.perf_counter() - start
+print(json.dumps({{"elapsed": elapsed, "loaded": sorted(m for m in {forbidden!r} if m in sys.modules)}}))
+"""
+
+
+def measure(module: str, forbidden: list, runs: int) -> dict:
+    """Median import time of module over runs fresh interpreters"""
+    times, loaded = [], set()
+    for _ in range(runs):
+        out = subprocess.run(
+            [sys.executable, "-c", PROBE.format(module=module, forbidden=forbidden)],
+            cwd=HERE, capture_output=True, text=True, check=True,
+        )
+        result = json.loads(out.stdout.strip().splitlines()[-1])
+        times.append(result["elapsed"])
+        loaded.update(result["loaded"])
+    return {"median": statistics.median(times), "loaded": sorted(loaded)}
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="SmartQuail cold-start benchmark")
+    parser.add_argument("--runs", type=int, default=5, help="fresh interpreters per module")
+    parser.add_argument("--scale", type=float, default=1.0, help="multiply all budgets")
+    args = parser.parse_args()
+
+    print("=" * 60)
+    print("🐦 SmartQuail Startup Benchmark")
+    print("=" * 60)
+
+    failed = False
+    for module, (budget, forbidden) in CHECKS.items():
+        result = measure(module, forbidden, args.runs)
+        limit = budget * args.scale
+        ok = result["median"] <= limit and not result["loaded"]
+        failed |= not ok
+        print(f"[{'✅' if ok else '❌'}] import {module:<10} {result['median'] * 1000:7.1f} ms "
+              f"(budget {limit * 1000:.0f} ms)")
+        if result["loaded"]:
+            print(f"    Eagerly imported: {', '.join(result['loaded'])}")
+
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,369 @@
+"""
+SmartQuail Concurrent Viewer Benchmark
+======================================
+How many simultaneous viewers a dashboard serves within its 2 s refresh
+
+Runs N Streamlit sessions (AppTest, one script thread each, as the
+Streamlit server does) in this process against a fake Supabase client,
+so the real data layer (guarded backend, snapshots, caches) is exercised
+and every query is counted. Each session reruns on a fixed REFRESH_INTERVAL
+grid, staggered across viewers; a rerun that takes longer than the
+interval misses its refresh deadline.
+
+For each viewer count it reports rerun latency percentiles, the share of
+missed deadlines, backend queries/s, CPU (% of one core) and RSS growth
+per session, then the largest viewer count that kept p95 latency within
+the interval and misses under --miss-budget.
+
+The fake backend answers from deterministic synthetic readings after
+--query-ms of simulated round trip. The query budget is off
+(QUERY_BUDGET_RPS=0) unless set in the environment, so the numbers show
+the full demand.
+
+Usage:
+    python bench_viewers.py                         # smartquail-dashboard/app.py
+    python bench_viewers.py --app root              # root app.py (supabase_client.py)
+    python bench_viewers.py --viewers 1,5,10,20,40 --duration 30 --query-ms 60
+"""
+
+import argparse
+import json
+import logging
+import math
+import os
+import statistics
+import sys
+import threading
+import time
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+HERE = Path(__file__).parent
+APPS = {"dashboard": HERE / "app.py", "root": HERE.parent / "app.py"}
+DEVICES = ["esp32-01", "esp32-02", "esp32-03"]
+INTERVAL_MS = 2000  # synthetic reading interval
+# The dashboard's own refresh loop; the benchmark schedules reruns instead
+REFRESH_TAIL = "    time.sleep(config.REFRESH_INTERVAL)\n    st.rerun()"
+
+
+# =============================================================================
+# FAKE SUPABASE
+# =============================================================================
+def _reading(device: str, ms: int) -> Dict[str, Any]:
+    """Deterministic synthetic reading: daily cycle plus a small wobble"""
+    t = ms / 1000
+    day = math.sin(2 * math.pi * t / 86400)
+    temp = round(27 + 3 * day + 0.3 * math.sin(t / 97), 1)
+    rh = round(70 - 8 * day + math.sin(t / 131), 1)
+    thi = round(0.8 * temp + rh / 100 * (temp - 14.4) + 46.4, 1)
+    return {"device": device, "temp": temp, "rh": rh, "thi": thi, "relay": "ON" if thi >= 78 else "OFF",
+            "status": "OK", "flags": None, "sampled_ms": ms, "dedup_key": f"t{ms}",
+            "created_at": datetime.fromtimestamp(t, timezone.utc).isoformat()}
+
+
+class _Response:
+    def __init__(self, data: List[Dict[str, Any]], count: Optional[int] = None):
+        self.data = data
+        self.count = count
+
+
+class _Query:
+    """Just enough of the postgrest builder for database.py and supabase_client.py"""
+
+    def __init__(self, backend: "FakeSupabase", name: str, params: Optional[Dict[str, Any]] = None):
+        self.backend = backend
+        self.name = name
+        self.params = params or {}
+        self.filters: Dict[str, Any] = {}
+        self.desc = False
+        self.count = None
+        self.n = 1000
+
+    def select(self, columns: str = "*", count: Optional[str] = None, **kwargs):
+        self.count = count
+        return self
+
+    def eq(self, column: str, value: Any):
+        self.filters[column] = value
+        return self
+
+    def gte(self, column: str, value: Any):
+        self.filters["since"] = value
+        return self
+
+    def in_(self, column: str, values: List[Any]):
+        return self
+
+    def order(self, column: str, desc: bool = False, **kwargs):
+        self.desc = desc
+        return self
+
+    def limit(self, n: int):
+        self.n = n
+        return self
+
+    def insert(self, rows, **kwargs):
+        return self
+
+    upsert = insert
+
+    def execute(self) -> _Response:
+        return self.backend.execute(self)
+
+
+class FakeSupabase:
+    """Synthetic readings per device, a fixed delay per query, and a query counter"""
+
+    def __init__(self, query_ms: float = 30.0, devices: List[str] = DEVICES):
+        self.delay = query_ms / 1000
+        self.devices = devices
+        self.queries = 0
+        self._cache: Dict[tuple, Any] = {}
+        self._lock = threading.Lock()
+
+    def table(self, name: str) -> _Query:
+        return _Query(self, name)
+
+    def rpc(self, name: str, params: Dict[str, Any]) -> _Query:
+        return _Query(self, f"rpc:{name}", params)
+
+    def execute(self, q: _Query) -> _Response:
+        with self._lock:
+            self.queries += 1
+        time.sleep(self.delay)  # network round trip; releases the GIL like real I/O
+        now_ms = int(time.time() * 1000) // INTERVAL_MS * INTERVAL_MS
+        device = q.filters.get("device") or q.params.get("p_device") or self.devices[0]
+
+        if q.name in ("sensor_logs", "readings"):
+            if q.count:
+                return _Response([], count=72 * 3600 * 1000 // INTERVAL_MS)
+            if "device" not in q.filters:
+                return _Response([{"device": d} for d in self.devices])
+            since = q.filters.get("since", now_ms - 24 * 3600 * 1000)
+            start = -(-since // INTERVAL_MS) * INTERVAL_MS
+            n = max(0, min(q.n, (now_ms - start) // INTERVAL_MS + 1))
+            first = now_ms - (n - 1) * INTERVAL_MS if q.desc else start
+            return _Response(self._rows(device, first, n, q.desc))
+        if q.name == "device_state":
+            return _Response([{**_reading(d, now_ms), "thi_forecast": None, "thi_eta_min": None,
+                               "updated_at": _reading(d, now_ms)["created_at"]} for d in self.devices])
+        if q.name in ("rpc:rollup_series", "rpc:relay_rollup"):
+            since = datetime.fromisoformat(q.params["p_since"].replace("Z", "+00:00"))
+            if since.tzinfo is None:
+                since = since.replace(tzinfo=timezone.utc)  # database.py sends naive UTC
+            since_s = int(since.timestamp()) // 60 * 60
+            return _Response([self._rollups(device, since_s, now_ms // 60000 * 60)])
+        if q.name == "rpc:fleet_sparklines":
+            step = q.params["p_hours"] * 3600 / q.params["p_points"]
+            return _Response([{"device": d, "thi": [_reading(d, int((now_ms / 1000 - i * step) * 1000))["thi"]
+                                                    for i in reversed(range(q.params["p_points"]))]}
+                              for d in self.devices])
+        return _Response([])
+
+    def _rows(self, device: str, first: int, n: int, desc: bool) -> List[Dict[str, Any]]:
+        key = ("rows", device, first, n, desc)
+        rows = self._cache.get(key)
+        if rows is None:
+            rows = [_reading(device, first + i * INTERVAL_MS) for i in range(n)]
+            if desc:
+                rows.reverse()
+            self._remember(key, rows)
+        return rows
+
+    def _rollups(self, device: str, since_s: int, until_s: int) -> Dict[str, list]:
+        key = ("rollups", device, since_s, until_s)
+        row = self._cache.get(key)
+        if row is None:
+            buckets = list(range(since_s, until_s + 1, 60))
+            readings = [_reading(device, b * 1000) for b in buckets]
+            per_min = 60_000 // INTERVAL_MS
+            row = {"bucket": buckets, "n": [per_min] * len(buckets),
+                   "relay_on": [per_min if r["relay"] == "ON" else 0 for r in readings]}
+            for m in ("temp", "rh", "thi"):
+                row[f"{m}_sum"] = [r[m] * per_min for r in readings]
+                row[f"{m}_min"] = [r[m] - 0.2 for r in readings]
+                row[f"{m}_max"] = [r[m] + 0.2 for r in readings]
+            self._remember(key, row)
+        return row
+
+    def _remember(self, key: tuple, value: Any):
+        with self._lock:
+            if len(self._cache) > 256:
+                self._cache.clear()
+            self._cache[key] = value
+
+
+# =============================================================================
+# SESSIONS
+# =============================================================================
+def _rss_mb() -> float:
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") / 2 ** 20
+    except OSError:
+        import resource
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024  # peak, KiB on Linux
+
+
+def _share_runtime():
+    """
+    AppTest installs a mock Runtime before each run and removes it after,
+    so concurrent sessions pull it from under each other. Keep the first
+    one for the whole process instead, like the server's single Runtime.
+    """
+    from streamlit.runtime.runtime import Runtime
+
+    pinned = []
+
+    def instance(cls):
+        if not pinned and cls._instance is not None:
+            pinned.append(cls._instance)
+        if not pinned:
+            raise RuntimeError("Runtime hasn't been created!")
+        return pinned[0]
+
+    Runtime.instance = classmethod(instance)
+    Runtime.exists = classmethod(lambda cls: bool(pinned) or cls._instance is not None)
+
+
+def _install(app: str, fake: FakeSupabase):
+    """Point the app's data layer at the fake backend; returns an AppTest factory"""
+    from streamlit.testing.v1 import AppTest
+
+    _share_runtime()
+    path = APPS[app]
+    os.chdir(path.parent)
+    sys.path.insert(0, str(path.parent))
+    if app == "dashboard":
+        import database
+        database.get_client = lambda: fake
+        source = path.read_text(encoding="utf-8")
+        if REFRESH_TAIL not in source:
+            raise SystemExit(f"{path}: refresh loop not found, update REFRESH_TAIL")
+        # Keep asset paths relative to the real file
+        source = f"__file__ = {str(path)!r}\n" + source.replace(REFRESH_TAIL, "    pass")
+        return lambda: AppTest.from_string(source, default_timeout=60)
+    import mqtt_listener
+    import supabase_client
+    supabase_client.get_client = lambda: fake
+    mqtt_listener.start_mqtt_thread = lambda: None  # no broker; the bench measures reads only
+    return lambda: AppTest.from_file(str(path), default_timeout=60)
+
+
+def run_step(make_session, fake: FakeSupabase, viewers: int, duration: float, interval: float) -> Dict[str, Any]:
+    """Run viewers sessions for duration seconds; latency and resource figures"""
+    latencies: List[float] = []
+    misses = [0]
+    errors: List[str] = []
+    lock = threading.Lock()
+    rss_before = _rss_mb()
+    start = time.perf_counter() + 0.5
+    stop = start + duration
+
+    def viewer(i: int):
+        at = make_session()
+        due = start + interval * i / viewers  # staggered like independent browsers
+        while due < stop:
+            wait = due - time.perf_counter()
+            if wait > 0:
+                time.sleep(wait)
+            t0 = time.perf_counter()
+            try:
+                at.run()
+            except Exception as e:
+                with lock:
+                    errors.append(str(e))
+            elapsed = time.perf_counter() - t0
+            with lock:
+                latencies.append(elapsed)
+                if elapsed > interval:
+                    misses[0] += 1
+                if at.exception and len(errors) < 5:
+                    errors.append(str(at.exception[0].message))
+            # Next grid slot after this rerun finished
+            due += interval * max(1, math.ceil((time.perf_counter() - due) / interval))
+
+    queries0, cpu0, wall0 = fake.queries, time.process_time(), time.perf_counter()
+    threads = [threading.Thread(target=viewer, args=(i,), daemon=True) for i in range(viewers)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    wall = time.perf_counter() - wall0
+    rss_after = _rss_mb()
+
+    latencies.sort()
+    def pct(q: float) -> float:
+        return round(latencies[min(len(latencies) - 1, int(q * len(latencies)))] * 1000, 1) if latencies else 0.0
+
+    return {
+        "viewers": viewers,
+        "reruns": len(latencies),
+        "p50_ms": pct(0.50),
+        "p95_ms": pct(0.95),
+        "p99_ms": pct(0.99),
+        "mean_ms": round(statistics.mean(latencies) * 1000, 1) if latencies else 0.0,
+        "missed": round(misses[0] / len(latencies), 3) if latencies else 0.0,
+        "queries_per_sec": round((fake.queries - queries0) / wall, 1),
+        "cpu_pct": round((time.process_time() - cpu0) / wall * 100, 1),
+        "rss_mb": round(rss_after, 1),
+        "mb_per_session": round(max(rss_after - rss_before, 0) / viewers, 2),
+        "errors": errors[:5],
+    }
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="SmartQuail concurrent viewer benchmark")
+    parser.add_argument("--app", choices=sorted(APPS), default="dashboard")
+    parser.add_argument("--viewers", default="1,2,5,10,20", help="comma-separated viewer counts, in order")
+    parser.add_argument("--duration", type=float, default=20, help="seconds per viewer count")
+    parser.add_argument("--interval", type=float, default=2.0, help="refresh deadline in seconds")
+    parser.add_argument("--query-ms", type=float, default=30, help="simulated Supabase round trip")
+    parser.add_argument("--miss-budget", type=float, default=0.01, help="allowed share of missed deadlines")
+    parser.add_argument("--json", metavar="PATH", help="also write the results as JSON")
+    args = parser.parse_args()
+
+    os.environ.setdefault("QUERY_BUDGET_RPS", "0")
+    logging.disable(logging.WARNING)  # Streamlit logs deprecation notices on every rerun
+    fake = FakeSupabase(args.query_ms)
+    make_session = _install(args.app, fake)
+
+    print("=" * 60)
+    print(f"🐦 SmartQuail Viewer Benchmark ({APPS[args.app].relative_to(HERE.parent)})")
+    print("=" * 60)
+    print(f"Deadline {args.interval:g}s, {args.duration:g}s per step, fake query {args.query_ms:g} ms")
+
+    # Warm imports and process-wide caches so step 1 isn't charged for them
+    make_session().run()
+
+    print(f"{'viewers':>7} {'reruns':>6} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} {'missed':>7} "
+          f"{'q/s':>6} {'cpu %':>6} {'MB/sess':>8}")
+    results, capacity = [], 0
+    for viewers in [int(v) for v in args.viewers.split(",")]:
+        r = run_step(make_session, fake, viewers, args.duration, args.interval)
+        results.append(r)
+        ok = r["p95_ms"] <= args.interval * 1000 and r["missed"] <= args.miss_budget and not r["errors"]
+        print(f"{viewers:>7} {r['reruns']:>6} {r['p50_ms']:>8} {r['p95_ms']:>8} {r['p99_ms']:>8} "
+              f"{r['missed']:>7.1%} {r['queries_per_sec']:>6} {r['cpu_pct']:>6} {r['mb_per_session']:>8}"
+              f"  {'✅' if ok else '❌'}")
+        for error in r["errors"]:
+            print(f"    Error: {error}")
+        if not ok:
+            break
+        capacity = viewers
+
+    print("=" * 60)
+    if capacity:
+        print(f"[✅] Refresh deadlines met up to {capacity} viewers")
+    else:
+        print("[❌] Deadlines missed at the first viewer count")
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump({"app": args.app, "interval": args.interval, "query_ms": args.query_ms,
+                       "capacity": capacity, "steps": results}, f, indent=2)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
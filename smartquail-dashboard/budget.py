@@ -0,0 +1,117 @@
+"""
+SmartQuail Query Budget
+=======================
+Admission control for Supabase requests by caller class
+
+The Supabase plan has a request quota. Every backend call is counted
+against QUERY_BUDGET_RPS (requests per second, averaged over
+QUERY_BUDGET_WINDOW_SEC) under one of these caller classes:
+
+    ingest     bridge and edge writes; always admitted, only counted
+    dashboard  Streamlit views and the read API (the default)
+    export     CSV downloads and reports
+
+Each read class may only use the budget up to its share in
+QUERY_BUDGET_SHARE. Past that share its calls are shed: guarded reads
+return the key's last good snapshot instead (see GuardedBackend.read), so
+a viewer sees data a few seconds old rather than an error. Ingest is never
+shed, and the headroom left above the read shares is kept for it.
+
+The budget is per process. Give the bridge and the dashboard their part
+of the plan's quota with QUERY_BUDGET_RPS in each environment.
+
+    with budget.caller("export"):
+        df = db.get_history_data(device, hours)
+"""
+
+import contextlib
+import contextvars
+import threading
+import time
+from collections import deque
+from typing import Deque, Dict, Iterator
+
+import config
+import telemetry
+
+CALLERS = ("ingest", "dashboard", "export")
+
+BUDGET_REQUESTS = telemetry.counter("smartquail_db_budget_requests_total",
+                                    "Backend calls by caller class and admission result")
+BUDGET_USAGE = telemetry.gauge("smartquail_db_budget_usage_ratio",
+                               "Backend requests/s over the query budget, all caller classes")
+
+_caller: contextvars.ContextVar = contextvars.ContextVar("budget_caller", default="dashboard")
+
+
+class BudgetExceeded(Exception):
+    """Raised when a call was shed to stay inside the query budget"""
+
+
+@contextlib.contextmanager
+def caller(name: str) -> Iterator[None]:
+    """Count backend calls made inside the block under caller class name"""
+    if name not in CALLERS:
+        raise ValueError(f"Unknown caller class: {name}")
+    token = _caller.set(name)
+    try:
+        yield
+    finally:
+        _caller.reset(token)
+
+
+def current_caller() -> str:
+    return _caller.get()
+
+
+class QueryBudget:
+    """Sliding-window request rate per caller class with priority shedding"""
+
+    def __init__(self, rps: float = config.QUERY_BUDGET_RPS,
+                 window_sec: float = config.QUERY_BUDGET_WINDOW_SEC,
+                 shares: Dict[str, float] = config.QUERY_BUDGET_SHARE):
+        self.rps = rps
+        self.window_sec = window_sec
+        self.shares = shares
+        self._calls: Dict[str, Deque[float]] = {c: deque() for c in CALLERS}
+        self._shed: Dict[str, int] = dict.fromkeys(CALLERS, 0)
+        self._lock = threading.Lock()
+
+    def _trim(self, now: float):
+        cutoff = now - self.window_sec
+        for calls in self._calls.values():
+            while calls and calls[0] < cutoff:
+                calls.popleft()
+
+    def admit(self, name: str) -> bool:
+        """Count one call by caller class name; False if it should be shed"""
+        now = time.monotonic()
+        with self._lock:
+            self._trim(now)
+            if self.rps > 0 and name != "ingest":
+                limit = self.rps * self.window_sec * self.shares.get(name, 1.0)
+                if sum(len(c) for c in self._calls.values()) >= limit:
+                    self._shed[name] += 1
+                    BUDGET_REQUESTS.inc(caller=name, result="shed")
+                    return False
+            self._calls[name].append(now)
+            used = sum(len(c) for c in self._calls.values())
+        BUDGET_REQUESTS.inc(caller=name, result="admitted")
+        if self.rps > 0:
+            BUDGET_USAGE.set(round(used / (self.rps * self.window_sec), 3))
+        return True
+
+    def usage(self) -> Dict[str, object]:
+        """Requests/s per caller class, total, the budget and shed counts"""
+        with self._lock:
+            self._trim(time.monotonic())
+            rates = {c: round(len(calls) / self.window_sec, 2) for c, calls in self._calls.items()}
+            shed = dict(self._shed)
+        total = round(sum(rates.values()), 2)
+        return {
+            "rps": rates,
+            "total_rps": total,
+            "budget_rps": self.rps,
+            "ratio": round(total / self.rps, 3) if self.rps > 0 else None,
+            "shed": shed,
+        }
@@ -19,6 +19,16 @@ MQTT_BROKER = "broker.hivemq.com"
 MQTT_PORT = 1883
 MQTT_TOPIC = "iot/smartquail/dht"
 MQTT_CLIENT_ID = "streamlit-smartquail-dashboard"
+MQTT_FARM_TOPIC = os.getenv("MQTT_FARM_TOPIC", "")  # e.g. iot/smartquail/+/+/dht; empty = single topic only
+FARM_TOPIC_LEVELS = ("farm", "house")  # what each + in MQTT_FARM_TOPIC holds, in order
+FARM_WRITERS = 2          # Supabase writer threads per farm (MQTT_FARM_TOPIC)
+DEFAULT_FARM = "default"  # farm of readings from MQTT_TOPIC
+MQTT_QOS = 1  # at-least-once; redeliveries are dropped by dedup.py
+MQTT_RECORD_PATH = os.getenv("MQTT_RECORD_PATH", "")  # bridge traffic capture for traffic.py replay; empty = off
+INGEST_EXTRA_METRICS = ("nh3", "mist", "fan", "exhaust", "feed")  # non-core metrics kept from payloads (schema.py)
+CLOCK_SKEW_MAX_SEC = 300  # device ts further than this from bridge time is ignored (sampled_ms = arrival)
+DEDUP_WINDOW_SIZE = 256  # recent message keys remembered per device
+DEDUP_SEQ_RESET_GAP = 16  # seq this far below the newest (no boot id) = device rebooted
 
 # =============================================================================
 # THI THRESHOLDS (Temperature Humidity Index)
@@ -35,12 +45,166 @@ TEMP_MAX_OPTIMAL = 26  # °C
 HUMIDITY_MIN_OPTIMAL = 60  # %
 HUMIDITY_MAX_OPTIMAL = 70  # %
 
+# =============================================================================
+# SENSOR ANOMALY DETECTION
+# =============================================================================
+ANOMALY_EWMA_ALPHA = 0.05    # weight of the newest reading in the rolling baseline
+ANOMALY_ZSCORE = 4.0         # |z| above this = outlier
+ANOMALY_WARMUP = 30          # readings before z-scores are trusted
+ANOMALY_STUCK_COUNT = 30     # identical readings in a row (~1 min at 2 s)
+ANOMALY_VALID_RANGE = {      # outside = invalid, dropped
+    "temp": (-10, 60),
+    "rh": (0.1, 100),
+    "thi": (20, 110),
+}
+ANOMALY_MAX_RATE = {         # (max change per minute, noise tolerance)
+    "temp": (3.0, 0.8),
+    "rh": (15.0, 4.0),
+    "thi": (5.0, 1.5),
+}
+
+# =============================================================================
+# THI FORECAST (computed in the bridge)
+# =============================================================================
+FORECAST_HORIZON_MIN = 30      # thi_forecast looks this far ahead
+FORECAST_MAX_ETA_MIN = 60      # report time-to-THI_WARNING only within this lead
+FORECAST_LEVEL_TAU_SEC = 120   # smoothing time constant for the level
+FORECAST_TREND_TAU_SEC = 600   # smoothing time constant for the trend (slower = steadier)
+FORECAST_WARMUP = 30           # readings before a forecast is published
+
+# =============================================================================
+# RELAY ANALYTICS
+# =============================================================================
+RELAY_LOAD_WATTS = 120  # fan + misting pump draw while the relay is ON (energy estimate)
+
+# =============================================================================
+# REPORTS (reports.py)
+# =============================================================================
+REPORT_TIMEZONE = os.getenv("REPORT_TIMEZONE", "Asia/Jakarta")  # day/week boundaries
+REPORT_DIR = os.getenv("REPORT_DIR", "reports")
+REPORT_QUERY_TIMEOUT = 30  # seconds for one period's bulk rollup query
+
+# =============================================================================
+# ALERTS (evaluated in the bridge)
+# =============================================================================
+ALERT_WEBHOOK_URL = os.getenv("ALERT_WEBHOOK_URL", "")  # e.g. http://127.0.0.1:8765/alerts
+ALERT_HYSTERESIS = {"thi": 1.0, "temp": 0.5, "rh": 2.0}  # clear this far back inside the limit
+ALERT_DEBOUNCE_SEC = 20    # breach must last this long before firing
+ALERT_COOLDOWN_SEC = 300   # min seconds between notifications per device + rule
+ALERT_SILENCE_SEC = 60     # no message (sensor errors included) for this long = device silent
+
+# =============================================================================
+# EDGE MODE (bridge keeps raw data locally, uploads window summaries)
+# =============================================================================
+EDGE_MODE = os.getenv("EDGE_MODE", "0") == "1"
+EDGE_DB_PATH = os.getenv("EDGE_DB_PATH", "edge_raw.sqlite")
+EDGE_WINDOW_SEC = 60            # summary window; keep 60 so rollups stay per minute
+EDGE_UPLOAD_SEC = int(os.getenv("EDGE_UPLOAD_SEC", "60"))  # batch upload period
+EDGE_UPLOAD_BATCH = 500         # outbox rows per upload request
+EDGE_RETENTION_HOURS = 72       # raw readings kept on the edge
+EDGE_ALERT_CONTEXT_MIN = 10     # raw minutes uploaded when an alert fires
+
+# =============================================================================
+# DATA SINKS (bridge fan-out, sinks.py)
+# =============================================================================
+SINK_QUEUE_SIZE = 10000        # readings buffered per sink; new ones are dropped beyond this
+SINK_MAX_RETRIES = 3           # attempts per batch for optional sinks (Supabase retries transient errors until stored)
+SINK_DEAD_LETTER_DIR = os.getenv("SINK_DEAD_LETTER_DIR", "dead_letter")  # readings a sink gave up on, JSONL per sink; empty = log only
+SUPABASE_SINK_BATCH = 50       # rows per sensor_logs request
+SUPABASE_SINK_FLUSH_SEC = 1.0  # max wait before a partial batch is written
+INFLUX_WRITE_URL = os.getenv("INFLUX_WRITE_URL", "")  # e.g. http://127.0.0.1:8086/api/v2/write?org=farm&bucket=smartquail
+INFLUX_TOKEN = os.getenv("INFLUX_TOKEN", "")
+JSONL_SINK_DIR = os.getenv("JSONL_SINK_DIR", "")  # e.g. archive; empty = off
+JSONL_SINK_KEEP_DAYS = 14
+NEXTION_SINK = os.getenv("NEXTION_SINK", "0") == "1"
+NEXTION_TOPIC = "iot/smartquail/{device}/display"
+
+# =============================================================================
+# HOT TIER (hot_tier.py)
+# =============================================================================
+HOT_TIER_ENABLED = os.getenv("HOT_TIER", "0") == "1"  # bridge keeps recent readings in memory
+HOT_TIER_HOURS = 72          # history per device ring buffer (at EXPECTED_INTERVAL_SEC)
+HOT_TIER_MAX_DEVICES = 64    # ring buffers allocated at most (~4 MB each at 72 h)
+HOT_TIER_HOST = os.getenv("HOT_TIER_HOST", "127.0.0.1")
+HOT_TIER_PORT = int(os.getenv("HOT_TIER_PORT", "8788"))
+HOT_TIER_URL = os.getenv("HOT_TIER_URL", "")  # dashboards: e.g. http://127.0.0.1:8788; empty = Supabase only
+HOT_TIER_TIMEOUT = 0.25      # seconds before a dashboard read falls back to Supabase
+
+# =============================================================================
+# READ API (api.py, for the Flutter app)
+# =============================================================================
+API_HOST = os.getenv("API_HOST", "0.0.0.0")
+API_PORT = int(os.getenv("API_PORT", "8787"))
+API_CACHE_TTL = 2        # seconds a response is reused for every client asking the same thing
+API_CACHE_MAX_KEYS = 1000  # cached responses kept at most (oldest evicted)
+API_MAX_HOURS = 168      # longest history window served
+API_MAX_POINTS = 500     # most points per history response
+API_GZIP_MIN_BYTES = 512  # smaller bodies are sent uncompressed
+
+# =============================================================================
+# CLOSED-LOOP CONTROL (relay commands from the bridge)
+# =============================================================================
+CONTROL_ENABLED = os.getenv("CONTROL_ENABLED", "0") == "1"  # off: devices keep their local logic
+CONTROL_CMD_TOPIC = "iot/smartquail/{device}/cmd"
+CONTROL_ACK_TOPIC = "iot/smartquail/+/ack"
+CONTROL_HYSTERESIS = {"thi": 1.0, "rh": 3.0}  # switch off this far back inside the limit
+CONTROL_MAX_MISTING = 4        # devices misting at once (shared pump/water line)
+CONTROL_TARGET_MS = 100        # warn when ingest-to-command takes longer
+CONTROL_ACK_TIMEOUT_SEC = 2    # resend a command not acked within this time
+CONTROL_MAX_RETRIES = 3
+
 # =============================================================================
 # DASHBOARD SETTINGS
 # =============================================================================
 REFRESH_INTERVAL = 2  # seconds
 HISTORY_HOURS = 24    # hours of history to display
 MAX_DATA_POINTS = 1000  # maximum data points to load
+DEFAULT_DEVICE = os.getenv("DEFAULT_DEVICE", "esp32-01")
+DASHBOARD_METRICS = ("temp", "rh", "thi", "relay", "status")  # fetched for charts/CSV (schema.py)
+STATS_WINDOWS = (1, 6, 24, 72)  # hours shown side by side on the statistics card
+STATS_MAX_HOURS = 72            # longest window kept in memory (window_stats.py)
+
+# =============================================================================
+# FLEET OVERVIEW
+# =============================================================================
+FLEET_SPARKLINE_HOURS = 6    # hours covered by each tile sparkline
+FLEET_SPARKLINE_POINTS = 36  # points per sparkline (10 min buckets)
+DEVICE_OFFLINE_SECONDS = 60  # no reading for this long = device shown offline
+
+# =============================================================================
+# DATA GAPS / UPTIME
+# =============================================================================
+EXPECTED_INTERVAL_SEC = 2     # ESP32 publish interval (for the expected message rate)
+GAP_MIN_SEC = 60              # silence longer than this counts as a gap
+UPTIME_RAW_MAX_HOURS = 0.5    # windows up to this use raw timestamps, longer ones rollups
+WATCHDOG_INTERVAL_SEC = 5     # bridge last-seen watchdog period
+
+# =============================================================================
+# CHART RENDERING
+# =============================================================================
+CHART_RENDER_MODE = os.getenv("CHART_RENDER_MODE", "auto")  # auto | svg | webgl
+CHART_WEBGL_THRESHOLD = 500  # points per trace before switching to WebGL
+
+# =============================================================================
+# METRICS
+# =============================================================================
+DASHBOARD_METRICS_PORT = int(os.getenv("DASHBOARD_METRICS_PORT", "9108"))
+BRIDGE_METRICS_PORT = int(os.getenv("BRIDGE_METRICS_PORT", "9109"))
+
+# =============================================================================
+# BACKEND RESILIENCE
+# =============================================================================
+DB_CALL_TIMEOUT = float(os.getenv("DB_CALL_TIMEOUT", "3"))  # seconds per Supabase call
+CIRCUIT_FAILURE_THRESHOLD = 3  # consecutive failures before failing fast
+CIRCUIT_RESET_TIMEOUT = 15     # seconds before a trial call is let through
+DB_SNAPSHOT_MAX_KEYS = 512     # last-good read results kept (least recently refreshed evicted)
+
+# =============================================================================
+# QUERY BUDGET
+# =============================================================================
+QUERY_BUDGET_RPS = float(os.getenv("QUERY_BUDGET_RPS", "10"))  # Supabase requests/s for this process; 0 = unlimited
+QUERY_BUDGET_WINDOW_SEC = 10   # rate averaged over this window
+QUERY_BUDGET_SHARE = {"dashboard": 0.8, "export": 0.5}  # budget fraction past which a read class is shed
 
 # =============================================================================
 # TRANSLATIONS (Bilingual ID/EN)
@@ -84,6 +248,19 @@ TRANSLATIONS = {
         "check_environment": "Check environment conditions",
         "no_data": "No data available",
         "loading": "Loading...",
+        "stale_data": "Showing cached data",
+        "backend_unavailable": "Database is not responding. Last good data from",
+        "debug_metrics": "Debug metrics",
+        "sensor_suspect": "Sensor Suspect",
+        "cycles": "cycles",
+        "forecast": "Forecast",
+        "uptime": "Uptime",
+        "gaps": "gaps",
+        "longest": "longest",
+        "no_reading_since": "No reading since",
+        "dashboard": "Dashboard",
+        "fleet": "Fleet Overview",
+        "open_device": "Open device",
     },
     "id": {
         "title": "SmartQuail Dashboard",
@@ -123,6 +300,19 @@ TRANSLATIONS = {
         "check_environment": "Periksa kondisi lingkungan",
         "no_data": "Tidak ada data",
         "loading": "Memuat...",
+        "stale_data": "Menampilkan data tersimpan",
+        "backend_unavailable": "Database tidak merespons. Data terakhir dari",
+        "debug_metrics": "Metrik debug",
+        "sensor_suspect": "Sensor Mencurigakan",
+        "cycles": "siklus",
+        "forecast": "Prediksi",
+        "uptime": "Waktu aktif",
+        "gaps": "celah",
+        "longest": "terlama",
+        "no_reading_since": "Tidak ada data sejak",
+        "dashboard": "Dasbor",
+        "fleet": "Ringkasan Kandang",
+        "open_device": "Buka perangkat",
     }
 }
 
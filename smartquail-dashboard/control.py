@@ -0,0 +1,241 @@
+"""
+SmartQuail Closed-Loop Control
+==============================
+Server-side relay commands published back to the ESP32 over MQTT
+
+The bridge runs the policy on every reading that passes dedup and
+validation (database.screen_reading), before any database work, and
+publishes a command only when an
+actuator's desired state changes. Actuators follow the Nextion CONTROL
+page: MIST, FAN, EXHAUST and FEED (FEED is manual only).
+
+Command (bridge -> device), topic CONTROL_CMD_TOPIC:
+    {"id": "a1b2c3", "cmd": "FAN", "val": 1, "reason": "thi 79.2",
+     "ingest_to_cmd_ms": 3.1}
+
+Ack (device -> bridge), topic CONTROL_ACK_TOPIC:
+    {"id": "a1b2c3", "ok": true}
+
+ingest_to_cmd_ms is the time from receiving the reading to publishing the
+command (target: under CONTROL_TARGET_MS). Round-trip ack latency is
+recorded in telemetry. Unacknowledged commands are resent a few times.
+Devices reporting "mode": "MANUAL" (Nextion manual mode) are left alone.
+"""
+
+import json
+import threading
+import time
+import uuid
+from typing import Any, Dict, List, Optional, Tuple
+
+import config
+import schema
+import telemetry
+
+ACTUATORS = ("MIST", "FAN", "EXHAUST", "FEED")
+
+CONTROL_LATENCY = telemetry.histogram(
+    "smartquail_control_latency_seconds", "Ingest-to-command and command-to-ack latency"
+)
+CONTROL_COMMANDS = telemetry.counter("smartquail_control_commands_total", "Relay commands by actuator and result")
+
+
+# =============================================================================
+# POLICY
+# =============================================================================
+class CoolingPolicy:
+    """
+    THI-driven cooling with hysteresis plus a fleet-wide misting cap.
+
+    FAN     on at THI >= THI_WARNING
+    MIST    on at THI >= THI_DANGER while rh is below HUMIDITY_MAX_OPTIMAL,
+            limited to CONTROL_MAX_MISTING devices at once (shared pump)
+    EXHAUST on while rh is above HUMIDITY_MAX_OPTIMAL
+
+    A misting slot is freed when the device stops misting, switches to
+    MANUAL, or sends no reading for stale_after seconds.
+    """
+
+    def __init__(self, max_misting: int = config.CONTROL_MAX_MISTING,
+                 stale_after: float = config.DEVICE_OFFLINE_SECONDS):
+        self.max_misting = max_misting
+        self.stale_after = stale_after
+        self.thi_h = config.CONTROL_HYSTERESIS["thi"]
+        self.rh_h = config.CONTROL_HYSTERESIS["rh"]
+        # device -> time of its last reading while holding a misting slot
+        self._misting: Dict[str, float] = {}
+
+    def release(self, device: str):
+        """Free the device's misting slot (e.g. it went to MANUAL)"""
+        self._misting.pop(device, None)
+
+    def decide(self, device: str, reading: Dict[str, float], current: Dict[str, int],
+               now: Optional[float] = None) -> Dict[str, Tuple[int, str]]:
+        """
+        Desired {actuator: (val, reason)} for actuators the policy drives;
+        now is the reading's arrival time (time.perf_counter()).
+        """
+        now = time.perf_counter() if now is None else now
+        thi, rh = reading["thi"], reading["rh"]
+        desired = {}
+
+        fan_on = current.get("FAN", 0)
+        if thi >= config.THI_WARNING:
+            fan_on = 1
+        elif thi < config.THI_WARNING - self.thi_h:
+            fan_on = 0
+        desired["FAN"] = (fan_on, f"thi {thi:g}")
+
+        exhaust_on = current.get("EXHAUST", 0)
+        if rh > config.HUMIDITY_MAX_OPTIMAL:
+            exhaust_on = 1
+        elif rh < config.HUMIDITY_MAX_OPTIMAL - self.rh_h:
+            exhaust_on = 0
+        desired["EXHAUST"] = (exhaust_on, f"rh {rh:g}")
+
+        mist_on = current.get("MIST", 0)
+        if thi >= config.THI_DANGER and rh < config.HUMIDITY_MAX_OPTIMAL:
+            mist_on = 1
+        elif thi < config.THI_DANGER - self.thi_h or rh >= config.HUMIDITY_MAX_OPTIMAL + self.rh_h:
+            mist_on = 0
+        reason = f"thi {thi:g}, rh {rh:g}"
+        if mist_on and device not in self._misting and len(self._misting) >= self.max_misting:
+            # Devices that went quiet while misting don't keep their slot
+            for other, last in list(self._misting.items()):
+                if now - last > self.stale_after:
+                    del self._misting[other]
+            if len(self._misting) >= self.max_misting:
+                mist_on, reason = 0, f"misting cap {self.max_misting} reached"
+        if mist_on:
+            self._misting[device] = now
+        else:
+            self._misting.pop(device, None)
+        desired["MIST"] = (mist_on, reason)
+
+        return desired
+
+
+# =============================================================================
+# CONTROLLER
+# =============================================================================
+class RelayController:
+    """Publishes changed actuator states and tracks acknowledgements"""
+
+    def __init__(self, client, policy: Optional[CoolingPolicy] = None):
+        self.client = client
+        self.policy = policy or CoolingPolicy()
+        self._state: Dict[str, Dict[str, int]] = {}
+        # command id -> [command, device, first sent (perf_counter), last sent, attempts]
+        self._pending: Dict[str, List[Any]] = {}
+        self._lock = threading.Lock()
+
+    def on_reading(self, device: str, payload: Dict[str, Any], received_at: float):
+        """Run the policy for one reading; received_at is time.perf_counter() at arrival"""
+        if str(payload.get("mode", "AUTO")).upper() == "MANUAL":
+            with self._lock:
+                self.policy.release(device)
+            return
+        try:
+            reading = {"thi": float(payload["thi"]), "rh": float(payload["rh"])}
+        except (KeyError, TypeError, ValueError):
+            return
+
+        with self._lock:
+            current = self._state.setdefault(device, {})
+            # Device-reported actuator states win over what we last sent
+            for actuator in ACTUATORS:
+                raw = payload.get(actuator.lower())
+                reported = schema._switch(raw) if raw is not None else None
+                if reported is not None:
+                    current[actuator] = reported
+            changes = [
+                (actuator, val, reason)
+                for actuator, (val, reason) in self.policy.decide(device, reading, current, received_at).items()
+                if current.get(actuator, 0) != val
+            ]
+            for actuator, val, _ in changes:
+                current[actuator] = val
+
+        for actuator, val, reason in changes:
+            self.send_command(device, actuator, val, reason, received_at)
+
+    def send_command(self, device: str, actuator: str, val: int, reason: str = "manual",
+                     received_at: Optional[float] = None) -> str:
+        """Publish one command (also used for manual FEED); returns its id"""
+        command = {"id": uuid.uuid4().hex[:12], "cmd": actuator, "val": int(val), "reason": reason}
+        if received_at is not None:
+            command["ingest_to_cmd_ms"] = round((time.perf_counter() - received_at) * 1000, 2)
+        self._publish(device, command)
+        sent = time.perf_counter()
+
+        if received_at is not None:
+            latency = sent - received_at
+            CONTROL_LATENCY.observe(latency, stage="ingest_to_command")
+            if latency * 1000 > config.CONTROL_TARGET_MS:
+                print(f"[⚠️] Control latency {latency * 1000:.0f} ms for {device} {actuator}")
+        print(f"[🎛️] {device} {actuator}={val} ({reason})")
+        with self._lock:
+            self._state.setdefault(device, {})[actuator] = int(val)
+            # A newer command for the same actuator replaces any unacked one
+            superseded = [command_id for command_id, entry in self._pending.items()
+                          if entry[1] == device and entry[0]["cmd"] == actuator]
+            for command_id in superseded:
+                del self._pending[command_id]
+            self._pending[command["id"]] = [command, device, sent, sent, 1]
+        if superseded:
+            CONTROL_COMMANDS.inc(len(superseded), actuator=actuator, result="superseded")
+        return command["id"]
+
+    def on_ack(self, payload: Dict[str, Any]):
+        """Handle an ack from a device"""
+        with self._lock:
+            pending = self._pending.pop(payload.get("id"), None)
+        if pending is None:
+            return
+        command, device, first_sent = pending[0], pending[1], pending[2]
+        CONTROL_LATENCY.observe(time.perf_counter() - first_sent, stage="command_to_ack")
+        ok = bool(payload.get("ok", True))
+        CONTROL_COMMANDS.inc(actuator=command["cmd"], result="ack" if ok else "rejected")
+        if not ok:
+            print(f"[❌] {device} rejected {command['cmd']}={command['val']}")
+
+    def check_timeouts(self):
+        """
+        Resend unacknowledged commands; give up after CONTROL_MAX_RETRIES.
+        Commands whose value is no longer the actuator's desired state are
+        dropped instead of resent.
+        """
+        now = time.perf_counter()
+        resend, expired, stale = [], [], []
+        with self._lock:
+            for command_id, entry in list(self._pending.items()):
+                if now - entry[3] < config.CONTROL_ACK_TIMEOUT_SEC:
+                    continue
+                command, device = entry[0], entry[1]
+                if self._state.get(device, {}).get(command["cmd"]) != command["val"]:
+                    stale.append(self._pending.pop(command_id))
+                elif entry[4] > config.CONTROL_MAX_RETRIES:
+                    expired.append(self._pending.pop(command_id))
+                else:
+                    entry[3], entry[4] = now, entry[4] + 1
+                    resend.append(entry)
+        for command, device, *_ in resend:
+            self._publish(device, command)
+        for command, *_ in stale:
+            CONTROL_COMMANDS.inc(actuator=command["cmd"], result="superseded")
+        for command, device, *_ in expired:
+            CONTROL_COMMANDS.inc(actuator=command["cmd"], result="timeout")
+            print(f"[❌] No ack from {device} for {command['cmd']}={command['val']}")
+
+    def run_ack_watch(self, interval: float = 1.0):
+        """Start a daemon thread calling check_timeouts() every interval seconds"""
+        def loop():
+            while True:
+                time.sleep(interval)
+                self.check_timeouts()
+
+        threading.Thread(target=loop, name="control-ack-watch", daemon=True).start()
+
+    def _publish(self, device: str, command: Dict[str, Any]):
+        topic = config.CONTROL_CMD_TOPIC.format(device=device)
+        self.client.publish(topic, json.dumps(command), qos=1)
@@ -4,88 +4,541 @@ SmartQuail Database Handler
 Handles all Supabase database operations
 """
 
-from supabase import create_client, Client
+import threading
+import time
 from datetime import datetime, timedelta
-import pandas as pd
-from typing import Optional, List, Dict, Any
+from typing import Optional, List, Dict, Any, Sequence, TYPE_CHECKING
 import config
+import telemetry
+import schema
+from anomaly import StreamingDetector, has_fault
+import budget
+from dedup import DedupWindow, message_keys, normalize_ts_ms
+from resilience import GuardedBackend
+from window_stats import WindowStatsService
 
-# Initialize Supabase client
-supabase: Client = create_client(config.SUPABASE_URL, config.SUPABASE_KEY)
+# supabase and pandas are imported on first use to keep cold start fast;
+# the bridge never needs pandas at all.
+if TYPE_CHECKING:
+    import pandas as pd
+    from supabase import Client
 
-def insert_sensor_data(data: Dict[str, Any]) -> bool:
-    """Insert sensor data into database"""
+_client: Optional["Client"] = None
+_client_lock = threading.Lock()
+
+def get_client() -> "Client":
+    """Get the Supabase client, creating it on first use"""
+    global _client
+    if _client is None:
+        with _client_lock:
+            if _client is None:
+                from supabase import create_client, ClientOptions
+                _client = create_client(
+                    config.SUPABASE_URL,
+                    config.SUPABASE_KEY,
+                    options=ClientOptions(postgrest_client_timeout=config.DB_CALL_TIMEOUT),
+                )
+    return _client
+
+# Deadline + circuit breaker + last-good snapshots around every call,
+# counted against the request quota by caller class (budget.py)
+backend = GuardedBackend(
+    timeout=config.DB_CALL_TIMEOUT,
+    failure_threshold=config.CIRCUIT_FAILURE_THRESHOLD,
+    reset_timeout=config.CIRCUIT_RESET_TIMEOUT,
+    budget=budget.QueryBudget(),
+    max_keys=config.DB_SNAPSHOT_MAX_KEYS,
+)
+
+# Recent message keys per device, checked before every write
+dedup_window = DedupWindow(config.DEDUP_WINDOW_SIZE)
+
+# Per-device sensor fault detection, run after dedup so redeliveries
+# don't look like a stuck sensor
+detector = StreamingDetector()
+
+# Minute buckets per device for any-window statistics, synced from rollups
+stats_service = WindowStatsService(config.STATS_MAX_HOURS * 60)
+_stats_synced: Dict[str, float] = {}
+
+def get_backend_status() -> Dict[str, Any]:
+    """Get circuit state and whether any data shown is a stale snapshot"""
+    return backend.status()
+
+# Metrics the bridge's hot tier holds (hot_tier.py)
+HOT_METRICS = {"temp", "rh", "thi", "relay", "status"}
+
+# Idle keep-alive connections to the hot tier, shared by all sessions
+_hot_pool: List[Any] = []
+_hot_pool_lock = threading.Lock()
+_HOT_POOL_SIZE = 8
+
+def _hot_connection():
+    with _hot_pool_lock:
+        if _hot_pool:
+            return _hot_pool.pop()
+    import http.client
+    import urllib.parse
+    
+    url = urllib.parse.urlsplit(config.HOT_TIER_URL)
+    return http.client.HTTPConnection(url.hostname, url.port or 80, timeout=config.HOT_TIER_TIMEOUT)
+
+def _hot_read(path: str, **params) -> Optional[Dict[str, Any]]:
+    """
+    GET from the bridge's hot tier (HOT_TIER_URL) over a pooled keep-alive
+    connection. None when it is off, unreachable or has no data for the
+    device; callers then use Supabase.
+    """
+    if not config.HOT_TIER_URL:
+        return None
+    import http.client
+    import json
+    import urllib.parse
+    
+    target = f"{urllib.parse.urlsplit(config.HOT_TIER_URL).path.rstrip('/')}{path}?{urllib.parse.urlencode(params)}"
+    status, body = None, b""
+    for attempt in range(2):
+        conn = _hot_connection()
+        try:
+            conn.request("GET", target)
+            response = conn.getresponse()
+            status, body = response.status, response.read()
+        except ConnectionError:
+            # The bridge closed an idle connection (or restarted); try a fresh one once
+            conn.close()
+            continue
+        except (OSError, http.client.HTTPException):
+            conn.close()
+            break
+        with _hot_pool_lock:
+            if len(_hot_pool) < _HOT_POOL_SIZE:
+                _hot_pool.append(conn)
+                conn = None
+        if conn is not None:
+            conn.close()
+        break
+    if status != 200:
+        telemetry.CACHE_REQUESTS.inc(cache="hot", result="miss")
+        return None
+    telemetry.CACHE_REQUESTS.inc(cache="hot", result="hit")
+    return json.loads(body)
+
+def get_budget_usage() -> Dict[str, Any]:
+    """Get requests/s per caller class against the query budget"""
+    return backend.budget.usage()
+
+def screen_reading(data: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+    """
+    Dedup and validate one reading; cheap enough to run before control.
+    
+    Returns the core sensor_logs record (flags set), or None if the
+    reading is a duplicate or was dropped as invalid. Malformed payloads
+    raise (and are not remembered as seen).
+    """
+    device = data.get("device", "esp32-01")
+    window_key, dedup_key = message_keys(data)
+    # Keys from seq alone (no dedup_key) let the window spot a device reboot
+    restart_seq = data.get("seq") if not dedup_key else None
+    if window_key and dedup_window.seen(device, window_key, restart_seq):
+        telemetry.INGEST_DUPLICATES.inc(stage="window")
+        return None
+    
     try:
         record = {
-            "device": data.get("device", "esp32-01"),
+            "device": device,
             "temp": float(data.get("temp", 0)),
             "rh": float(data.get("rh", 0)),
             "thi": float(data.get("thi", 0)),
             "relay": data.get("relay", "OFF"),
-            "status": data.get("status", "OK")
+            "status": data.get("status", "OK"),
+            "schema_version": schema.SCHEMA_VERSION
         }
-        supabase.table("sensor_logs").insert(record).execute()
+        if data.get("seq") is not None:
+            record["seq"] = int(data["seq"])
+        ts_ms = normalize_ts_ms(data.get("ts"))
+        if ts_ms is not None:
+            record["ts_ms"] = ts_ms
+        record["sampled_ms"] = sample_time_ms(ts_ms)
+        if dedup_key:
+            record["dedup_key"] = dedup_key
+    except (TypeError, ValueError):
+        release_sensor_record(data)
+        raise
+    
+    if record["status"] != "SENSOR_ERROR":
+        drop, flags = detector.check(device, record, record["sampled_ms"] / 1000)
+        if drop:
+            telemetry.INGEST_REJECTED.inc(reason="invalid")
+            print(f"[ANOMALY] Dropped reading from {device}: {','.join(flags)}")
+            return None
+        if flags:
+            telemetry.INGEST_REJECTED.inc(len(flags), reason="flagged")
+            record["flags"] = ",".join(flags)
+    return record
+
+def complete_sensor_record(
+    record: Dict[str, Any],
+    data: Dict[str, Any],
+    metrics: Sequence[str] = config.INGEST_EXTRA_METRICS
+) -> Dict[str, Any]:
+    """Add the forecast and extra metric values (schema.py) of data to a screened record"""
+    # Set by the bridge's forecaster (forecast.py)
+    if "thi_forecast" in data:
+        record["thi_forecast"] = data["thi_forecast"]
+        record["thi_eta_min"] = data.get("thi_eta_min")
+    extra = schema.decode_extra(data, metrics)
+    if extra:
+        record["metrics"] = extra
+    return record
+
+def prepare_sensor_record(
+    data: Dict[str, Any],
+    metrics: Sequence[str] = config.INGEST_EXTRA_METRICS
+) -> Optional[Dict[str, Any]]:
+    """
+    Dedup, validate and flag one reading.
+    
+    Returns the sensor_logs record, or None if the reading is a duplicate
+    or was dropped as invalid. Malformed payloads raise (and are not
+    remembered as seen). Values of the extra metrics listed (schema.py)
+    ride along under "metrics" and are written to sensor_metrics.
+    """
+    record = screen_reading(data)
+    if record is None:
+        return None
+    return complete_sensor_record(record, data, metrics)
+
+def sample_time_ms(ts_ms: Optional[int], now: Optional[float] = None) -> int:
+    """
+    Epoch-ms sample time of a reading: the device timestamp when its clock
+    is plausible (within CLOCK_SKEW_MAX_SEC of ours), else arrival time.
+    """
+    now_ms = int((time.time() if now is None else now) * 1000)
+    if ts_ms is not None and abs(ts_ms - now_ms) <= config.CLOCK_SKEW_MAX_SEC * 1000:
+        return ts_ms
+    return now_ms
+
+def release_sensor_record(data: Dict[str, Any]):
+    """Forget a reading's dedup key so a redelivery can try again"""
+    window_key, _ = message_keys(data)
+    if window_key:
+        dedup_window.forget(data.get("device", "esp32-01"), window_key)
+
+def _dedup_conflict() -> str:
+    """
+    Unique key sensor_logs upserts conflict on. The farm-partitioned table
+    (MQTT_FARM_TOPIC, see README) only has a unique index that includes farm.
+    """
+    return "farm,device,dedup_key" if config.MQTT_FARM_TOPIC else "device,dedup_key"
+
+def _with_farm(records: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """Give rows without a farm DEFAULT_FARM when sensor_logs is partitioned by farm"""
+    if config.MQTT_FARM_TOPIC:
+        for record in records:
+            record.setdefault("farm", config.DEFAULT_FARM)
+    return records
+
+def insert_sensor_data(data: Dict[str, Any]) -> bool:
+    """
+    Insert sensor data into database (idempotent).
+    
+    Readings carrying seq/ts are checked against the in-memory window and
+    written as an upsert on (device, dedup_key) (with farm when partitioned),
+    so redeliveries are dropped. Returns True if stored or already stored.
+    """
+    try:
+        record = prepare_sensor_record(data)
+        if record is None:
+            return True
+        # Extra metrics go to sensor_metrics, not sensor_logs columns
+        (record,), metric_rows = _split_metrics([record])
+        _with_farm([record])
+        
+        table = get_client().table("sensor_logs")
+        if record.get("dedup_key"):
+            query = table.upsert(record, on_conflict=_dedup_conflict(), ignore_duplicates=True)
+        else:
+            query = table.insert(record)
+        backend.call(query.execute, caller="ingest")
+        _insert_metric_rows(metric_rows)
         return True
     except Exception as e:
+        # Let a redelivery of this reading try again
+        release_sensor_record(data)
         print(f"[DB ERROR] Insert failed: {e}")
         return False
 
+def _split_metrics(records: List[Dict[str, Any]]):
+    """sensor_logs rows without extra metrics, plus their sensor_metrics rows"""
+    rows, metric_rows = [], []
+    for record in records:
+        record = dict(record)
+        extra = record.pop("metrics", None)
+        rows.append(record)
+        if extra and record.get("sampled_ms"):
+            metric_rows.extend(
+                {"device": record["device"], "metric": schema.METRICS[name].id,
+                 "sampled_ms": record["sampled_ms"], "value": schema.encode(name, value)}
+                for name, value in extra.items()
+            )
+    return rows, metric_rows
+
+def _insert_metric_rows(metric_rows: List[Dict[str, Any]]):
+    if metric_rows:
+        backend.call(get_client().table("sensor_metrics")
+                     .upsert(metric_rows, on_conflict="device,metric,sampled_ms", ignore_duplicates=True).execute,
+                     caller="ingest")
+
+def insert_sensor_records(records: List[Dict[str, Any]]):
+    """
+    Bulk-write prepared sensor_logs records (see prepare_sensor_record).
+    
+    Rows with a dedup_key are upserted ignoring duplicates, so a retried
+    batch is safe. Rows routed by farm (MQTT_FARM_TOPIC) land in the farm's
+    partition, whose unique key includes farm. Raises on failure so the
+    caller can retry.
+    """
+    records, metric_rows = _split_metrics(records)
+    _with_farm(records)
+    table = get_client().table("sensor_logs")
+    keyed = [r for r in records if r.get("dedup_key")]
+    plain = [r for r in records if not r.get("dedup_key")]
+    if keyed:
+        backend.call(table.upsert(keyed, on_conflict=_dedup_conflict(), ignore_duplicates=True,
+                                  default_to_null=False).execute, caller="ingest")
+    if plain:
+        backend.call(table.insert(plain, default_to_null=False).execute, caller="ingest")
+    _insert_metric_rows(metric_rows)
+
+def is_permanent_error(error: Exception) -> bool:
+    """
+    True if a failed write will fail the same way on every retry: a
+    PostgREST 4xx or a Postgres data, constraint, schema or permission
+    error. Network errors, timeouts, 5xx and an open circuit are transient.
+    """
+    code = str(getattr(error, "code", "") or "")
+    if code.isdigit() and len(code) == 3:
+        return code.startswith("4") and code not in ("408", "429")  # HTTP status (body was not JSON)
+    return code.startswith(("22", "23", "42", "PGRST1", "PGRST2"))
+
+def upload_edge_batch(summaries: List[Dict[str, Any]], rows: List[Dict[str, Any]]):
+    """
+    Write edge-mode uploads: window summaries and sensor_logs rows.
+    
+    Both are upserts that ignore duplicates, so a retried batch is safe.
+    Raises on failure so the caller keeps the batch for later.
+    """
+    client = get_client()
+    if summaries:
+        backend.call(client.table("sensor_summary")
+                     .upsert(summaries, on_conflict="device,window_start", ignore_duplicates=True).execute,
+                     caller="ingest")
+    if rows:
+        rows, metric_rows = _split_metrics(rows)
+        _with_farm(rows)
+        backend.call(client.table("sensor_logs")
+                     .upsert(rows, on_conflict=_dedup_conflict(), ignore_duplicates=True,
+                             default_to_null=False).execute, caller="ingest")
+        _insert_metric_rows(metric_rows)
+
 def get_latest_data(device: str = "esp32-01") -> Optional[Dict[str, Any]]:
-    """Get the most recent sensor reading"""
-    try:
-        response = supabase.table("sensor_logs")\
+    """Get the most recent sensor reading (from the hot tier when available)"""
+    hot = _hot_read("/hot/latest", device=device)
+    if hot is not None:
+        return hot
+    
+    def fetch():
+        response = get_client().table("sensor_logs")\
             .select("*")\
             .eq("device", device)\
-            .order("created_at", desc=True)\
+            .order("sampled_ms", desc=True)\
             .limit(1)\
             .execute()
         
         if response.data:
             return response.data[0]
         return None
-    except Exception as e:
-        print(f"[DB ERROR] Get latest failed: {e}")
-        return None
+    
+    return backend.read(("get_latest_data", device), fetch)
 
 def get_history_data(
     device: str = "esp32-01",
     hours: int = 24,
-    limit: int = 1000
-) -> pd.DataFrame:
-    """Get historical sensor data"""
-    try:
-        since = (datetime.utcnow() - timedelta(hours=hours)).isoformat()
-        
-        response = supabase.table("sensor_logs")\
-            .select("*")\
-            .eq("device", device)\
-            .gte("created_at", since)\
-            .order("created_at", desc=False)\
-            .limit(limit)\
-            .execute()
-        
-        if response.data:
-            df = pd.DataFrame(response.data)
-            df['created_at'] = pd.to_datetime(df['created_at'])
+    limit: int = 1000,
+    metrics: Optional[Sequence[str]] = None
+) -> "pd.DataFrame":
+    """
+    Get historical sensor data, ordered by sample time.
+    
+    metrics limits the query to those metrics (schema.py), plus sampled_ms,
+    device and flags; None returns every sensor_logs column. Extra metrics
+    come from sensor_metrics and are aligned to the nearest reading.
+    created_at in the frame is the sample time, converted from the int64
+    sampled_ms column (no string parsing). Windows the bridge's hot tier
+    fully covers are served from it.
+    """
+    import pandas as pd
+    
+    columns, extras = schema.split(metrics) if metrics is not None else (["*"], [])
+    
+    if metrics is not None and set(metrics) <= HOT_METRICS and hours <= config.HOT_TIER_HOURS:
+        since_ms = int((time.time() - hours * 3600) * 1000)
+        hot = _hot_read("/hot/range", device=device, since=since_ms, limit=limit)
+        if hot is not None and hot["covers_from"] <= since_ms:
+            if not hot["sampled_ms"]:
+                return pd.DataFrame()
+            df = pd.DataFrame({"sampled_ms": hot["sampled_ms"], "device": device, "flags": hot["flags"],
+                               **{c: hot[c] for c in columns}})
+            if "relay" in df.columns:
+                df["relay"] = df["relay"].map({1: "ON", 0: "OFF"})
+            df["created_at"] = pd.to_datetime(df["sampled_ms"], unit="ms", utc=True)
             return df
+    
+    def fetch():
+        since_ms = int((time.time() - hours * 3600) * 1000)
+        
+        df = pd.DataFrame()
+        if columns:
+            select = "*" if columns == ["*"] else ",".join(["sampled_ms", "device", "flags"] + columns)
+            response = get_client().table("sensor_logs")\
+                .select(select)\
+                .eq("device", device)\
+                .gte("sampled_ms", since_ms)\
+                .order("sampled_ms", desc=False)\
+                .limit(limit)\
+                .execute()
+            if response.data:
+                df = pd.DataFrame(response.data)
+                df["sampled_ms"] = df["sampled_ms"].astype("int64")
         
+        if extras:
+            wide = _fetch_metric_series(device, since_ms, extras, limit * len(extras))
+            if df.empty or wide.empty:
+                df = wide if df.empty else df
+            else:
+                df = pd.merge_asof(df, wide, on="sampled_ms", direction="nearest",
+                                   tolerance=config.EXPECTED_INTERVAL_SEC * 1000)
+        if not df.empty:
+            df["created_at"] = pd.to_datetime(df["sampled_ms"], unit="ms", utc=True)
+        return df
+    
+    key = ("get_history_data", device, hours, limit, tuple(metrics) if metrics is not None else None)
+    return backend.read(key, fetch, pd.DataFrame())
+
+def _fetch_metric_series(device: str, since_ms: int, names: List[str], limit: int) -> "pd.DataFrame":
+    """Wide frame (sampled_ms + one column per metric) from sensor_metrics"""
+    import pandas as pd
+    
+    response = get_client().table("sensor_metrics")\
+        .select("sampled_ms,metric,value")\
+        .eq("device", device)\
+        .in_("metric", [schema.METRICS[n].id for n in names])\
+        .gte("sampled_ms", since_ms)\
+        .order("sampled_ms", desc=False)\
+        .limit(limit)\
+        .execute()
+    if not response.data:
         return pd.DataFrame()
-    except Exception as e:
-        print(f"[DB ERROR] Get history failed: {e}")
+    long = pd.DataFrame(response.data)
+    long["sampled_ms"] = long["sampled_ms"].astype("int64")
+    long["metric"] = long["metric"].map(schema.METRIC_NAMES)
+    wide = long.pivot_table(index="sampled_ms", columns="metric", values="value", aggfunc="last")
+    for name in wide.columns:
+        wide[name] = wide[name] / 10 ** schema.METRICS[name].scale
+    return wide.reset_index().rename_axis(columns=None)
+
+def _fetch_rollups(device: str, since: datetime) -> "pd.DataFrame":
+    """
+    Per-minute rollup rows since a time, as one array row (rollup_series).
+    Unguarded: run it through backend.read or backend.call.
+    """
+    import pandas as pd
+    
+    response = get_client().rpc(
+        "rollup_series", {"p_device": device, "p_since": since.isoformat()}
+    ).execute()
+    row = response.data[0] if response.data else None
+    if not row or not row.get("bucket"):
         return pd.DataFrame()
+    df = pd.DataFrame(row)
+    df["bucket"] = pd.to_datetime(df["bucket"], unit="s", utc=True)
+    return df
+
+def get_rollup_series(device: str = "esp32-01", hours: float = 24) -> "pd.DataFrame":
+    """Per-minute rollups (bucket, n, *_sum/min/max, relay_on) for the last `hours`"""
+    import pandas as pd
+    
+    since = datetime.utcnow() - timedelta(hours=hours)
+    return backend.read(("get_rollup_series", device, hours), lambda: _fetch_rollups(device, since), pd.DataFrame())
+
+def _sync_stats(device: str):
+    """Seed the window service from rollups, then pull only new minutes"""
+    now = time.time()
+    if now - _stats_synced.get(device, 0.0) < config.REFRESH_INTERVAL:
+        return
+    _stats_synced[device] = now
+    last_minute = stats_service.last_minute(device)
+    if last_minute is None:
+        since = datetime.utcnow() - timedelta(hours=config.STATS_MAX_HOURS)
+    else:
+        # Re-read the newest minute too, it may have grown since
+        since = datetime.utcfromtimestamp(last_minute * 60)
+    try:
+        stats_service.load_rollups(device, backend.call(lambda: _fetch_rollups(device, since)))
+    except Exception as e:
+        print(f"[DB ERROR] Rollup sync failed: {e}")
 
 def get_statistics(device: str = "esp32-01", hours: int = 24) -> Dict[str, Any]:
-    """Calculate statistics for the given time period"""
-    df = get_history_data(device, hours)
+    """
+    Calculate statistics for the given time period.
+    
+    Served from the bridge's hot tier when it covers the window, else from
+    the in-memory window service (O(log n), no download per call); falls
+    back to scanning the raw history if rollups are missing or the window
+    is longer than the service holds (STATS_MAX_HOURS).
+    """
+    if hours <= config.HOT_TIER_HOURS:
+        since_ms = int((time.time() - hours * 3600) * 1000)
+        hot = _hot_read("/hot/stats", device=device, since=since_ms, until=int(time.time() * 1000))
+        if hot is not None and hot["covers_from"] <= since_ms:
+            if not hot["n"]:
+                return _empty_statistics()
+            return {**{m: hot[m] for m in ("temp", "rh", "thi")},
+                    "relay_on_count": hot["relay_on"], "data_points": hot["n"]}
+    
+    if hours > config.STATS_MAX_HOURS:
+        return _scan_statistics(device, hours)
+    _sync_stats(device)
+    if stats_service.has(device):
+        return stats_service.stats(device, hours) or _empty_statistics()
+    return _scan_statistics(device, hours)
+
+def get_window_statistics(device: str = "esp32-01", windows=config.STATS_WINDOWS) -> Dict[int, Dict[str, Any]]:
+    """Statistics for several windows at once, e.g. {1: {...}, 6: {...}, ...}"""
+    return {hours: get_statistics(device, hours) for hours in windows}
+
+def _empty_statistics() -> Dict[str, Any]:
+    return {
+        "temp": {"avg": 0, "min": 0, "max": 0},
+        "rh": {"avg": 0, "min": 0, "max": 0},
+        "thi": {"avg": 0, "min": 0, "max": 0},
+        "relay_on_count": 0,
+        "data_points": 0
+    }
+
+def _scan_statistics(device: str, hours: int) -> Dict[str, Any]:
+    """Statistics computed from raw rows"""
+    df = get_history_data(device, hours, metrics=("temp", "rh", "thi", "relay", "status"))
+    
+    # Sensor errors and readings flagged as faults (stuck, jump) would
+    # distort min/max; same rule as the rollup trigger and the hot tier
+    if not df.empty:
+        df = df[df["status"] != "SENSOR_ERROR"]
+        if "flags" in df.columns:
+            df = df[~df["flags"].map(has_fault)]
     
     if df.empty:
-        return {
-            "temp": {"avg": 0, "min": 0, "max": 0},
-            "rh": {"avg": 0, "min": 0, "max": 0},
-            "thi": {"avg": 0, "min": 0, "max": 0},
-            "relay_on_count": 0,
-            "data_points": 0
-        }
+        return _empty_statistics()
     
     return {
         "temp": {
@@ -107,10 +560,63 @@ def get_statistics(device: str = "esp32-01", hours: int = 24) -> Dict[str, Any]:
         "data_points": len(df)
     }
 
+def get_minute_rollups(device: str = "esp32-01", hours: int = 24) -> "pd.DataFrame":
+    """Get per-minute reading and relay counts (bucket, n, relay_on) in one round trip"""
+    import pandas as pd
+    
+    def fetch():
+        since = (datetime.utcnow() - timedelta(hours=hours)).isoformat()
+        response = get_client().rpc(
+            "relay_rollup", {"p_device": device, "p_since": since}
+        ).execute()
+        row = response.data[0] if response.data else None
+        if not row or not row.get("bucket"):
+            return pd.DataFrame(columns=["bucket", "n", "relay_on"])
+        return pd.DataFrame({
+            "bucket": pd.to_datetime(row["bucket"], unit="s", utc=True),
+            "n": row["n"],
+            "relay_on": row["relay_on"],
+        })
+    
+    return backend.read(("get_minute_rollups", device, hours), fetch,
+                        pd.DataFrame(columns=["bucket", "n", "relay_on"]))
+
+def get_relay_analytics(device: str = "esp32-01", hours: int = 24) -> Dict[str, Any]:
+    """Relay on-time per hour/day, switch cycles, mean cycle length and energy"""
+    from analytics import relay_duty_cycle
+    
+    return relay_duty_cycle(get_minute_rollups(device, hours))
+
+def get_uptime(device: str = "esp32-01", hours: float = 24) -> Dict[str, Any]:
+    """
+    Data gaps, uptime % and message rate for the last `hours`.
+    
+    Short windows use raw reading times (exact), long ones the per-minute
+    rollups so a month costs one small query.
+    """
+    from analytics import data_gaps, rollup_gaps
+    
+    end = time.time()
+    start = end - hours * 3600
+    if hours > config.UPTIME_RAW_MAX_HOURS:
+        return rollup_gaps(get_minute_rollups(device, hours), start, end)
+    
+    def fetch():
+        response = get_client().table("sensor_logs")\
+            .select("sampled_ms")\
+            .eq("device", device)\
+            .gte("sampled_ms", int(start * 1000))\
+            .order("sampled_ms", desc=False)\
+            .limit(config.MAX_DATA_POINTS)\
+            .execute()
+        return [row["sampled_ms"] / 1000 for row in response.data or []]
+    
+    return data_gaps(backend.read(("get_uptime", device, hours), fetch, []), start, end)
+
 def get_device_list() -> List[str]:
     """Get list of all devices"""
-    try:
-        response = supabase.table("sensor_logs")\
+    def fetch():
+        response = get_client().table("sensor_logs")\
             .select("device")\
             .execute()
         
@@ -118,25 +624,45 @@ def get_device_list() -> List[str]:
             devices = list(set([d["device"] for d in response.data]))
             return sorted(devices)
         return ["esp32-01"]
-    except Exception as e:
-        print(f"[DB ERROR] Get devices failed: {e}")
-        return ["esp32-01"]
+    
+    return backend.read(("get_device_list",), fetch, ["esp32-01"])
+
+def get_fleet_latest() -> List[Dict[str, Any]]:
+    """Get current state of every device in one query (device_state table)"""
+    def fetch():
+        response = get_client().table("device_state")\
+            .select("*")\
+            .order("device")\
+            .execute()
+        return response.data or []
+    
+    return backend.read(("get_fleet_latest",), fetch, [])
+
+def get_fleet_sparklines(hours: int = 6, points: int = 36) -> Dict[str, List[float]]:
+    """Get downsampled THI series for all devices in one rollup query"""
+    def fetch():
+        response = get_client().rpc(
+            "fleet_sparklines", {"p_hours": hours, "p_points": points}
+        ).execute()
+        return {row["device"]: row["thi"] or [] for row in response.data or []}
+    
+    return backend.read(("get_fleet_sparklines", hours, points), fetch, {})
 
 def export_to_csv(device: str = "esp32-01", hours: int = 24) -> str:
     """Export data to CSV string"""
-    df = get_history_data(device, hours)
+    with budget.caller("export"):
+        df = get_history_data(device, hours)
     if not df.empty:
         return df.to_csv(index=False)
     return ""
 
 def get_data_count(device: str = "esp32-01") -> int:
     """Get total data count for device"""
-    try:
-        response = supabase.table("sensor_logs")\
+    def fetch():
+        response = get_client().table("sensor_logs")\
             .select("id", count="exact")\
             .eq("device", device)\
             .execute()
         return response.count if response.count else 0
-    except Exception as e:
-        print(f"[DB ERROR] Get count failed: {e}")
-        return 0
+    
+    return backend.read(("get_data_count", device), fetch, 0)
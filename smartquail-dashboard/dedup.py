@@ -0,0 +1,110 @@
+"""
+SmartQuail Ingest Deduplication
+===============================
+Drops MQTT redeliveries before they reach the database
+
+QoS 1 redelivery, reconnect storms and overlapping bridges deliver the same
+reading more than once. A reading is identified by its device timestamp
+("ts") or by a per-boot sequence number ("seq", optionally "boot"). The
+last N keys per device are kept in memory; the same key is also written as
+dedup_key so the database upsert ignores anything the window missed.
+
+Payload fields (all optional):
+    seq   - counter incremented per reading by the device
+    boot  - random id chosen at device boot (makes seq unique across reboots)
+    ts    - device sample time, epoch seconds or milliseconds
+
+Without boot (or ts), a rebooted device counts seq from the start again.
+A seq more than DEDUP_SEQ_RESET_GAP below the newest one seen is taken
+as such a restart and clears the device's window, so new readings are not
+dropped as repeats of the previous boot.
+"""
+
+import threading
+from collections import deque
+from typing import Any, Deque, Dict, Optional, Set, Tuple
+
+import config
+
+
+def normalize_ts_ms(value: Any) -> Optional[int]:
+    """Epoch seconds or milliseconds -> epoch milliseconds (None if missing/invalid)"""
+    try:
+        ts = float(value)
+    except (TypeError, ValueError):
+        return None
+    if ts <= 0:
+        return None
+    return int(ts if ts >= 1e12 else ts * 1000)
+
+
+def message_keys(payload: Dict[str, Any]) -> Tuple[Optional[str], Optional[str]]:
+    """
+    Return (window_key, dedup_key) for a payload.
+
+    window_key is used by the in-memory window; dedup_key is stored in the
+    database unique index and is only set when it stays unique across
+    device reboots (device timestamp, or seq together with boot).
+    """
+    ts_ms = normalize_ts_ms(payload.get("ts"))
+    if ts_ms is not None:
+        key = f"t{ts_ms}"
+        return key, key
+    seq = payload.get("seq")
+    if seq is None:
+        return None, None
+    boot = payload.get("boot")
+    if boot:
+        key = f"{boot}:{seq}"
+        return key, key
+    return f"s{seq}", None
+
+
+class DedupWindow:
+    """Last N message keys per device, FIFO eviction, O(1) lookups"""
+
+    def __init__(self, size: int = 256, reset_gap: int = config.DEDUP_SEQ_RESET_GAP):
+        self.size = size
+        self.reset_gap = reset_gap
+        self._seen: Dict[str, Tuple[Deque[str], Set[str]]] = {}
+        self._newest_seq: Dict[str, int] = {}
+        self._lock = threading.Lock()
+
+    def seen(self, device: str, key: str, seq: Any = None) -> bool:
+        """
+        Record key for device; return True if it was already in the window.
+
+        Pass seq for keys built from seq alone (no boot id): a seq far below
+        the newest one means the device restarted its counter, and the
+        window is cleared first.
+        """
+        try:
+            seq = int(seq) if seq is not None else None
+        except (TypeError, ValueError):
+            seq = None
+        with self._lock:
+            window = self._seen.get(device)
+            if seq is not None:
+                newest = self._newest_seq.get(device)
+                if newest is not None and seq < newest - self.reset_gap:
+                    window = None  # counter restarted: previous boot's keys no longer apply
+                    newest = None
+                self._newest_seq[device] = seq if newest is None else max(newest, seq)
+            if window is None:
+                window = self._seen[device] = (deque(), set())
+            order, keys = window
+            if key in keys:
+                return True
+            order.append(key)
+            keys.add(key)
+            if len(order) > self.size:
+                keys.discard(order.popleft())
+            return False
+
+    def forget(self, device: str, key: str):
+        """Remove a key again, e.g. when the write it guarded failed"""
+        with self._lock:
+            window = self._seen.get(device)
+            if window and key in window[1]:
+                window[1].discard(key)
+                window[0].remove(key)
@@ -12,12 +12,32 @@ import time
 from datetime import datetime
 import database as db
 
+# Bounds of the demo climate; values wander inside them
+TEMP_RANGE = (24.0, 32.0)
+RH_RANGE = (55.0, 85.0)
+# Largest change per 2 s reading, well inside config.ANOMALY_MAX_RATE so
+# the anomaly detector doesn't flag demo readings as jumps
+TEMP_STEP = 0.2
+RH_STEP = 1.0
+
+_walk = {"temp": 28.0, "rh": 70.0}
+
+def _step(value: float, step: float, bounds: tuple) -> float:
+    """One bounded random-walk step, reflected at the bounds"""
+    low, high = bounds
+    value += random.uniform(-step, step)
+    if value < low:
+        value = 2 * low - value
+    elif value > high:
+        value = 2 * high - value
+    return value
+
 def generate_demo_data():
-    """Generate realistic demo sensor data"""
+    """Generate realistic demo sensor data (a slow random walk per call)"""
     
-    # Base values with some randomness
-    base_temp = 26 + random.uniform(-2, 6)  # 24-32°C
-    base_rh = 65 + random.uniform(-10, 20)  # 55-85%
+    # Drift from the previous reading, like a real shed
+    base_temp = _walk["temp"] = _step(_walk["temp"], TEMP_STEP, TEMP_RANGE)  # 24-32°C
+    base_rh = _walk["rh"] = _step(_walk["rh"], RH_STEP, RH_RANGE)            # 55-85%
     
     # Calculate THI
     thi = (0.8 * base_temp) + ((base_rh / 100) * (base_temp - 14.4)) + 46.4
@@ -31,7 +51,8 @@ def generate_demo_data():
         "rh": round(base_rh, 0),
         "thi": round(thi, 1),
         "relay": relay,
-        "status": "OK"
+        "status": "OK",
+        "ts": int(time.time() * 1000)
     }
     
     return data
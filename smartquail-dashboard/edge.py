@@ -0,0 +1,309 @@
+"""
+SmartQuail Edge Aggregation
+===========================
+Bridge mode that keeps raw readings on the farm and uploads summaries
+
+With EDGE_MODE=1 the bridge stops writing every 2-second reading to
+Supabase. Instead it does the following:
+- every validated reading goes to a local SQLite file (EDGE_DB_PATH),
+  kept for EDGE_RETENTION_HOURS
+- per device and EDGE_WINDOW_SEC window it keeps min/max/avg/last,
+  relay on-time and switches, and status transitions
+- closed windows are queued in a local outbox and uploaded in one batch
+  every EDGE_UPLOAD_SEC, as sensor_summary rows plus the window's last
+  reading in sensor_logs (so the dashboard keeps a latest value)
+- raw readings are uploaded only when an alert fires for a device (the
+  last EDGE_ALERT_CONTEXT_MIN minutes) or on demand:
+      python edge.py --upload-raw esp32-01 --since 2026-10-18T10:00 --until 2026-10-18T11:00
+
+The outbox survives restarts and network outages; it is drained in order
+once Supabase is reachable again. Rows uploaded from the edge carry
+from_edge = true so the database builds rollups from the summaries
+instead of counting those rows twice.
+"""
+
+import json
+import queue
+import sqlite3
+import threading
+import time
+from datetime import datetime, timezone
+from typing import Any, Dict, List, Optional
+
+import config
+import telemetry
+from alerts import NotificationSink
+from anomaly import has_fault
+
+METRICS = ("temp", "rh", "thi")
+
+EDGE_OUTBOX_DEPTH = telemetry.gauge("smartquail_edge_outbox_rows", "Edge uploads waiting in the local outbox")
+EDGE_UPLOADED = telemetry.counter("smartquail_edge_uploaded_total", "Rows uploaded from the edge by kind")
+
+
+# =============================================================================
+# LOCAL STORE
+# =============================================================================
+class EdgeStore:
+    """SQLite file with raw readings and an upload outbox"""
+
+    def __init__(self, path: str = config.EDGE_DB_PATH):
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        self._lock = threading.Lock()
+        with self._lock, self._db:
+            self._db.execute("PRAGMA journal_mode=WAL")
+            self._db.execute("CREATE TABLE IF NOT EXISTS raw (device TEXT, ts_ms INTEGER, record TEXT)")
+            self._db.execute("CREATE INDEX IF NOT EXISTS raw_device_ts ON raw (device, ts_ms)")
+            self._db.execute("CREATE TABLE IF NOT EXISTS outbox (id INTEGER PRIMARY KEY, kind TEXT, row TEXT)")
+
+    def add_raw(self, record: Dict[str, Any]):
+        with self._lock, self._db:
+            self._db.execute("INSERT INTO raw VALUES (?, ?, ?)",
+                             (record["device"], record["sampled_ms"], json.dumps(record)))
+
+    def raw_between(self, device: str, since_ms: int, until_ms: int) -> List[Dict[str, Any]]:
+        with self._lock:
+            rows = self._db.execute(
+                "SELECT record FROM raw WHERE device = ? AND ts_ms >= ? AND ts_ms < ? ORDER BY ts_ms",
+                (device, since_ms, until_ms),
+            ).fetchall()
+        return [json.loads(r[0]) for r in rows]
+
+    def prune(self, before_ms: int):
+        with self._lock, self._db:
+            self._db.execute("DELETE FROM raw WHERE ts_ms < ?", (before_ms,))
+
+    def enqueue(self, kind: str, rows: List[Dict[str, Any]]):
+        with self._lock, self._db:
+            self._db.executemany("INSERT INTO outbox (kind, row) VALUES (?, ?)",
+                                 [(kind, json.dumps(r)) for r in rows])
+
+    def outbox(self, limit: int) -> List[tuple]:
+        with self._lock:
+            return self._db.execute("SELECT id, kind, row FROM outbox ORDER BY id LIMIT ?", (limit,)).fetchall()
+
+    def outbox_size(self) -> int:
+        with self._lock:
+            return self._db.execute("SELECT COUNT(*) FROM outbox").fetchone()[0]
+
+    def ack(self, ids: List[int]):
+        with self._lock, self._db:
+            self._db.executemany("DELETE FROM outbox WHERE id = ?", [(i,) for i in ids])
+
+
+# =============================================================================
+# WINDOW SUMMARIES
+# =============================================================================
+class _Window:
+    __slots__ = ("start_ms", "n", "sums", "mins", "maxs", "last", "relay_on", "relay_on_ms",
+                 "relay_switches", "status_changes", "flagged")
+
+    def __init__(self, start_ms: int):
+        self.start_ms = start_ms
+        self.n = 0
+        self.sums = dict.fromkeys(METRICS, 0.0)
+        self.mins = dict.fromkeys(METRICS, float("inf"))
+        self.maxs = dict.fromkeys(METRICS, float("-inf"))
+        self.last: Optional[Dict[str, Any]] = None
+        self.relay_on = 0
+        self.relay_on_ms = 0
+        self.relay_switches = 0
+        self.status_changes: List[Dict[str, Any]] = []
+        self.flagged = 0
+
+
+class EdgeAggregator:
+    """Per-device window summaries over a local raw store"""
+
+    def __init__(self, store: EdgeStore, window_sec: int = config.EDGE_WINDOW_SEC):
+        self.store = store
+        self.window_ms = window_sec * 1000
+        self._windows: Dict[str, _Window] = {}
+        # device -> (ts_ms, relay, status) of the previous reading
+        self._prev: Dict[str, tuple] = {}
+        # (device, since, until) raw uploads asked for from the ingest path
+        self._raw_requests: "queue.Queue[tuple]" = queue.Queue()
+        self._lock = threading.Lock()
+
+    def add(self, record: Dict[str, Any]):
+        """Store one validated sensor_logs record locally and fold it into its window"""
+        record = dict(record)
+        ts_ms = record.get("sampled_ms") or int(time.time() * 1000)
+        record["sampled_ms"] = ts_ms
+        record.setdefault("dedup_key", f"t{ts_ms}")
+        record["from_edge"] = True
+        if config.MQTT_FARM_TOPIC:
+            # The farm-partitioned sensor_logs upserts on (farm, device, dedup_key)
+            record.setdefault("farm", config.DEFAULT_FARM)
+        self.store.add_raw(record)
+
+        device = record["device"]
+        start_ms = ts_ms - ts_ms % self.window_ms
+        closed = None
+        with self._lock:
+            w = self._windows.get(device)
+            if w is None or start_ms > w.start_ms:
+                closed = w
+                w = self._windows[device] = _Window(start_ms)
+            # A late reading for an earlier window is folded into the current one
+
+            prev = self._prev.get(device)
+            relay_on = record.get("relay") == "ON"
+            status = record.get("status", "OK")
+            if prev is not None:
+                prev_ts, prev_relay, prev_status = prev
+                if prev_relay:
+                    # Cap so a silent device doesn't accrue on-time
+                    w.relay_on_ms += min(max(ts_ms - prev_ts, 0), 3 * config.EXPECTED_INTERVAL_SEC * 1000)
+                if relay_on != prev_relay:
+                    w.relay_switches += 1
+                if status != prev_status:
+                    w.status_changes.append({"at_ms": ts_ms, "from": prev_status, "to": status})
+            self._prev[device] = (ts_ms, relay_on, status)
+
+            w.last = record
+            if record.get("flags"):
+                w.flagged += 1
+            # Same rule as the rollup trigger: faulty sensor values stay out of the stats
+            if status != "SENSOR_ERROR" and not has_fault(record.get("flags")):
+                w.n += 1
+                w.relay_on += relay_on
+                for m in METRICS:
+                    v = record[m]
+                    w.sums[m] += v
+                    w.mins[m] = min(w.mins[m], v)
+                    w.maxs[m] = max(w.maxs[m], v)
+
+        if closed is not None:
+            self._enqueue([closed], device)
+
+    def flush(self, now: Optional[float] = None):
+        """Close every window that has ended and queue it for upload"""
+        now_ms = int((time.time() if now is None else now) * 1000)
+        closed = {}
+        with self._lock:
+            for device, w in list(self._windows.items()):
+                if w.start_ms + self.window_ms <= now_ms:
+                    closed[device] = self._windows.pop(device)
+        for device, w in closed.items():
+            self._enqueue([w], device)
+
+    def _enqueue(self, windows: List[_Window], device: str):
+        summaries, samples = [], []
+        for w in windows:
+            summary = {
+                "device": device,
+                "window_start": datetime.fromtimestamp(w.start_ms / 1000, timezone.utc).isoformat(),
+                "window_sec": self.window_ms // 1000,
+                "n": w.n,
+                "relay_on": w.relay_on,
+                "relay_on_sec": round(w.relay_on_ms / 1000, 1),
+                "relay_switches": w.relay_switches,
+                "status_last": w.last["status"] if w.last else None,
+                "status_changes": json.dumps(w.status_changes) if w.status_changes else None,
+                "flagged": w.flagged,
+            }
+            for m in METRICS:
+                has_data = w.n > 0
+                summary[f"{m}_min"] = w.mins[m] if has_data else None
+                summary[f"{m}_max"] = w.maxs[m] if has_data else None
+                summary[f"{m}_avg"] = round(w.sums[m] / w.n, 2) if has_data else None
+                summary[f"{m}_last"] = w.last[m] if w.last else None
+            summaries.append(summary)
+            if w.last is not None:
+                samples.append(w.last)
+        self.store.enqueue("summary", summaries)
+        self.store.enqueue("raw", samples)
+
+    def request_raw(self, device: str, since: float, until: float) -> int:
+        """Queue raw readings of device between two epoch times for upload"""
+        rows = self.store.raw_between(device, int(since * 1000), int(until * 1000))
+        self.store.enqueue("raw", rows)
+        print(f"[📤] Queued {len(rows)} raw readings of {device} for upload")
+        return len(rows)
+
+    def request_raw_later(self, device: str, since: float, until: float):
+        """request_raw() on the upload thread; never blocks the caller"""
+        self._raw_requests.put_nowait((device, since, until))
+
+    def upload_pending(self, batch: int = config.EDGE_UPLOAD_BATCH) -> int:
+        """Drain the outbox in order; stops at the first failure and keeps the rest"""
+        import database as db
+
+        sent = 0
+        while True:
+            entries = self.store.outbox(batch)
+            if not entries:
+                break
+            summaries = [json.loads(r) for _, kind, r in entries if kind == "summary"]
+            rows = [json.loads(r) for _, kind, r in entries if kind == "raw"]
+            try:
+                db.upload_edge_batch(summaries, rows)
+            except Exception as e:
+                print(f"[DB ERROR] Edge upload failed, {self.store.outbox_size()} rows kept: {e}")
+                break
+            self.store.ack([i for i, _, _ in entries])
+            EDGE_UPLOADED.inc(len(summaries), kind="summary")
+            EDGE_UPLOADED.inc(len(rows), kind="raw")
+            sent += len(entries)
+        EDGE_OUTBOX_DEPTH.set(self.store.outbox_size())
+        return sent
+
+    def run(self, interval: float = config.EDGE_UPLOAD_SEC):
+        """
+        Start a daemon thread that flushes, uploads and prunes every interval
+        seconds, and queues raw readings asked for by request_raw_later()
+        as the requests come in.
+        """
+        def loop():
+            deadline = time.monotonic() + interval
+            while True:
+                try:
+                    device, since, until = self._raw_requests.get(timeout=max(deadline - time.monotonic(), 0))
+                except queue.Empty:
+                    deadline = time.monotonic() + interval
+                    try:
+                        self.flush()
+                        self.upload_pending()
+                        self.store.prune(int((time.time() - config.EDGE_RETENTION_HOURS * 3600) * 1000))
+                    except Exception as e:
+                        print(f"[❌] Edge upload loop error: {e}")
+                    continue
+                try:
+                    self.request_raw(device, since, until)
+                except Exception as e:
+                    print(f"[❌] Edge raw request for {device} failed: {e}")
+
+        threading.Thread(target=loop, name="edge-upload", daemon=True).start()
+
+
+class RawOnAlertSink(NotificationSink):
+    """Alert sink that uploads the raw readings leading up to a firing alert"""
+
+    def __init__(self, aggregator: EdgeAggregator, context_min: float = config.EDGE_ALERT_CONTEXT_MIN):
+        self.aggregator = aggregator
+        self.context_sec = context_min * 60
+
+    def send(self, alert: Dict[str, Any]):
+        if alert["state"] == "firing":
+            # The range query runs on the edge upload thread, not on ingest
+            now = time.time()
+            self.aggregator.request_raw_later(alert["device"], now - self.context_sec, now + 1)
+
+
+# =============================================================================
+# ON-DEMAND RAW UPLOAD
+# =============================================================================
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Upload raw readings kept by an edge bridge")
+    parser.add_argument("--upload-raw", metavar="DEVICE", required=True)
+    parser.add_argument("--since", type=datetime.fromisoformat, required=True)
+    parser.add_argument("--until", type=datetime.fromisoformat, default=None)
+    args = parser.parse_args()
+
+    aggregator = EdgeAggregator(EdgeStore())
+    until = args.until.timestamp() if args.until else time.time()
+    aggregator.request_raw(args.upload_raw, args.since.timestamp(), until)
+    print(f"[✅] Uploaded {aggregator.upload_pending()} rows")
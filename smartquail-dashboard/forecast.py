@@ -0,0 +1,87 @@
+"""
+SmartQuail THI Forecast
+=======================
+Short-horizon THI forecast updated per reading in O(1)
+
+Holt's linear exponential smoothing (level + trend) per device, adapted
+to irregular sample spacing: the smoothing weights come from time
+constants, so a 2 s and a 30 s reporting interval give the same
+behaviour. No history is stored and nothing is retrained.
+
+Per reading the bridge gets:
+    thi_forecast  - THI expected FORECAST_HORIZON_MIN minutes from now
+    thi_eta_min   - minutes until THI reaches THI_WARNING at the current
+                    trend (None if falling, already above, or too far out)
+"""
+
+import math
+import threading
+from typing import Any, Dict, Optional
+
+import config
+
+
+class _HoltState:
+    __slots__ = ("level", "trend", "t", "n")
+
+    def __init__(self, value: float, t: float):
+        self.level = value
+        self.trend = 0.0  # THI per second
+        self.t = t
+        self.n = 1
+
+
+class ThiForecaster:
+    """Per-device level/trend smoothing of THI with a threshold ETA"""
+
+    def __init__(self,
+                 level_tau: float = config.FORECAST_LEVEL_TAU_SEC,
+                 trend_tau: float = config.FORECAST_TREND_TAU_SEC,
+                 horizon_min: float = config.FORECAST_HORIZON_MIN,
+                 threshold: float = config.THI_WARNING):
+        self.level_tau = level_tau
+        self.trend_tau = trend_tau
+        self.horizon_min = horizon_min
+        self.threshold = threshold
+        self._state: Dict[str, _HoltState] = {}
+        self._lock = threading.Lock()
+
+    def update(self, device: str, thi: float, t: float) -> Dict[str, Any]:
+        """Fold one reading taken at t (epoch seconds); returns thi_forecast and thi_eta_min"""
+        low, high = config.ANOMALY_VALID_RANGE["thi"]
+        if thi is None or math.isnan(thi) or not low <= thi <= high:
+            return {}
+
+        with self._lock:
+            s = self._state.get(device)
+            if s is None:
+                s = self._state[device] = _HoltState(thi, t)
+            else:
+                dt = t - s.t
+                if dt <= 0:
+                    return self._forecast(s)  # late or duplicate sample
+                a = 1 - math.exp(-dt / self.level_tau)
+                b = 1 - math.exp(-dt / self.trend_tau)
+                prev = s.level
+                s.level = a * thi + (1 - a) * (s.level + s.trend * dt)
+                s.trend = b * (s.level - prev) / dt + (1 - b) * s.trend
+                s.t = t
+                s.n += 1
+            return self._forecast(s)
+
+    def _forecast(self, s: _HoltState) -> Dict[str, Any]:
+        if s.n < config.FORECAST_WARMUP:
+            return {}
+        horizon = self.horizon_min * 60
+        forecast = s.level + s.trend * horizon
+        eta = None
+        if s.level < self.threshold and s.trend > 0:
+            seconds = (self.threshold - s.level) / s.trend
+            if seconds <= config.FORECAST_MAX_ETA_MIN * 60:
+                eta = round(seconds / 60, 1)
+        return {"thi_forecast": round(forecast, 2), "thi_eta_min": eta}
+
+    def get(self, device: str) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            s = self._state.get(device)
+            return self._forecast(s) if s is not None else None
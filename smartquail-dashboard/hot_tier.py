@@ -0,0 +1,367 @@
+"""
+SmartQuail Hot Tier
+===================
+The last HOT_TIER_HOURS of readings in bridge memory, served over local HTTP
+
+With HOT_TIER=1 the bridge keeps one ring buffer per device: a NumPy
+structured array of fixed capacity (HOT_TIER_HOURS at the
+EXPECTED_INTERVAL_SEC publish rate) with one ROW_DTYPE record per
+reading. Memory per device is capacity x ROW_DTYPE.itemsize, allocated
+when the device first reports and never grown; at most
+HOT_TIER_MAX_DEVICES buffers are allocated. A device publishing faster than
+expected keeps correspondingly less history.
+
+Readings are kept in sample-time order, so range and aggregate queries are
+two binary searches over at most two contiguous slices. A late reading is
+slotted in among the last LATE_SLOTS readings; older ones are left to the
+database.
+
+Endpoints (GET, on HOT_TIER_HOST:HOT_TIER_PORT, loopback by default):
+    /hot/latest?device=esp32-01
+    /hot/range?device=esp32-01&since=<ms>&until=<ms>&limit=1000
+    /hot/stats?device=esp32-01&since=<ms>&until=<ms>&step=<ms>
+    /hot/devices
+
+Range and stats answers carry covers_from, the sample time from which the
+buffer is complete (bridge start, or the oldest reading once the ring has
+wrapped). database.py only uses an answer that covers the window asked
+for, and falls back to Supabase otherwise.
+"""
+
+import json
+import math
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Dict, List, Optional, Tuple
+from urllib.parse import parse_qs, urlsplit
+
+import numpy as np
+
+import config
+import telemetry
+from anomaly import FAULT_KINDS
+
+HOT_DEVICES = telemetry.gauge("smartquail_hot_tier_devices", "Devices with a hot-tier ring buffer")
+HOT_BYTES = telemetry.gauge("smartquail_hot_tier_bytes", "Memory allocated to hot-tier ring buffers")
+HOT_DROPPED = telemetry.counter("smartquail_hot_tier_dropped_total", "Readings not kept in the hot tier by reason")
+HOT_QUERY_SECONDS = telemetry.histogram("smartquail_hot_tier_query_seconds", "Hot-tier query time by endpoint",
+                                        buckets=(0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.05))
+
+METRICS = ("temp", "rh", "thi")
+FLAG_KINDS = FAULT_KINDS + ("outlier",)
+# "metric:kind" flag -> bit, e.g. temp:stuck = 1, temp:jump = 2, ...
+FLAG_BITS = {f"{m}:{k}": 1 << i for i, (m, k) in
+             enumerate((m, k) for m in METRICS for k in FLAG_KINDS)}
+FAULT_MASK = sum(bit for flag, bit in FLAG_BITS.items() if flag.split(":")[1] in FAULT_KINDS)
+
+ROW_DTYPE = np.dtype([
+    ("sampled_ms", "<i8"),
+    ("temp", "<f4"),
+    ("rh", "<f4"),
+    ("thi", "<f4"),
+    ("thi_forecast", "<f4"),  # NaN = none
+    ("thi_eta_min", "<f4"),   # NaN = none
+    ("flags", "<u2"),         # FLAG_BITS
+    ("relay", "u1"),          # 1 = ON
+    ("status", "u1"),         # index into HotTier.statuses
+])
+
+LATE_SLOTS = 64
+SENSOR_ERROR = 1  # HotTier.statuses index
+
+
+def _flag_bits(flags: Optional[str]) -> int:
+    return sum(FLAG_BITS.get(f, 0) for f in flags.split(",")) if flags else 0
+
+
+def _flag_text(bits: int) -> Optional[str]:
+    return ",".join(f for f, bit in FLAG_BITS.items() if bits & bit) or None
+
+
+def _optional(value: float) -> Optional[float]:
+    return None if math.isnan(value) else round(float(value), 2)
+
+
+# =============================================================================
+# RING BUFFER
+# =============================================================================
+class HotSeries:
+    """Fixed-capacity ring of ROW_DTYPE rows for one device, oldest to newest"""
+
+    __slots__ = ("buf", "head", "size", "lock")
+
+    def __init__(self, capacity: int):
+        self.buf = np.zeros(capacity, dtype=ROW_DTYPE)
+        self.head = 0  # next slot to write
+        self.size = 0
+        self.lock = threading.Lock()
+
+    def _segments(self) -> List[np.ndarray]:
+        """Views in sample-time order (no copy); call with the lock held"""
+        if self.size < len(self.buf):
+            return [self.buf[:self.size]]
+        return [self.buf[self.head:], self.buf[:self.head]]
+
+    def append(self, row: tuple) -> Optional[str]:
+        """Store one row; returns why it was not kept, or None"""
+        cap = len(self.buf)
+        ts = row[0]
+        with self.lock:
+            moved = 0
+            if self.size and ts <= self.buf["sampled_ms"][(self.head - 1) % cap]:
+                k = min(self.size, LATE_SLOTS)
+                recent = self.buf["sampled_ms"][(self.head - 1 - np.arange(k)) % cap]  # newest first
+                if (recent == ts).any():
+                    return "duplicate"
+                moved = int(np.count_nonzero(recent > ts))
+                if moved == k and self.size > k:
+                    return "late"
+            self.buf[self.head] = row
+            self.head = (self.head + 1) % cap
+            self.size = min(self.size + 1, cap)
+            if moved:
+                # Rotate the new row back behind the `moved` newer ones
+                idx = (self.head - 1 - np.arange(moved + 1)) % cap
+                self.buf[idx] = np.roll(self.buf[idx], -1)
+        return None
+
+    def latest(self) -> Optional[np.void]:
+        with self.lock:
+            return self.buf[(self.head - 1) % len(self.buf)].copy() if self.size else None
+
+    def window(self, since_ms: int, until_ms: int,
+               limit: Optional[int] = None) -> Tuple[np.ndarray, Optional[int], bool]:
+        """
+        Rows with since_ms <= sampled_ms <= until_ms, oldest first, at most
+        limit (copied), plus the oldest sample time held and whether the
+        ring has wrapped.
+        """
+        parts = []
+        with self.lock:
+            for seg in self._segments():
+                ts = seg["sampled_ms"]
+                lo = int(np.searchsorted(ts, since_ms, "left"))
+                hi = int(np.searchsorted(ts, until_ms, "right"))
+                if limit is not None:
+                    hi = min(hi, lo + limit - sum(len(p) for p in parts))
+                if hi > lo:
+                    parts.append(seg[lo:hi].copy())
+            oldest = int(self._segments()[0]["sampled_ms"][0]) if self.size else None
+        rows = np.concatenate(parts) if parts else np.empty(0, dtype=ROW_DTYPE)
+        return rows, oldest, self.size == len(self.buf)
+
+
+class HotTier:
+    """Ring buffer per device, allocated on first reading"""
+
+    def __init__(self, hours: float = config.HOT_TIER_HOURS,
+                 interval_sec: float = config.EXPECTED_INTERVAL_SEC,
+                 max_devices: int = config.HOT_TIER_MAX_DEVICES):
+        self.capacity = int(math.ceil(hours * 3600 / interval_sec))
+        self.max_devices = max_devices
+        self.started_ms = int(time.time() * 1000)
+        self.statuses: List[str] = ["OK", "SENSOR_ERROR"]
+        self._series: Dict[str, HotSeries] = {}
+        self._lock = threading.Lock()
+
+    @property
+    def bytes_per_device(self) -> int:
+        return self.capacity * ROW_DTYPE.itemsize
+
+    def _status_code(self, status: str) -> int:
+        if status not in self.statuses:
+            with self._lock:
+                if status not in self.statuses:
+                    if len(self.statuses) >= 255:
+                        return 0  # u1 column is full; firmware only sends a handful
+                    self.statuses.append(status)
+        return self.statuses.index(status)
+
+    def _get(self, device: str, create: bool = False) -> Optional[HotSeries]:
+        series = self._series.get(device)
+        if series is None and create:
+            with self._lock:
+                series = self._series.get(device)
+                if series is None:
+                    if len(self._series) >= self.max_devices:
+                        return None
+                    series = self._series[device] = HotSeries(self.capacity)
+                    HOT_DEVICES.set(len(self._series))
+                    HOT_BYTES.set(len(self._series) * self.bytes_per_device)
+        return series
+
+    def add(self, record: Dict[str, Any]):
+        """Fold one prepared sensor_logs record into its device's ring"""
+        series = self._get(record["device"], create=True)
+        if series is None:
+            HOT_DROPPED.inc(reason="max_devices")
+            return
+        forecast = record.get("thi_forecast")
+        eta = record.get("thi_eta_min")
+        row = (
+            record["sampled_ms"], record["temp"], record["rh"], record["thi"],
+            math.nan if forecast is None else forecast,
+            math.nan if eta is None else eta,
+            _flag_bits(record.get("flags")),
+            record.get("relay") == "ON",
+            self._status_code(record.get("status", "OK")),
+        )
+        reason = series.append(row)
+        if reason:
+            HOT_DROPPED.inc(reason=reason)
+
+    def devices(self) -> List[str]:
+        return sorted(self._series)
+
+    # -------------------------------------------------------------------------
+    # Queries
+    # -------------------------------------------------------------------------
+    def latest(self, device: str) -> Optional[Dict[str, Any]]:
+        """Newest reading as a sensor_logs-like row"""
+        series = self._get(device)
+        row = series.latest() if series is not None else None
+        if row is None:
+            return None
+        return {
+            "device": device,
+            "sampled_ms": int(row["sampled_ms"]),
+            **{m: round(float(row[m]), 2) for m in METRICS},
+            "relay": "ON" if row["relay"] else "OFF",
+            "status": self.statuses[row["status"]],
+            "flags": _flag_text(int(row["flags"])),
+            "thi_forecast": _optional(row["thi_forecast"]),
+            "thi_eta_min": _optional(row["thi_eta_min"]),
+        }
+
+    def _window(self, device: str, since_ms: int, until_ms: int, limit: Optional[int] = None):
+        series = self._get(device)
+        if series is None:
+            return None, None
+        rows, oldest, wrapped = series.window(since_ms, until_ms, limit)
+        covers_from = oldest if wrapped else self.started_ms
+        return rows, covers_from
+
+    def range(self, device: str, since_ms: int, until_ms: int, limit: int) -> Optional[Dict[str, Any]]:
+        """Rows in a window, column-wise (relay 0/1, status and flags as text)"""
+        rows, covers_from = self._window(device, since_ms, until_ms, limit)
+        if rows is None:
+            return None
+        statuses = np.array(self.statuses, dtype=object)
+        return {
+            "device": device,
+            "covers_from": covers_from,
+            "sampled_ms": rows["sampled_ms"].tolist(),
+            **{m: np.round(rows[m].astype(float), 2).tolist() for m in METRICS},
+            "relay": rows["relay"].tolist(),
+            "status": statuses[rows["status"]].tolist(),
+            "flags": [_flag_text(b) if b else None for b in rows["flags"].tolist()],
+        }
+
+    def stats(self, device: str, since_ms: int, until_ms: int, step_ms: Optional[int] = None) -> Optional[Dict[str, Any]]:
+        """
+        min/avg/max per metric and relay-on count over the window, leaving out
+        SENSOR_ERROR rows and stuck/jump faults (the same rule as the rollup
+        trigger and _scan_statistics in database.py); with step_ms also
+        per-bin n, averages, thi_max and relay fraction on fixed boundaries.
+        """
+        rows, covers_from = self._window(device, since_ms, until_ms)
+        if rows is None:
+            return None
+        good = rows[(rows["status"] != SENSOR_ERROR) & (rows["flags"] & FAULT_MASK == 0)]
+        out: Dict[str, Any] = {"device": device, "covers_from": covers_from, "n": int(len(good)),
+                               "relay_on": int(good["relay"].sum())}
+        for m in METRICS:
+            values = good[m].astype(float)
+            out[m] = ({"avg": round(values.mean(), 1), "min": round(values.min(), 1), "max": round(values.max(), 1)}
+                      if len(values) else None)
+        if step_ms:
+            bins = good["sampled_ms"] // step_ms
+            if len(bins):
+                first = int(bins.min())
+                idx = (bins - first).astype(np.int64)
+                size = int(idx.max()) + 1
+                n = np.bincount(idx, minlength=size)
+                has = n > 0
+                safe_n = np.where(has, n, 1)
+                series: Dict[str, Any] = {"t": ((np.arange(size) + first) * step_ms)[has].tolist(),
+                                          "n": n[has].tolist()}
+                for m in METRICS:
+                    sums = np.bincount(idx, weights=good[m].astype(float), minlength=size)
+                    series[m] = np.round(sums / safe_n, 1)[has].tolist()
+                thi_max = np.full(size, -np.inf)
+                np.maximum.at(thi_max, idx, good["thi"].astype(float))
+                series["thi_max"] = np.round(thi_max, 1)[has].tolist()
+                relay = np.bincount(idx, weights=good["relay"].astype(float), minlength=size)
+                series["relay"] = np.round(relay / safe_n, 2)[has].tolist()
+            else:
+                series = {"t": [], "n": [], **{m: [] for m in METRICS}, "thi_max": [], "relay": []}
+            out.update(step_ms=step_ms, series=series)
+        return out
+
+
+# =============================================================================
+# LOCAL HTTP
+# =============================================================================
+def _int(params: Dict[str, list], name: str, default: Optional[int]) -> Optional[int]:
+    raw = params.get(name, [None])[0]
+    return default if raw is None else int(raw)
+
+
+def _handler(hot: HotTier):
+    class _HotHandler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"  # dashboards keep the connection
+        disable_nagle_algorithm = True  # headers and body go out as separate writes
+
+        def do_GET(self):
+            url = urlsplit(self.path)
+            params = parse_qs(url.query)
+            device = params.get("device", [config.DEFAULT_DEVICE])[0]
+            now_ms = int(time.time() * 1000)
+            try:
+                with HOT_QUERY_SECONDS.time(endpoint=url.path):
+                    if url.path == "/hot/latest":
+                        payload = hot.latest(device)
+                    elif url.path == "/hot/range":
+                        payload = hot.range(device, _int(params, "since", now_ms - 3_600_000),
+                                            _int(params, "until", now_ms), _int(params, "limit", 1000))
+                    elif url.path == "/hot/stats":
+                        payload = hot.stats(device, _int(params, "since", now_ms - 3_600_000),
+                                            _int(params, "until", now_ms), _int(params, "step", None))
+                    elif url.path == "/hot/devices":
+                        payload = {"devices": hot.devices(), "capacity": hot.capacity,
+                                   "bytes_per_device": hot.bytes_per_device}
+                    else:
+                        self._send(404, {"error": "not found"})
+                        return
+            except ValueError as e:
+                self._send(400, {"error": str(e)})
+                return
+            if payload is None:
+                self._send(404, {"error": f"no hot data for {device}"})
+                return
+            self._send(200, payload)
+
+        def _send(self, status: int, payload: Dict[str, Any]):
+            body = json.dumps(payload, separators=(",", ":")).encode()
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format, *args):
+            pass
+
+    return _HotHandler
+
+
+def serve(hot: HotTier, host: str = config.HOT_TIER_HOST, port: int = config.HOT_TIER_PORT) -> bool:
+    """Serve the hot tier from a daemon thread; False if the port is taken"""
+    try:
+        server = ThreadingHTTPServer((host, port), _handler(hot))
+    except OSError as e:
+        print(f"[⚠️] Hot tier server not started on {host}:{port}: {e}")
+        return False
+    threading.Thread(target=server.serve_forever, name="hot-tier", daemon=True).start()
+    return True
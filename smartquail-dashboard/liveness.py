@@ -0,0 +1,79 @@
+"""
+SmartQuail Last-Seen Watchdog
+=============================
+Live per-device liveness in the bridge
+
+Every message (including SENSOR_ERROR, the ESP32 is still alive) marks
+its device as seen. A periodic check exports seconds-since-last-message
+per device and the number of online devices on /metrics, and logs when
+a device goes offline (no message for DEVICE_OFFLINE_SECONDS) or comes
+back, with the outage length.
+"""
+
+import threading
+import time
+from typing import Any, Dict, Optional
+
+import config
+import telemetry
+
+DEVICE_SILENCE = telemetry.gauge("smartquail_device_silence_seconds", "Seconds since the last message per device")
+DEVICES_ONLINE = telemetry.gauge("smartquail_devices_online", "Devices that sent a message recently")
+DEVICE_OUTAGES = telemetry.counter("smartquail_device_outages_total", "Times a device went offline")
+
+
+class LastSeenWatchdog:
+    """Tracks the last message time per device and flips online/offline"""
+
+    def __init__(self, offline_after: float = config.DEVICE_OFFLINE_SECONDS):
+        self.offline_after = offline_after
+        self._last_seen: Dict[str, float] = {}
+        self._offline_since: Dict[str, float] = {}
+        self._lock = threading.Lock()
+
+    def seen(self, device: str, now: Optional[float] = None):
+        now = time.time() if now is None else now
+        with self._lock:
+            self._last_seen[device] = now
+            down_since = self._offline_since.pop(device, None)
+        DEVICE_SILENCE.set(0, device=device)
+        if down_since is not None:
+            print(f"[✅] {device} back online after {int(now - down_since)} s")
+
+    def check(self, now: Optional[float] = None):
+        """Update gauges and detect devices that just went offline"""
+        now = time.time() if now is None else now
+        went_offline = []
+        with self._lock:
+            online = 0
+            for device, last in self._last_seen.items():
+                silent = now - last
+                DEVICE_SILENCE.set(round(silent, 1), device=device)
+                if silent <= self.offline_after:
+                    online += 1
+                elif device not in self._offline_since:
+                    self._offline_since[device] = last
+                    went_offline.append((device, silent))
+        DEVICES_ONLINE.set(online)
+        for device, silent in went_offline:
+            DEVICE_OUTAGES.inc(device=device)
+            print(f"[⚠️] {device} offline, no message for {int(silent)} s")
+
+    def snapshot(self, now: Optional[float] = None) -> Dict[str, Dict[str, Any]]:
+        """{device: {"last_seen", "silent_sec", "online"}}"""
+        now = time.time() if now is None else now
+        with self._lock:
+            return {
+                device: {"last_seen": last, "silent_sec": round(now - last, 1),
+                         "online": now - last <= self.offline_after}
+                for device, last in self._last_seen.items()
+            }
+
+    def run(self, interval: float = config.WATCHDOG_INTERVAL_SEC):
+        """Start a daemon thread calling check() every interval seconds"""
+        def loop():
+            while True:
+                time.sleep(interval)
+                self.check()
+
+        threading.Thread(target=loop, name="last-seen-watchdog", daemon=True).start()
@@ -4,10 +4,14 @@ SmartQuail MQTT to Supabase Bridge
 Subscribes to MQTT broker and stores data in Supabase
 
 Run this script separately from the Streamlit dashboard.
-It will run continuously and push data to Supabase.
+It will run continuously and push data to Supabase, plus any other sinks
+enabled in config (InfluxDB, JSONL archive, Nextion panel; see sinks.py).
 
 Usage:
     python mqtt_bridge.py
+    EDGE_MODE=1 python mqtt_bridge.py   # keep raw locally, upload summaries (edge.py)
+    MQTT_RECORD_PATH=captures/x.jsonl.gz python mqtt_bridge.py   # record traffic (traffic.py)
+    HOT_TIER=1 python mqtt_bridge.py    # serve the last 72 h from memory (hot_tier.py)
 """
 
 import paho.mqtt.client as mqtt
@@ -16,6 +20,43 @@ import time
 from datetime import datetime
 import config
 import database as db
+import telemetry
+from alerts import build_engine
+from anomaly import has_fault
+from control import RelayController
+from edge import EdgeAggregator, EdgeStore, RawOnAlertSink
+from forecast import ThiForecaster
+from hot_tier import HotTier, serve as serve_hot_tier
+from liveness import LastSeenWatchdog
+from sinks import build_fanout
+from traffic import TrafficRecorder
+
+# Alert rules are evaluated on every reading as it arrives
+alert_engine = build_engine()
+
+# Live last-seen per device (exported on /metrics)
+watchdog = LastSeenWatchdog()
+
+# Per-device THI trend; forecasts ride along with the reading into the database
+forecaster = ThiForecaster()
+
+# Edge mode: raw readings stay local, summaries (and raw around alerts) go up
+edge = None
+if config.EDGE_MODE:
+    edge = EdgeAggregator(EdgeStore(config.EDGE_DB_PATH))
+    alert_engine.sinks.append(RawOnAlertSink(edge))
+
+# Recent readings per device in fixed-size ring buffers, for the dashboards
+hot = HotTier() if config.HOT_TIER_ENABLED else None
+
+# Created in main() once the MQTT client exists (CONTROL_ENABLED only)
+controller = None
+
+# Per-sink queues and workers; created in main() (the Nextion sink publishes via MQTT)
+fanout = None
+
+# Raw traffic capture for replay (MQTT_RECORD_PATH); opened in main()
+recorder = None
 
 # =============================================================================
 # MQTT CALLBACKS
@@ -25,7 +66,13 @@ def on_connect(client, userdata, flags, rc):
     if rc == 0:
         print(f"[✅] Connected to MQTT Broker: {config.MQTT_BROKER}")
         print(f"[📡] Subscribing to topic: {config.MQTT_TOPIC}")
-        client.subscribe(config.MQTT_TOPIC)
+        client.subscribe(config.MQTT_TOPIC, qos=config.MQTT_QOS)
+        if config.MQTT_FARM_TOPIC:
+            print(f"[📡] Subscribing to farm topics: {config.MQTT_FARM_TOPIC}")
+            client.subscribe(config.MQTT_FARM_TOPIC, qos=config.MQTT_QOS)
+        if controller is not None:
+            print(f"[📡] Subscribing to command acks: {config.CONTROL_ACK_TOPIC}")
+            client.subscribe(config.CONTROL_ACK_TOPIC, qos=1)
     else:
         print(f"[❌] Connection failed with code: {rc}")
         error_codes = {
@@ -43,35 +90,89 @@ def on_disconnect(client, userdata, rc):
     if rc != 0:
         print("[🔄] Attempting to reconnect...")
 
+def topic_location(topic: str) -> dict:
+    """Farm/house from a topic matching MQTT_FARM_TOPIC, e.g. iot/smartquail/farm-a/house-3/dht"""
+    pattern = config.MQTT_FARM_TOPIC
+    if not pattern or not mqtt.topic_matches_sub(pattern, topic):
+        return {}
+    values = [level for wildcard, level in zip(pattern.split("/"), topic.split("/")) if wildcard == "+"]
+    return dict(zip(config.FARM_TOPIC_LEVELS, values))
+
 def on_message(client, userdata, msg):
     """Callback when message received"""
+    received_at = time.perf_counter()  # control and capture latency
+    arrived_at = time.time()  # sinks: lag and archive timestamps are wall clock
+    if recorder is not None:
+        recorder.record(msg.topic, msg.payload, msg.qos, received_at)
+    if controller is not None and mqtt.topic_matches_sub(config.CONTROL_ACK_TOPIC, msg.topic):
+        try:
+            controller.on_ack(json.loads(msg.payload.decode()))
+        except (ValueError, AttributeError) as e:
+            print(f"[❌] Bad command ack on {msg.topic}: {e}")
+        return
+
+    telemetry.BRIDGE_MESSAGES.inc()
+    telemetry.BRIDGE_QUEUE_DEPTH.inc()
     try:
         # Parse JSON payload
-        payload = json.loads(msg.payload.decode())
+        with telemetry.BRIDGE_DECODE_SECONDS.time():
+            payload = json.loads(msg.payload.decode())
+        location = topic_location(msg.topic)
+        if location and "device" not in payload:
+            # Firmware on farm topics need not name itself; the topic does
+            payload["device"] = "-".join(location.values())
+        watchdog.seen(payload.get("device", "esp32-01"))
+        alert_engine.seen(payload.get("device", "esp32-01"))
+        
+        # Dedup/validate once; redeliveries and dropped spikes go no further
+        record = db.screen_reading(payload)
+        if record is None:
+            return
+        
+        # Relay commands go out next: nothing else sits between reading and actuator
+        if (controller is not None and record["status"] != "SENSOR_ERROR"
+                and not has_fault(record.get("flags"))):
+            controller.on_reading(record["device"], {**payload, **record}, received_at)
         
         # Print received data
         timestamp = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
         print(f"\n[📨] {timestamp} - New Data Received:")
         print(f"    Device: {payload.get('device', 'unknown')}")
+        if location:
+            print(f"    Location: {'/'.join(location.values())}")
         print(f"    Temp: {payload.get('temp', 0)}°C")
         print(f"    RH: {payload.get('rh', 0)}%")
         print(f"    THI: {payload.get('thi', 0)}")
         print(f"    Relay: {payload.get('relay', 'OFF')}")
         print(f"    Status: {payload.get('status', 'OK')}")
         
-        # Insert into Supabase
-        success = db.insert_sensor_data(payload)
-        
-        if success:
-            print(f"    [✅] Saved to Supabase")
+        # Forecast and alerts on the screened record, before the (slower) database write
+        if record["status"] == "SENSOR_ERROR":
+            alert_engine.evaluate_sensor(record["device"], "SENSOR_ERROR")
+        elif has_fault(record.get("flags")):
+            alert_engine.evaluate_sensor(record["device"], record["flags"])
         else:
-            print(f"    [❌] Failed to save to Supabase")
+            alert_engine.evaluate_sensor(record["device"], None)
+            record.update(forecaster.update(record["device"], record["thi"], record["sampled_ms"] / 1000))
+            alert_engine.evaluate(record["device"], record)
+        
+        # Hand off; each sink writes from its own worker
+        db.complete_sensor_record(record, payload)
+        if config.MQTT_FARM_TOPIC:
+            record["farm"] = location.get("farm", config.DEFAULT_FARM)
+            record["house"] = location.get("house")
+        fanout.submit(record, arrived_at)
+        print(f"    [📤] Queued for {', '.join(fanout.names())}")
             
     except json.JSONDecodeError as e:
+        telemetry.BRIDGE_ERRORS.inc(stage="decode")
         print(f"[❌] JSON Parse Error: {e}")
         print(f"    Raw payload: {msg.payload}")
     except Exception as e:
+        telemetry.BRIDGE_ERRORS.inc(stage="process")
         print(f"[❌] Error processing message: {e}")
+    finally:
+        telemetry.BRIDGE_QUEUE_DEPTH.dec()
 
 def on_subscribe(client, userdata, mid, granted_qos):
     """Callback when subscribed to topic"""
@@ -81,12 +182,17 @@ def on_subscribe(client, userdata, mid, granted_qos):
 # MAIN
 # =============================================================================
 def main():
+    global controller, fanout, recorder
     print("=" * 60)
     print("🐦 SmartQuail MQTT to Supabase Bridge")
     print("=" * 60)
     print(f"Broker: {config.MQTT_BROKER}:{config.MQTT_PORT}")
     print(f"Topic: {config.MQTT_TOPIC}")
+    if config.MQTT_FARM_TOPIC:
+        print(f"Farm topics: {config.MQTT_FARM_TOPIC} ({'/'.join(config.FARM_TOPIC_LEVELS)})")
     print(f"Supabase URL: {config.SUPABASE_URL[:50]}...")
+    if telemetry.start_metrics_server(config.BRIDGE_METRICS_PORT):
+        print(f"Metrics: http://127.0.0.1:{config.BRIDGE_METRICS_PORT}/metrics")
     print("=" * 60)
     print()
     
@@ -99,6 +205,18 @@ def main():
     client.on_message = on_message
     client.on_subscribe = on_subscribe
     
+    if config.CONTROL_ENABLED:
+        controller = RelayController(client)
+        controller.run_ack_watch()
+        print(f"[🎛️] Closed-loop control on → {config.CONTROL_CMD_TOPIC}")
+    
+    fanout = build_fanout(client, edge, hot)
+    print(f"[📤] Sinks: {', '.join(fanout.names())}")
+    
+    if config.MQTT_RECORD_PATH:
+        recorder = TrafficRecorder(config.MQTT_RECORD_PATH)
+        print(f"[⏺️] Recording traffic → {config.MQTT_RECORD_PATH}")
+    
     # Connect to broker
     try:
         print(f"[🔌] Connecting to {config.MQTT_BROKER}...")
@@ -108,6 +226,18 @@ def main():
         return
     
     # Start loop
+    alert_engine.run_silence_watch()
+    watchdog.run()
+    if edge is not None:
+        edge.run()
+        print(f"[🏠] Edge mode: raw → {config.EDGE_DB_PATH}, summaries every {config.EDGE_UPLOAD_SEC}s")
+    if hot is not None and serve_hot_tier(hot):
+        print(f"[🔥] Hot tier: {config.HOT_TIER_HOURS} h per device "
+              f"({hot.bytes_per_device / 2 ** 20:.1f} MB each, max {hot.max_devices}) "
+              f"on http://{config.HOT_TIER_HOST}:{config.HOT_TIER_PORT}/hot/devices")
+    if config.ALERT_WEBHOOK_URL:
+        print(f"[🔔] Alerts → {config.ALERT_WEBHOOK_URL}")
+    
     print("[🚀] Starting MQTT loop... Press Ctrl+C to stop.\n")
     
     try:
@@ -115,6 +245,10 @@ def main():
     except KeyboardInterrupt:
         print("\n[👋] Shutting down...")
         client.disconnect()
+        fanout.close()
+        if recorder is not None:
+            recorder.close()
+            print(f"[⏺️] Recorded {recorder.count} messages")
         print("[✅] Disconnected. Goodbye!")
 
 if __name__ == "__main__":
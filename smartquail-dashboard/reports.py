@@ -0,0 +1,230 @@
+"""
+SmartQuail Farm Reports
+=======================
+Daily/weekly summaries per shed (device), generated in bulk
+
+For each period the job makes one query that returns the minute rollups
+of every device (rollup_range). Each device's summary is computed in a
+process pool, and the next period is fetched while the current one is
+being summarised. Each summary covers:
+- THI exposure hours per zone
+- relay duty cycle
+- min/avg/max
+- data gaps
+
+Output per period, e.g. reports/daily/2026-10-18.html and .json.
+Periods that already have a complete JSON are skipped on rerun, so a
+nightly cron only does the new day. Open the HTML in a browser and
+print to PDF if a PDF is needed.
+
+Usage:
+    python reports.py --period daily --days 30
+    python reports.py --period weekly --since 2026-09-01 --workers 8
+    python reports.py --period daily --since 2026-10-18 --until 2026-10-18 --force
+"""
+
+import argparse
+import html
+import json
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from datetime import date, datetime, timedelta
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+from zoneinfo import ZoneInfo
+
+import config
+
+METRICS = ("temp", "rh", "thi")
+COLUMNS = ["bucket", "n", "relay_on"] + [f"{m}_{a}" for m in METRICS for a in ("sum", "min", "max")]
+
+
+# =============================================================================
+# PERIODS
+# =============================================================================
+def period_bounds(period: str, day: date) -> Tuple[str, datetime, datetime]:
+    """(label, start, end) in REPORT_TIMEZONE for the period containing day"""
+    tz = ZoneInfo(config.REPORT_TIMEZONE)
+    if period == "weekly":
+        monday = day - timedelta(days=day.weekday())
+        year, week, _ = monday.isocalendar()
+        start = datetime.combine(monday, datetime.min.time(), tz)
+        return f"{year}-W{week:02d}", start, start + timedelta(days=7)
+    start = datetime.combine(day, datetime.min.time(), tz)
+    return day.isoformat(), start, start + timedelta(days=1)
+
+
+def periods_between(period: str, since: date, until: date) -> List[Tuple[str, datetime, datetime]]:
+    out, seen, day = [], set(), since
+    while day <= until:
+        bounds = period_bounds(period, day)
+        if bounds[0] not in seen:
+            seen.add(bounds[0])
+            out.append(bounds)
+        day += timedelta(days=1)
+    return out
+
+
+# =============================================================================
+# FETCH (one query per period, all devices)
+# =============================================================================
+def fetch_period(start: datetime, end: datetime) -> Dict[str, Dict[str, list]]:
+    """{device: {column: [values per minute]}} from rollup_range"""
+    import database as db
+
+    query = db.get_client().rpc("rollup_range", {"p_since": start.isoformat(), "p_until": end.isoformat()})
+    response = db.backend.call(query.execute, timeout=config.REPORT_QUERY_TIMEOUT, caller="export")
+    return {row["device"]: {c: row[c] for c in COLUMNS} for row in response.data or [] if row.get("bucket")}
+
+
+# =============================================================================
+# SUMMARY (runs in worker processes)
+# =============================================================================
+def summarize_device(device: str, columns: Dict[str, list], start_ts: float, end_ts: float) -> Dict[str, Any]:
+    """Summary for one device and period from its minute rollups"""
+    import numpy as np
+    import pandas as pd
+    from analytics import relay_duty_cycle, rollup_gaps
+
+    df = pd.DataFrame(columns)
+    df["bucket"] = pd.to_datetime(df["bucket"], unit="s", utc=True)
+    n = df["n"].to_numpy(dtype=float)
+    summary: Dict[str, Any] = {"device": device, "readings": int(n.sum())}
+
+    for m in METRICS:
+        summary[m] = {
+            "min": round(float(df[f"{m}_min"].astype(float).min()), 1),
+            "avg": round(float(df[f"{m}_sum"].sum() / n.sum()), 1),
+            "max": round(float(df[f"{m}_max"].astype(float).max()), 1),
+        }
+
+    # Minute-average THI decides the zone for that minute
+    thi = df["thi_sum"].to_numpy(dtype=float) / n
+    zone = np.digitize(thi, [config.THI_NORMAL, config.THI_WARNING, config.THI_DANGER])
+    minutes = np.bincount(zone, minlength=4)
+    summary["thi_hours"] = {name: round(minutes[i] / 60, 2)
+                            for i, name in enumerate(("normal", "warning", "danger", "critical"))}
+
+    duty = relay_duty_cycle(df)
+    summary["relay"] = {k: duty[k] for k in ("on_minutes", "duty_cycle", "cycles", "mean_on_minutes", "energy_kwh")}
+
+    gaps = rollup_gaps(df, start_ts, min(end_ts, time.time()))
+    summary["gaps"] = {
+        "uptime_pct": gaps["uptime_pct"],
+        "gap_count": gaps["gap_count"],
+        "longest_gap_min": gaps["longest_gap_min"],
+    }
+    return summary
+
+
+# =============================================================================
+# RENDER
+# =============================================================================
+_ZONE_COLORS = {"normal": "#34C759", "warning": "#FFCC00", "danger": "#FF3B30", "critical": "#AF52DE"}
+
+
+def render_html(title: str, report: Dict[str, Any]) -> str:
+    rows = []
+    for s in report["devices"]:
+        zones = "".join(
+            f'<td style="color: {_ZONE_COLORS[z]};">{s["thi_hours"][z]:.1f}</td>' for z in _ZONE_COLORS
+        )
+        rows.append(
+            f"<tr><td><b>{html.escape(s['device'])}</b></td>"
+            f"<td>{s['thi']['min']} / {s['thi']['avg']} / {s['thi']['max']}</td>{zones}"
+            f"<td>{s['temp']['min']} / {s['temp']['max']}</td><td>{s['rh']['min']} / {s['rh']['max']}</td>"
+            f"<td>{s['relay']['on_minutes'] / 60:.1f} h ({s['relay']['duty_cycle']:.0%}), "
+            f"{s['relay']['cycles']} cycles, {s['relay']['energy_kwh']:.2f} kWh</td>"
+            f"<td>{s['gaps']['uptime_pct']}% ({s['gaps']['gap_count']} gaps)</td></tr>"
+        )
+    return f"""<!DOCTYPE html>
+<html><head><meta charset="utf-8"><title>{html.escape(title)}</title>
+<style>
+body {{ font-family: Inter, -apple-system, sans-serif; color: #1D1D1F; margin: 2rem; }}
+table {{ border-collapse: collapse; width: 100%; font-size: 0.85rem; }}
+th, td {{ padding: 0.4rem 0.6rem; border-bottom: 1px solid #E5E5EA; text-align: left; }}
+th {{ color: #86868B; font-weight: 600; }}
+</style></head><body>
+<h1>🐦 {html.escape(title)}</h1>
+<p style="color: #86868B;">{report['start']} – {report['end']} · {len(report['devices'])} sheds ·
+generated {report['generated_at']}</p>
+<table>
+<tr><th>Shed</th><th>THI min / avg / max</th><th>h normal</th><th>h warning</th><th>h danger</th>
+<th>h critical</th><th>Temp min / max</th><th>RH min / max</th><th>Cooling</th><th>Uptime</th></tr>
+{"".join(rows)}
+</table></body></html>
+"""
+
+
+# =============================================================================
+# JOB
+# =============================================================================
+def _is_done(json_path: Path) -> bool:
+    try:
+        return json.loads(json_path.read_text()).get("complete", False)
+    except (OSError, ValueError):
+        return False
+
+
+def generate(period: str, since: date, until: date, out_dir: Path,
+             workers: Optional[int] = None, force: bool = False) -> List[Path]:
+    """Write HTML + JSON for every period in [since, until]; returns the JSON paths written"""
+    target = out_dir / period
+    target.mkdir(parents=True, exist_ok=True)
+    todo = [p for p in periods_between(period, since, until)
+            if force or not _is_done(target / f"{p[0]}.json")]
+    print(f"[📄] {len(todo)} {period} report(s) to generate in {target}")
+    if not todo:
+        return []
+
+    written = []
+    with ProcessPoolExecutor(max_workers=workers) as pool, ThreadPoolExecutor(max_workers=1) as io:
+        pending = io.submit(fetch_period, todo[0][1], todo[0][2])
+        for i, (label, start, end) in enumerate(todo):
+            t0 = time.perf_counter()
+            data = pending.result()
+            if i + 1 < len(todo):
+                pending = io.submit(fetch_period, todo[i + 1][1], todo[i + 1][2])
+
+            devices = sorted(data)
+            chunksize = max(1, len(devices) // ((workers or os.cpu_count() or 1) * 4))
+            summaries = pool.map(summarize_device, devices, [data[d] for d in devices],
+                                 [start.timestamp()] * len(devices), [end.timestamp()] * len(devices),
+                                 chunksize=chunksize)
+            report = {
+                "period": period,
+                "label": label,
+                "start": start.isoformat(),
+                "end": end.isoformat(),
+                "generated_at": datetime.now(start.tzinfo).isoformat(timespec="seconds"),
+                "complete": end.timestamp() <= time.time(),
+                "devices": list(summaries),
+            }
+            json_path = target / f"{label}.json"
+            json_path.write_text(json.dumps(report, indent=2))
+            (target / f"{label}.html").write_text(render_html(f"SmartQuail {period} report {label}", report))
+            written.append(json_path)
+            print(f"[✅] {label}: {len(report['devices'])} sheds in {time.perf_counter() - t0:.2f}s")
+    return written
+
+
+def main():
+    parser = argparse.ArgumentParser(description="SmartQuail daily/weekly farm reports")
+    parser.add_argument("--period", choices=["daily", "weekly"], default="daily")
+    parser.add_argument("--since", type=date.fromisoformat, help="first day (default: --days ago)")
+    parser.add_argument("--until", type=date.fromisoformat, help="last day (default: yesterday)")
+    parser.add_argument("--days", type=int, default=7, help="days back when --since is not given")
+    parser.add_argument("--out", type=Path, default=Path(config.REPORT_DIR))
+    parser.add_argument("--workers", type=int, default=os.cpu_count())
+    parser.add_argument("--force", action="store_true", help="regenerate periods already reported")
+    args = parser.parse_args()
+
+    today = datetime.now(ZoneInfo(config.REPORT_TIMEZONE)).date()
+    until = args.until or today - timedelta(days=1)
+    since = args.since or until - timedelta(days=args.days - 1)
+    generate(args.period, since, until, args.out, args.workers, args.force)
+
+
+if __name__ == "__main__":
+    main()
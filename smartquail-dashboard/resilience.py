@@ -0,0 +1,198 @@
+"""
+SmartQuail Backend Resilience
+=============================
+Deadlines, circuit breaker and last-good snapshots for backend calls
+
+A slow or unreachable Supabase must not block a Streamlit run until the
+HTTP timeout. Every call gets a hard deadline, repeated failures open the
+circuit so later calls fail fast, and reads fall back to the last good
+result, which the dashboard shows as stale. Calls are counted against the
+query budget (budget.py); reads it sheds, and concurrent reads of the same
+key, are answered from one fetch or the last snapshot.
+"""
+
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeout
+from typing import Any, Callable, Dict, Hashable, Optional, Tuple
+
+import telemetry
+from budget import BudgetExceeded, QueryBudget, current_caller
+
+
+class DeadlineExceeded(Exception):
+    """Raised when a backend call does not finish before its deadline"""
+
+
+class CircuitOpenError(Exception):
+    """Raised when the circuit is open and the call was not attempted"""
+
+
+# =============================================================================
+# CIRCUIT BREAKER
+# =============================================================================
+class CircuitBreaker:
+    """Closed -> open after N consecutive failures -> half-open after a cooldown"""
+
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+
+    def __init__(self, failure_threshold: int = 3, reset_timeout: float = 15.0):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self._state = self.CLOSED
+        self._failures = 0
+        self._opened_at = 0.0
+        self._lock = threading.Lock()
+
+    @property
+    def state(self) -> str:
+        with self._lock:
+            if self._state == self.OPEN and time.monotonic() - self._opened_at >= self.reset_timeout:
+                return self.HALF_OPEN
+            return self._state
+
+    def allow(self) -> bool:
+        """Return True if a call may be attempted now"""
+        with self._lock:
+            if self._state == self.CLOSED:
+                return True
+            if self._state == self.OPEN and time.monotonic() - self._opened_at >= self.reset_timeout:
+                # Let exactly one trial call through
+                self._state = self.HALF_OPEN
+                return True
+            return False
+
+    def record_success(self):
+        with self._lock:
+            self._state = self.CLOSED
+            self._failures = 0
+
+    def record_failure(self):
+        with self._lock:
+            self._failures += 1
+            if self._state == self.HALF_OPEN or self._failures >= self.failure_threshold:
+                self._state = self.OPEN
+                self._opened_at = time.monotonic()
+
+
+# =============================================================================
+# GUARDED BACKEND
+# =============================================================================
+class GuardedBackend:
+    """Runs backend calls with a deadline behind a circuit breaker"""
+
+    def __init__(self, timeout: float = 3.0, failure_threshold: int = 3,
+                 reset_timeout: float = 15.0, max_workers: int = 4,
+                 budget: Optional[QueryBudget] = None, max_keys: int = 512):
+        self.timeout = timeout
+        self.breaker = CircuitBreaker(failure_threshold, reset_timeout)
+        self.budget = budget
+        self.max_keys = max_keys
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="db-call")
+        # Least recently refreshed first; at most max_keys snapshots are kept
+        self._snapshots: "OrderedDict[Hashable, Tuple[Any, float]]" = OrderedDict()
+        self._stale: Dict[Hashable, float] = {}
+        self._last_error: Optional[str] = None
+        self._key_locks: Dict[Hashable, threading.Lock] = {}
+        self._lock = threading.Lock()
+
+    def call(self, fn: Callable[[], Any], timeout: Optional[float] = None, caller: Optional[str] = None) -> Any:
+        """
+        Run fn() under the deadline. Raises on failure, timeout or open circuit,
+        and BudgetExceeded if the caller class (default: budget.caller()) is shed.
+        """
+        # Before the breaker, so a shed call never takes the half-open trial
+        if self.budget is not None and not self.budget.admit(caller or current_caller()):
+            raise BudgetExceeded(f"{caller or current_caller()} over its query budget share")
+        if not self.breaker.allow():
+            raise CircuitOpenError("backend circuit is open")
+        future = self._executor.submit(fn)
+        try:
+            result = future.result(timeout=timeout or self.timeout)
+        except FutureTimeout:
+            # The worker thread keeps running; we only stop waiting for it
+            future.cancel()
+            self._fail(f"deadline of {timeout or self.timeout:.1f}s exceeded")
+            raise DeadlineExceeded(self._last_error)
+        except Exception as e:
+            self._fail(str(e))
+            raise
+        self.breaker.record_success()
+        return result
+
+    def read(self, key: Hashable, fn: Callable[[], Any], default: Any = None) -> Any:
+        """
+        Guarded read with stale-while-revalidate fallback.
+
+        On success the result is stored as the last good snapshot for key.
+        On failure the last snapshot is returned and key is marked stale;
+        without a snapshot the default is returned. Concurrent reads of one
+        key share a single fetch, and a read shed by the query budget gets
+        the snapshot without being marked stale.
+        """
+        name = key[0] if isinstance(key, tuple) else key
+        started = time.time()
+        with self._lock:
+            key_lock = self._key_locks.setdefault(key, threading.Lock())
+            if len(self._key_locks) > 2 * self.max_keys:
+                self._trim_key_locks(keep=key)
+        with key_lock:
+            with self._lock:
+                snapshot = self._snapshots.get(key)
+            if snapshot is not None and snapshot[1] >= started:
+                # Fetched by another caller while we waited
+                telemetry.CACHE_REQUESTS.inc(cache="coalesced", result="hit")
+                return snapshot[0]
+            try:
+                with telemetry.DB_QUERY_SECONDS.time(query=name):
+                    value = self.call(fn)
+            except BudgetExceeded:
+                if snapshot is None:
+                    print(f"[⚠️] {name} shed by the query budget, no snapshot yet")
+                    return default
+                telemetry.CACHE_REQUESTS.inc(cache="snapshot", result="hit")
+                return snapshot[0]
+            except Exception as e:
+                print(f"[DB ERROR] {name} failed: {e}")
+                with self._lock:
+                    snapshot = self._snapshots.get(key)
+                    if snapshot is None:
+                        telemetry.CACHE_REQUESTS.inc(cache="snapshot", result="miss")
+                        return default
+                    telemetry.CACHE_REQUESTS.inc(cache="snapshot", result="hit")
+                    self._stale[key] = snapshot[1]
+                    return snapshot[0]
+            with self._lock:
+                self._snapshots[key] = (value, time.time())
+                self._snapshots.move_to_end(key)
+                self._stale.pop(key, None)
+                while len(self._snapshots) > self.max_keys:
+                    evicted, _ = self._snapshots.popitem(last=False)
+                    self._stale.pop(evicted, None)
+            return value
+
+    def _trim_key_locks(self, keep: Hashable):
+        """Drop idle per-key locks of keys without a snapshot (call with self._lock held)"""
+        for key, lock in list(self._key_locks.items()):
+            if key != keep and key not in self._snapshots and not lock.locked():
+                del self._key_locks[key]
+
+    def status(self) -> Dict[str, Any]:
+        """Backend health for the UI: circuit state and oldest stale snapshot"""
+        with self._lock:
+            stale_since = min(self._stale.values()) if self._stale else None
+            last_error = self._last_error
+        return {
+            "circuit": self.breaker.state,
+            "stale": stale_since is not None,
+            "stale_since": stale_since,
+            "last_error": last_error,
+        }
+
+    def _fail(self, message: str):
+        with self._lock:
+            self._last_error = message
+        self.breaker.record_failure()
@@ -0,0 +1,93 @@
+"""
+SmartQuail Sensor Schema
+========================
+Versioned metric registry shared by the bridge and the dashboard
+
+Core metrics (temp, rh, thi, relay, status) are columns of sensor_logs,
+as before. Every other metric (ammonia, the Nextion actuators, ...) is a
+row in the narrow sensor_metrics table:
+
+    (device, metric SMALLINT, sampled_ms BIGINT, value INTEGER)
+
+keyed on the reading's sample time (epoch ms), like sensor_logs.
+
+A value is stored as a scaled integer, round(value * 10^scale), so ammonia
+12.3 ppm is 123 and a fan state is 0/1. A new metric only needs an entry
+in METRICS with a fresh id (ids are never reused) and a SCHEMA_VERSION
+bump; no table changes. Readings record the schema version they were
+decoded with.
+"""
+
+from typing import Any, Dict, Iterable, List, NamedTuple, Optional, Tuple
+
+SCHEMA_VERSION = 2  # 1 = temp/rh/thi/relay/status only
+
+
+class Metric(NamedTuple):
+    name: str
+    id: int              # sensor_metrics.metric; stable, never reused
+    unit: str
+    kind: str = "float"  # float | switch | text
+    scale: int = 1       # decimals kept in the integer encoding
+    column: bool = False  # stored as a sensor_logs column instead
+    since: int = 1       # schema version that introduced it
+
+
+METRICS: Dict[str, Metric] = {m.name: m for m in (
+    Metric("temp", 1, "°C", column=True),
+    Metric("rh", 2, "%", column=True),
+    Metric("thi", 3, "", column=True),
+    Metric("relay", 4, "", kind="switch", scale=0, column=True),
+    Metric("status", 5, "", kind="text", scale=0, column=True),
+    Metric("nh3", 10, "ppm", since=2),
+    Metric("mist", 20, "", kind="switch", scale=0, since=2),
+    Metric("fan", 21, "", kind="switch", scale=0, since=2),
+    Metric("exhaust", 22, "", kind="switch", scale=0, since=2),
+    Metric("feed", 23, "", kind="switch", scale=0, since=2),
+)}
+METRIC_NAMES = {m.id: m.name for m in METRICS.values()}
+COLUMN_METRICS = tuple(m.name for m in METRICS.values() if m.column)
+EXTRA_METRICS = tuple(m.name for m in METRICS.values() if not m.column)
+
+
+def split(metrics: Iterable[str]) -> Tuple[List[str], List[str]]:
+    """(sensor_logs columns, sensor_metrics names) for a metric list; unknown names raise"""
+    names = list(metrics)
+    unknown = [n for n in names if n not in METRICS]
+    if unknown:
+        raise ValueError(f"Unknown metric(s): {', '.join(unknown)}")
+    return [n for n in names if METRICS[n].column], [n for n in names if not METRICS[n].column]
+
+
+def _switch(value: Any) -> Optional[int]:
+    if isinstance(value, str):
+        value = value.strip().upper()
+        return {"ON": 1, "OFF": 0, "1": 1, "0": 0, "TRUE": 1, "FALSE": 0}.get(value)
+    return int(bool(value))
+
+
+def decode_extra(payload: Dict[str, Any], metrics: Iterable[str] = EXTRA_METRICS) -> Dict[str, float]:
+    """Extra metric values present in a payload; missing or unparsable ones are skipped"""
+    values = {}
+    for name in metrics:
+        raw = payload.get(name)
+        if raw is None:
+            continue
+        metric = METRICS[name]
+        try:
+            value = _switch(raw) if metric.kind == "switch" else float(raw)
+        except (TypeError, ValueError):
+            continue
+        if value is not None and value == value:  # skip NaN
+            values[name] = value
+    return values
+
+
+def encode(name: str, value: float) -> int:
+    return int(round(value * 10 ** METRICS[name].scale))
+
+
+def decode(metric_id: int, value: int) -> Tuple[str, float]:
+    name = METRIC_NAMES[metric_id]
+    scale = METRICS[name].scale
+    return name, value / 10 ** scale if scale else value
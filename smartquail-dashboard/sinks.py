@@ -0,0 +1,401 @@
+"""
+SmartQuail Data Sinks
+=====================
+Fan-out of validated readings from the bridge to several destinations
+
+Each sink has its own bounded queue, batching policy and worker thread,
+so a slow or unreachable destination never delays the others:
+
+- SupabaseSink  sensor_logs, batched bulk upserts (retries transient errors until stored)
+- EdgeSink      local store + window summaries when EDGE_MODE=1 (edge.py)
+- HotTierSink   in-memory ring buffers served to the dashboards (HOT_TIER=1, hot_tier.py)
+- InfluxSink    InfluxDB line protocol over HTTP (INFLUX_WRITE_URL)
+- JsonlSink     one JSON line per reading, a file per day (JSONL_SINK_DIR)
+- NextionSink   newest reading per device to NEXTION_TOPIC for the panel
+
+When a queue is full new readings for that sink are dropped and counted.
+Per sink on /metrics: queue depth, lag (age of the oldest reading in the
+last written batch), rows written, rows dropped by reason, write time.
+
+Records are sensor_logs rows as built by database.prepare_sensor_record.
+"""
+
+import json
+import queue
+import threading
+import time
+import urllib.request
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+import config
+import telemetry
+
+SINK_QUEUE_DEPTH = telemetry.gauge("smartquail_sink_queue_depth", "Readings waiting per sink")
+SINK_LAG = telemetry.gauge("smartquail_sink_lag_seconds", "Age of the oldest reading in the last batch per sink")
+SINK_WRITTEN = telemetry.counter("smartquail_sink_written_total", "Readings written per sink")
+SINK_DROPPED = telemetry.counter("smartquail_sink_dropped_total", "Readings dropped per sink and reason")
+SINK_WRITE_SECONDS = telemetry.histogram("smartquail_sink_write_seconds", "Batch write time per sink")
+
+Item = Tuple[float, Dict[str, Any]]  # (received_at, record)
+
+
+# =============================================================================
+# BASE
+# =============================================================================
+class DataSink:
+    """
+    Queue + worker around write_batch().
+
+    A batch is written when batch_size readings are waiting or flush_sec
+    after its first reading, whichever comes first. A failed batch is
+    retried with backoff up to max_retries times (None = until it works,
+    the queue then buffers and drops new readings once full). Errors
+    permanent() says will never succeed are not retried: the batch is
+    split to isolate the bad readings, and readings a sink gives up on
+    go to SINK_DEAD_LETTER_DIR.
+    """
+
+    name = "sink"
+    batch_size = 100
+    flush_sec = 1.0
+    max_retries: Optional[int] = config.SINK_MAX_RETRIES
+
+    def __init__(self, max_queue: int = config.SINK_QUEUE_SIZE, workers: int = 1):
+        self._queue: "queue.Queue[Optional[Item]]" = queue.Queue(maxsize=max_queue)
+        self._threads = [
+            threading.Thread(target=self._worker, name=f"sink-{self.name}-{i}", daemon=True)
+            for i in range(workers)
+        ]
+        for thread in self._threads:
+            thread.start()
+
+    def submit(self, record: Dict[str, Any], received_at: Optional[float] = None):
+        """Queue one record; never blocks"""
+        try:
+            self._queue.put_nowait((time.time() if received_at is None else received_at, record))
+        except queue.Full:
+            SINK_DROPPED.inc(sink=self.name, reason="full")
+        SINK_QUEUE_DEPTH.set(self._queue.qsize(), sink=self.name)
+
+    def write_batch(self, batch: List[Item]):
+        """Write a batch; raise to have it retried"""
+        raise NotImplementedError
+
+    def permanent(self, error: Exception) -> bool:
+        """True if retrying the batch cannot help (bad data, schema mismatch)"""
+        return False
+
+    def close(self, timeout: float = 5.0):
+        """Write what is queued (up to timeout seconds) and stop the workers"""
+        deadline = time.monotonic() + timeout
+        try:
+            for _ in self._threads:
+                self._queue.put(None, timeout=max(deadline - time.monotonic(), 0.01))
+        except queue.Full:
+            return
+        for thread in self._threads:
+            thread.join(max(deadline - time.monotonic(), 0))
+
+    def _next_batch(self) -> Tuple[List[Item], bool]:
+        first = self._queue.get()
+        if first is None:
+            return [], True
+        batch = [first]
+        deadline = time.monotonic() + self.flush_sec
+        while len(batch) < self.batch_size:
+            remaining = deadline - time.monotonic()
+            try:
+                item = self._queue.get(timeout=remaining) if remaining > 0 else self._queue.get_nowait()
+            except queue.Empty:
+                break
+            if item is None:
+                return batch, True
+            batch.append(item)
+        return batch, False
+
+    def _worker(self):
+        stop = False
+        while not stop:
+            batch, stop = self._next_batch()
+            if not batch:
+                continue
+            SINK_QUEUE_DEPTH.set(self._queue.qsize(), sink=self.name)
+            self._write_with_retries(batch, stop)
+
+    def _write_with_retries(self, batch: List[Item], stopping: bool):
+        attempt = 0
+        while True:
+            try:
+                with SINK_WRITE_SECONDS.time(sink=self.name):
+                    self.write_batch(batch)
+            except Exception as e:
+                attempt += 1
+                if self.permanent(e):
+                    if len(batch) > 1:
+                        # Write the good readings, narrow down the bad ones
+                        half = len(batch) // 2
+                        self._write_with_retries(batch[:half], stopping)
+                        self._write_with_retries(batch[half:], stopping)
+                    else:
+                        self._dead_letter(batch, e, "rejected")
+                    return
+                if stopping or (self.max_retries is not None and attempt > self.max_retries):
+                    self._dead_letter(batch, e, "error")
+                    return
+                print(f"[⚠️] Sink {self.name} write failed (attempt {attempt}), retrying: {e}")
+                time.sleep(min(2 ** attempt, 30))
+                continue
+            SINK_WRITTEN.inc(len(batch), sink=self.name)
+            SINK_LAG.set(round(time.time() - batch[0][0], 3), sink=self.name)
+            return
+
+    def _dead_letter(self, batch: List[Item], error: Exception, reason: str):
+        """Count and log a batch given up on; keep its readings in SINK_DEAD_LETTER_DIR"""
+        SINK_DROPPED.inc(len(batch), sink=self.name, reason=reason)
+        print(f"[❌] Sink {self.name} dropped {len(batch)} readings ({reason}): {error}")
+        if not config.SINK_DEAD_LETTER_DIR:
+            return
+        try:
+            directory = Path(config.SINK_DEAD_LETTER_DIR)
+            directory.mkdir(parents=True, exist_ok=True)
+            with open(directory / f"{self.name.replace(':', '-')}.jsonl", "a", encoding="utf-8") as f:
+                for received_at, record in batch:
+                    f.write(json.dumps({"received_at": received_at, "reason": reason,
+                                        "error": str(error), "record": record}, default=str) + "\n")
+        except OSError as e:
+            print(f"[❌] Sink {self.name} dead letter write failed: {e}")
+
+
+# =============================================================================
+# SINKS
+# =============================================================================
+class SupabaseSink(DataSink):
+    """sensor_logs via bulk upsert; holds a batch until Supabase takes it or rejects it"""
+
+    name = "supabase"
+    batch_size = config.SUPABASE_SINK_BATCH
+    flush_sec = config.SUPABASE_SINK_FLUSH_SEC
+    max_retries = None
+
+    def __init__(self, farm: Optional[str] = None, **kwargs):
+        if farm is not None:
+            self.name = f"supabase:{farm}"
+        super().__init__(**kwargs)
+
+    def write_batch(self, batch: List[Item]):
+        import database as db
+
+        with telemetry.BRIDGE_INSERT_SECONDS.time():
+            db.insert_sensor_records([record for _, record in batch])
+
+    def permanent(self, error: Exception) -> bool:
+        import database as db
+
+        return db.is_permanent_error(error)
+
+
+class EdgeSink(DataSink):
+    """Feeds the edge aggregator (local SQLite, summaries uploaded by edge.py)"""
+
+    name = "edge"
+    max_retries = None
+
+    def __init__(self, aggregator, **kwargs):
+        self.aggregator = aggregator
+        super().__init__(**kwargs)
+
+    def write_batch(self, batch: List[Item]):
+        for _, record in batch:
+            self.aggregator.add(record)
+
+
+class HotTierSink(DataSink):
+    """Feeds the bridge's in-memory hot tier (hot_tier.py)"""
+
+    name = "hot"
+    batch_size = 1000
+    flush_sec = 0.05  # dashboards read the newest reading from here
+
+    def __init__(self, hot, **kwargs):
+        self.hot = hot
+        super().__init__(**kwargs)
+
+    def write_batch(self, batch: List[Item]):
+        for _, record in batch:
+            self.hot.add(record)
+
+
+def _escape_tag(value: str) -> str:
+    return str(value).replace("\\", "\\\\").replace(",", "\\,").replace("=", "\\=").replace(" ", "\\ ")
+
+
+def line_protocol(record: Dict[str, Any], received_at: float) -> str:
+    """One reading as an InfluxDB line (measurement smartquail, ms precision)"""
+    fields = [f"{m}={float(record[m])}" for m in ("temp", "rh", "thi")]
+    fields.append(f"relay={int(record.get('relay') == 'ON')}i")
+    if record.get("seq") is not None:
+        fields.append(f"seq={int(record['seq'])}i")
+    if record.get("thi_forecast") is not None:
+        fields.append(f"thi_forecast={float(record['thi_forecast'])}")
+    for name, value in (record.get("metrics") or {}).items():
+        fields.append(f"{name}={int(value)}i" if isinstance(value, int) else f"{name}={float(value)}")
+    if record.get("flags"):
+        fields.append(f"flags={json.dumps(record['flags'])}")
+    ts_ms = record.get("sampled_ms") or int(received_at * 1000)
+    tags = f"device={_escape_tag(record['device'])},status={_escape_tag(record.get('status', 'OK'))}"
+    return f"smartquail,{tags} {','.join(fields)} {ts_ms}"
+
+
+class InfluxSink(DataSink):
+    """POSTs line protocol to InfluxDB (v1 /write or v2 /api/v2/write) or a compatible TSDB"""
+
+    name = "influx"
+    batch_size = 500
+    flush_sec = 2.0
+
+    def __init__(self, url: str = config.INFLUX_WRITE_URL, token: str = config.INFLUX_TOKEN,
+                 timeout: float = 5.0, **kwargs):
+        if "precision=" not in url:
+            url += ("&" if "?" in url else "?") + "precision=ms"
+        self.url = url
+        self.token = token
+        self.timeout = timeout
+        super().__init__(**kwargs)
+
+    def write_batch(self, batch: List[Item]):
+        body = "\n".join(line_protocol(record, t) for t, record in batch).encode()
+        headers = {"Content-Type": "text/plain; charset=utf-8"}
+        if self.token:
+            headers["Authorization"] = f"Token {self.token}"
+        request = urllib.request.Request(self.url, data=body, headers=headers, method="POST")
+        urllib.request.urlopen(request, timeout=self.timeout).close()
+
+
+class JsonlSink(DataSink):
+    """Appends readings to <dir>/readings-YYYY-MM-DD.jsonl (UTC), keeping keep_days files"""
+
+    name = "jsonl"
+    batch_size = 500
+    flush_sec = 5.0
+
+    def __init__(self, directory: str = config.JSONL_SINK_DIR, keep_days: int = config.JSONL_SINK_KEEP_DAYS,
+                 **kwargs):
+        self.directory = Path(directory)
+        self.directory.mkdir(parents=True, exist_ok=True)
+        self.keep_days = keep_days
+        self._day: Optional[str] = None
+        super().__init__(**kwargs)
+
+    def write_batch(self, batch: List[Item]):
+        by_day: Dict[str, List[str]] = {}
+        for t, record in batch:
+            received = datetime.fromtimestamp(t, timezone.utc)
+            line = json.dumps({**record, "received_at": received.isoformat(timespec="milliseconds")})
+            by_day.setdefault(received.date().isoformat(), []).append(line)
+        for day, lines in by_day.items():
+            with open(self.directory / f"readings-{day}.jsonl", "a", encoding="utf-8") as f:
+                f.write("\n".join(lines) + "\n")
+            if day != self._day:
+                self._day = day
+                self._prune(day)
+
+    def _prune(self, today: str):
+        cutoff = (datetime.fromisoformat(today) - timedelta(days=self.keep_days)).date().isoformat()
+        for path in self.directory.glob("readings-*.jsonl"):
+            if path.stem[len("readings-"):] < cutoff:
+                path.unlink(missing_ok=True)
+
+
+class NextionSink(DataSink):
+    """Publishes the newest reading per device to NEXTION_TOPIC; the ESP32 forwards it to the panel"""
+
+    name = "nextion"
+    batch_size = 1000
+    flush_sec = 1.0  # at most one panel update per device per second
+
+    def __init__(self, client, topic: str = config.NEXTION_TOPIC, **kwargs):
+        self.client = client
+        self.topic = topic
+        super().__init__(**kwargs)
+
+    def write_batch(self, batch: List[Item]):
+        latest = {record["device"]: record for _, record in batch}
+        for device, record in latest.items():
+            payload = {k: record.get(k) for k in ("temp", "rh", "thi", "relay", "status", "thi_eta_min")}
+            info = self.client.publish(self.topic.format(device=device), json.dumps(payload), qos=0)
+            if info.rc != 0:
+                raise RuntimeError(f"publish to {device} failed (rc={info.rc})")
+
+
+# =============================================================================
+# FAN-OUT
+# =============================================================================
+class SinkFanout:
+    """
+    Hands each record to every sink's queue.
+
+    With a farm_sink factory, records carrying a farm also go to that
+    farm's own sink (created on its first record), so a noisy farm only
+    fills its own queue and keeps its own writers busy.
+    """
+
+    def __init__(self, sinks: List[DataSink], farm_sink: Optional[Callable[[str], DataSink]] = None):
+        self.sinks = sinks
+        self.farm_sink = farm_sink
+        self._farms: Dict[str, DataSink] = {}
+        self._lock = threading.Lock()
+
+    def submit(self, record: Dict[str, Any], received_at: Optional[float] = None):
+        received_at = time.time() if received_at is None else received_at
+        for sink in self.sinks:
+            sink.submit(record, received_at)
+        if self.farm_sink is not None:
+            self._for_farm(record.get("farm") or config.DEFAULT_FARM).submit(record, received_at)
+
+    def _for_farm(self, farm: str) -> DataSink:
+        sink = self._farms.get(farm)
+        if sink is None:
+            with self._lock:
+                sink = self._farms.get(farm)
+                if sink is None:
+                    sink = self._farms[farm] = self.farm_sink(farm)
+                    print(f"[🏭] New farm {farm}: writer pool {sink.name}")
+        return sink
+
+    def close(self, timeout: float = 5.0):
+        for sink in self.sinks + list(self._farms.values()):
+            sink.close(timeout)
+
+    def names(self) -> List[str]:
+        names = [sink.name for sink in self.sinks]
+        if self.farm_sink is not None:
+            names.append("supabase per farm")
+        return names
+
+
+def build_fanout(client=None, edge=None, hot=None) -> SinkFanout:
+    """
+    Supabase (or the edge aggregator in EDGE_MODE) plus the sinks enabled
+    in config and the hot tier if given. With MQTT_FARM_TOPIC set, Supabase
+    gets one writer pool per farm.
+    """
+    sinks: List[DataSink] = []
+    farm_sink = None
+    if edge is not None:
+        sinks.append(EdgeSink(edge))
+    elif config.MQTT_FARM_TOPIC:
+        def farm_sink(farm: str) -> DataSink:
+            return SupabaseSink(farm=farm, workers=config.FARM_WRITERS)
+    else:
+        sinks.append(SupabaseSink())
+    if hot is not None:
+        sinks.append(HotTierSink(hot))
+    if config.INFLUX_WRITE_URL:
+        sinks.append(InfluxSink())
+    if config.JSONL_SINK_DIR:
+        sinks.append(JsonlSink())
+    if config.NEXTION_SINK and client is not None:
+        sinks.append(NextionSink(client))
+    return SinkFanout(sinks, farm_sink)
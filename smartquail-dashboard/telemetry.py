@@ -0,0 +1,252 @@
+"""
+SmartQuail Telemetry
+====================
+Lightweight hot-path metrics with a Prometheus text endpoint
+
+Counters, gauges and histograms live in a process-wide registry and are
+exported on a local /metrics endpoint. No external dependency: the
+exposition format is written by hand and served with http.server.
+
+Usage:
+    import telemetry
+    MESSAGES = telemetry.counter("smartquail_bridge_messages_total", "MQTT messages received")
+    MESSAGES.inc()
+    with telemetry.DB_QUERY_SECONDS.time(query="get_latest_data"):
+        ...
+    telemetry.start_metrics_server(9108)
+"""
+
+import bisect
+import threading
+import time
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, List, Optional, Sequence, Tuple
+
+# Latency buckets in seconds (1 ms .. 10 s)
+DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+LabelKey = Tuple[Tuple[str, str], ...]
+
+
+def _label_key(labels: Dict[str, str]) -> LabelKey:
+    return tuple(sorted((k, str(v)) for k, v in labels.items()))
+
+
+def _format_labels(key: LabelKey, extra: Optional[Tuple[str, str]] = None) -> str:
+    pairs = list(key) + ([extra] if extra else [])
+    if not pairs:
+        return ""
+    return "{" + ",".join(f'{k}="{v}"' for k, v in pairs) + "}"
+
+
+# =============================================================================
+# METRIC TYPES
+# =============================================================================
+class Counter:
+    """Monotonically increasing value per label set"""
+
+    kind = "counter"
+
+    def __init__(self, name: str, help_text: str):
+        self.name = name
+        self.help = help_text
+        self._values: Dict[LabelKey, float] = {}
+        self._lock = threading.Lock()
+
+    def inc(self, amount: float = 1.0, **labels):
+        key = _label_key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def value(self, **labels) -> float:
+        return self._values.get(_label_key(labels), 0.0)
+
+    def samples(self) -> List[Tuple[str, LabelKey, float]]:
+        with self._lock:
+            return [(self.name, k, v) for k, v in self._values.items()]
+
+
+class Gauge(Counter):
+    """Value that can go up and down"""
+
+    kind = "gauge"
+
+    def set(self, value: float, **labels):
+        with self._lock:
+            self._values[_label_key(labels)] = float(value)
+
+    def dec(self, amount: float = 1.0, **labels):
+        self.inc(-amount, **labels)
+
+
+class Histogram:
+    """Cumulative bucket counts, sum and count per label set"""
+
+    kind = "histogram"
+
+    def __init__(self, name: str, help_text: str, buckets: Sequence[float] = DEFAULT_BUCKETS):
+        self.name = name
+        self.help = help_text
+        self.buckets = tuple(sorted(buckets))
+        # label key -> [bucket counts..., +Inf count, sum]
+        self._values: Dict[LabelKey, List[float]] = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, **labels):
+        key = _label_key(labels)
+        idx = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            row = self._values.get(key)
+            if row is None:
+                row = self._values[key] = [0.0] * (len(self.buckets) + 2)
+            row[idx] += 1
+            row[-1] += value
+
+    @contextmanager
+    def time(self, **labels):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start, **labels)
+
+    def summary(self, **labels) -> Dict[str, float]:
+        """Count, mean and approximate p50/p95 (bucket upper bounds)"""
+        with self._lock:
+            row = list(self._values.get(_label_key(labels), []))
+        if not row:
+            return {"count": 0, "mean": 0.0, "p50": 0.0, "p95": 0.0}
+        count = sum(row[:-1])
+        bounds = list(self.buckets) + [float("inf")]
+
+        def quantile(q: float) -> float:
+            target, seen = q * count, 0.0
+            for bound, n in zip(bounds, row[:-1]):
+                seen += n
+                if seen >= target:
+                    return bound
+            return bounds[-1]
+
+        return {"count": count, "mean": row[-1] / count, "p50": quantile(0.5), "p95": quantile(0.95)}
+
+    def label_sets(self) -> List[Dict[str, str]]:
+        with self._lock:
+            return [dict(k) for k in self._values]
+
+    def samples(self) -> List[Tuple[str, LabelKey, float]]:
+        out = []
+        with self._lock:
+            items = [(k, list(v)) for k, v in self._values.items()]
+        for key, row in items:
+            cumulative = 0.0
+            for bound, n in zip(self.buckets, row):
+                cumulative += n
+                out.append((f"{self.name}_bucket", key + (("le", repr(bound)),), cumulative))
+            cumulative += row[len(self.buckets)]
+            out.append((f"{self.name}_bucket", key + (("le", "+Inf"),), cumulative))
+            out.append((f"{self.name}_sum", key, row[-1]))
+            out.append((f"{self.name}_count", key, cumulative))
+        return out
+
+
+# =============================================================================
+# REGISTRY
+# =============================================================================
+_REGISTRY: Dict[str, object] = {}
+_REGISTRY_LOCK = threading.Lock()
+
+
+def _register(cls, name: str, help_text: str, *args):
+    with _REGISTRY_LOCK:
+        metric = _REGISTRY.get(name)
+        if metric is None:
+            metric = _REGISTRY[name] = cls(name, help_text, *args)
+        return metric
+
+
+def counter(name: str, help_text: str) -> Counter:
+    return _register(Counter, name, help_text)
+
+
+def gauge(name: str, help_text: str) -> Gauge:
+    return _register(Gauge, name, help_text)
+
+
+def histogram(name: str, help_text: str, buckets: Sequence[float] = DEFAULT_BUCKETS) -> Histogram:
+    return _register(Histogram, name, help_text, buckets)
+
+
+def render() -> str:
+    """All registered metrics in Prometheus text exposition format"""
+    lines = []
+    with _REGISTRY_LOCK:
+        metrics = list(_REGISTRY.values())
+    for metric in metrics:
+        lines.append(f"# HELP {metric.name} {metric.help}")
+        lines.append(f"# TYPE {metric.name} {metric.kind}")
+        for name, key, value in metric.samples():
+            lines.append(f"{name}{_format_labels(key)} {value:g}")
+    return "\n".join(lines) + "\n"
+
+
+def cache_hit_ratio(cache: str) -> Optional[float]:
+    """Hit ratio for one cache label of CACHE_REQUESTS, None if unused"""
+    hits = CACHE_REQUESTS.value(cache=cache, result="hit")
+    misses = CACHE_REQUESTS.value(cache=cache, result="miss")
+    total = hits + misses
+    return hits / total if total else None
+
+
+# =============================================================================
+# SHARED METRICS
+# =============================================================================
+# Bridge
+BRIDGE_MESSAGES = counter("smartquail_bridge_messages_total", "MQTT messages received by the bridge")
+BRIDGE_ERRORS = counter("smartquail_bridge_errors_total", "Messages that failed to decode or store")
+BRIDGE_DECODE_SECONDS = histogram("smartquail_bridge_decode_seconds", "Payload decode time")
+BRIDGE_INSERT_SECONDS = histogram("smartquail_bridge_insert_seconds", "Database insert latency")
+BRIDGE_QUEUE_DEPTH = gauge("smartquail_bridge_queue_depth", "Messages received but not yet stored")
+INGEST_DUPLICATES = counter("smartquail_ingest_duplicates_total", "Redelivered readings dropped before the database")
+INGEST_REJECTED = counter("smartquail_ingest_anomalies_total", "Readings dropped as invalid or flagged as suspect")
+
+# Dashboard / data layer
+RENDER_SECONDS = histogram("smartquail_render_seconds", "Dashboard render time per section")
+DB_QUERY_SECONDS = histogram("smartquail_db_query_seconds", "Database query latency")
+CACHE_REQUESTS = counter("smartquail_cache_requests_total", "Cache lookups by cache and result")
+
+
+# =============================================================================
+# HTTP ENDPOINT
+# =============================================================================
+class _MetricsHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path.split("?")[0] != "/metrics":
+            self.send_error(404)
+            return
+        body = render().encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+_server: Optional[ThreadingHTTPServer] = None
+
+
+def start_metrics_server(port: int, host: str = "127.0.0.1") -> bool:
+    """Serve /metrics in a daemon thread. Idempotent; False if the port is taken."""
+    global _server
+    if _server is not None:
+        return True
+    try:
+        _server = ThreadingHTTPServer((host, port), _MetricsHandler)
+    except OSError as e:
+        print(f"[⚠️] Metrics endpoint not started on {host}:{port}: {e}")
+        return False
+    threading.Thread(target=_server.serve_forever, name="metrics-http", daemon=True).start()
+    return True
@@ -0,0 +1,277 @@
+"""
+SmartQuail Traffic Record & Replay
+==================================
+Capture raw MQTT traffic at the bridge and publish it again, faster
+
+A capture is a gzipped JSON-lines file. The first line is a header,
+every other line one message:
+
+    {"format": "smartquail-traffic", "version": 1, "start_ms": 1760781600000}
+    [offset_ms, topic, payload, qos]
+
+offset_ms is the arrival time relative to start_ms (monotonic clock, so
+wall-clock steps don't reorder it) and payload is the message text.
+Payloads that are not UTF-8 are stored as {"b64": ...}. A capture cut
+short by a crash is read up to the last complete line.
+
+Recording (the bridge writes every message it receives):
+    MQTT_RECORD_PATH=captures/incident.jsonl.gz python mqtt_bridge.py
+
+Replay to a local broker, at 1x, 10x or as fast as possible (--speed 0):
+    python traffic.py replay captures/incident.jsonl.gz --speed 10
+    python traffic.py replay captures/incident.jsonl.gz --speed 0 --retime
+
+Turn an export_to_csv dump (dashboard CSV download) into a capture:
+    python traffic.py from-csv smartquail_data.csv captures/day.jsonl.gz
+
+Replays are deterministic: the same capture always publishes the same
+payloads in the same order on a fixed schedule (start + offset / speed,
+not sleeps between messages, so lateness doesn't accumulate). --retime
+rewrites each payload's "ts" to replay start + scheduled offset, so the
+readings are not deduplicated against an earlier replay and pass the
+clock-skew check; at --speed 0 readings are 1 ms apart. Replay reports
+how late publishing ran behind the schedule, so a run that could not
+keep up is visible before its numbers are compared.
+"""
+
+import base64
+import gzip
+import json
+import threading
+import time
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+import config
+
+FORMAT = "smartquail-traffic"
+VERSION = 1
+
+# CSV columns that are not part of a device payload
+_CSV_SKIP = {"id", "created_at", "sampled_ms", "ts_ms", "dedup_key", "schema_version", "flags",
+             "thi_forecast", "thi_eta_min", "from_edge", "farm", "house"}
+
+Message = Tuple[int, str, bytes, int]
+
+
+# =============================================================================
+# CAPTURE FILES
+# =============================================================================
+def _encode_payload(payload: bytes) -> Any:
+    try:
+        return payload.decode("utf-8")
+    except UnicodeDecodeError:
+        return {"b64": base64.b64encode(payload).decode()}
+
+
+def _decode_payload(value: Any) -> bytes:
+    if isinstance(value, dict):
+        return base64.b64decode(value["b64"])
+    return value.encode("utf-8")
+
+
+class TrafficRecorder:
+    """Appends received MQTT messages to a capture file"""
+
+    def __init__(self, path: str, start_ms: Optional[int] = None):
+        self.path = path
+        self._file = gzip.open(path, "wt", encoding="utf-8", compresslevel=6)
+        self._t0 = time.perf_counter()
+        self._lock = threading.Lock()
+        self.count = 0
+        header = {"format": FORMAT, "version": VERSION,
+                  "start_ms": start_ms if start_ms is not None else int(time.time() * 1000)}
+        self._file.write(json.dumps(header) + "\n")
+
+    def record(self, topic: str, payload: bytes, qos: int = 0, received_at: Optional[float] = None):
+        """Write one message; received_at is a time.perf_counter() value (default: now)"""
+        offset_ms = round(((received_at or time.perf_counter()) - self._t0) * 1000)
+        self.write(max(offset_ms, 0), topic, payload, qos)
+
+    def write(self, offset_ms: int, topic: str, payload: bytes, qos: int = 0):
+        """Write one message at a given offset (for converted captures)"""
+        line = json.dumps([offset_ms, topic, _encode_payload(payload), qos], separators=(",", ":"))
+        with self._lock:
+            self._file.write(line + "\n")
+            self.count += 1
+
+    def close(self):
+        with self._lock:
+            self._file.close()
+
+
+def read_capture(path: str) -> Tuple[Dict[str, Any], Iterator[Message]]:
+    """(header, messages) of a capture; messages are (offset_ms, topic, payload, qos)"""
+    f = gzip.open(path, "rt", encoding="utf-8")
+    header = json.loads(f.readline())
+    if header.get("format") != FORMAT:
+        f.close()
+        raise ValueError(f"{path} is not a {FORMAT} capture")
+
+    def messages() -> Iterator[Message]:
+        with f:
+            try:
+                for line in f:
+                    try:
+                        offset_ms, topic, payload, qos = json.loads(line)
+                    except ValueError:
+                        break  # torn last line
+                    yield offset_ms, topic, _decode_payload(payload), qos
+            except (EOFError, OSError):
+                pass  # capture cut short by a crash
+
+    return header, messages()
+
+
+# =============================================================================
+# CSV CONVERSION
+# =============================================================================
+def _csv_time_ms(row: Dict[str, str]) -> Optional[int]:
+    from datetime import datetime
+
+    if row.get("sampled_ms"):
+        return int(float(row["sampled_ms"]))
+    if row.get("created_at"):
+        return int(datetime.fromisoformat(row["created_at"].replace("Z", "+00:00")).timestamp() * 1000)
+    return None
+
+
+def _csv_value(value: str) -> Any:
+    try:
+        number = float(value)
+    except ValueError:
+        return value
+    return int(number) if number.is_integer() and "." not in value else number
+
+
+def csv_to_capture(csv_path: str, out_path: str, topic: str = config.MQTT_TOPIC) -> int:
+    """Write the rows of an export_to_csv dump as a capture, in sample-time order"""
+    import csv
+
+    with open(csv_path, newline="", encoding="utf-8") as f:
+        rows = [(t, row) for row in csv.DictReader(f) if (t := _csv_time_ms(row)) is not None]
+    rows.sort(key=lambda r: r[0])
+    if not rows:
+        raise ValueError(f"{csv_path} has no rows with sampled_ms or created_at")
+
+    first_ms = rows[0][0]
+    recorder = TrafficRecorder(out_path, start_ms=first_ms)
+    try:
+        for sampled_ms, row in rows:
+            payload = {k: _csv_value(v) for k, v in row.items() if k not in _CSV_SKIP and v != ""}
+            payload["ts"] = sampled_ms
+            recorder.write(sampled_ms - first_ms, topic,
+                           json.dumps(payload, separators=(",", ":")).encode(), config.MQTT_QOS)
+    finally:
+        recorder.close()
+    return recorder.count
+
+
+# =============================================================================
+# REPLAY
+# =============================================================================
+def _retime(payload: bytes, ts_ms: int) -> bytes:
+    try:
+        data = json.loads(payload)
+    except ValueError:
+        return payload
+    if not isinstance(data, dict):
+        return payload
+    data["ts"] = ts_ms
+    return json.dumps(data, separators=(",", ":")).encode()
+
+
+def replay(path: str, speed: float = 1.0, broker: str = "127.0.0.1", port: int = 1883,
+           retime: bool = False, limit: Optional[int] = None) -> Dict[str, Any]:
+    """
+    Publish a capture on its schedule, speed times faster (0 = no waiting).
+
+    Returns messages sent, wall time, and how far publishing ran behind the
+    schedule (p95/max, ms).
+    """
+    import paho.mqtt.client as mqtt
+
+    header, messages = read_capture(path)
+    client = mqtt.Client(client_id=f"smartquail-replay-{int(time.time())}")
+    client.connect(broker, port, 60)
+    client.loop_start()
+
+    lateness: List[float] = []
+    info = None
+    sent = 0
+    start_ms = int(time.time() * 1000)
+    t0 = time.perf_counter()
+    try:
+        for i, (offset_ms, topic, payload, qos) in enumerate(messages):
+            if limit is not None and i >= limit:
+                break
+            due_ms = offset_ms / speed if speed > 0 else 0.0
+            if speed > 0:
+                wait = t0 + due_ms / 1000 - time.perf_counter()
+                if wait > 0:
+                    time.sleep(wait)
+                lateness.append(max((time.perf_counter() - t0) * 1000 - due_ms, 0.0))
+            if retime:
+                payload = _retime(payload, start_ms + (round(due_ms) if speed > 0 else i))
+            info = client.publish(topic, payload, qos=qos)
+            sent += 1
+        if info is not None:
+            info.wait_for_publish()
+    finally:
+        client.loop_stop()
+        client.disconnect()
+
+    elapsed = time.perf_counter() - t0
+    lateness.sort()
+    return {
+        "messages": sent,
+        "seconds": round(elapsed, 2),
+        "rate": round(sent / elapsed, 1) if elapsed > 0 else None,
+        "late_p95_ms": round(lateness[int(0.95 * (len(lateness) - 1))], 1) if lateness else None,
+        "late_max_ms": round(lateness[-1], 1) if lateness else None,
+        "recorded_at": header.get("start_ms"),
+    }
+
+
+def summarize(path: str) -> Dict[str, Any]:
+    """Message count, span and topics of a capture"""
+    header, messages = read_capture(path)
+    count, last_ms, topics = 0, 0, {}
+    for offset_ms, topic, _, _ in messages:
+        count += 1
+        last_ms = offset_ms
+        topics[topic] = topics.get(topic, 0) + 1
+    return {"start_ms": header.get("start_ms"), "messages": count,
+            "span_sec": round(last_ms / 1000, 1), "topics": topics}
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Replay or convert SmartQuail MQTT captures")
+    sub = parser.add_subparsers(dest="command", required=True)
+    p = sub.add_parser("replay", help="publish a capture to a broker")
+    p.add_argument("capture")
+    p.add_argument("--speed", type=float, default=1.0, help="1 = real time, 10 = 10x, 0 = as fast as possible")
+    p.add_argument("--broker", default="127.0.0.1")
+    p.add_argument("--port", type=int, default=1883)
+    p.add_argument("--retime", action="store_true", help="rewrite payload ts to the replay schedule")
+    p.add_argument("--limit", type=int, default=None, help="stop after this many messages")
+    p = sub.add_parser("from-csv", help="convert an export_to_csv dump into a capture")
+    p.add_argument("csv")
+    p.add_argument("capture")
+    p.add_argument("--topic", default=config.MQTT_TOPIC)
+    p = sub.add_parser("info", help="summarize a capture")
+    p.add_argument("capture")
+    args = parser.parse_args()
+
+    if args.command == "replay":
+        speed = f"{args.speed:g}x" if args.speed > 0 else "max speed"
+        print(f"[▶️] Replaying {args.capture} → {args.broker}:{args.port} at {speed}")
+        try:
+            print(json.dumps(replay(args.capture, args.speed, args.broker, args.port, args.retime, args.limit)))
+        except KeyboardInterrupt:
+            print("\n[👋] Stopped.")
+    elif args.command == "from-csv":
+        print(f"[✅] Wrote {csv_to_capture(args.csv, args.capture, args.topic)} messages to {args.capture}")
+    else:
+        print(json.dumps(summarize(args.capture), indent=2))
@@ -0,0 +1,187 @@
+"""
+SmartQuail Window Statistics
+============================
+Any-window avg/min/max from memory, synced from the minute rollups
+
+Each device keeps one bucket per minute (the same shape as
+sensor_rollup_1m), pulled by the dashboard every REFRESH_INTERVAL
+(database._sync_stats), with:
+- prefix sums of n, temp/rh/thi sums and relay_on -> window sum/avg in O(1)
+- an appendable sparse table per metric for min and max -> O(1) range query
+- a sorted list of bucket minutes -> window start by binary search, O(log n)
+
+Appending a bucket, or updating the newest one while its minute is still
+filling, costs O(log n). Buckets older than the capacity are dropped by an
+occasional rebuild, so memory stays bounded.
+"""
+
+import bisect
+import threading
+import time
+from typing import Any, Callable, Dict, List, Optional, TYPE_CHECKING
+
+if TYPE_CHECKING:
+    import pandas as pd
+
+METRICS = ("temp", "rh", "thi")
+
+
+class _SparseTable:
+    """Range min or max with O(log n) append/update-last and O(1) query"""
+
+    __slots__ = ("op", "levels")
+
+    def __init__(self, op: Callable[[float, float], float]):
+        self.op = op
+        self.levels: List[List[float]] = [[]]
+
+    def append(self, value: float):
+        self.levels[0].append(value)
+        self._refresh_last(new=True)
+
+    def set_last(self, value: float):
+        self.levels[0][-1] = value
+        self._refresh_last(new=False)
+
+    def _refresh_last(self, new: bool):
+        # Only one entry per level covers the newest element: the one ending at it
+        m = len(self.levels[0]) - 1
+        k = 1
+        while (1 << k) <= m + 1:
+            if k == len(self.levels):
+                self.levels.append([])
+            below, half = self.levels[k - 1], 1 << (k - 1)
+            j = m - (1 << k) + 1
+            value = self.op(below[j], below[j + half])
+            if new:
+                self.levels[k].append(value)
+            else:
+                self.levels[k][j] = value
+            k += 1
+
+    def query(self, lo: int, hi: int) -> float:
+        """op over elements lo..hi inclusive"""
+        k = (hi - lo + 1).bit_length() - 1
+        row = self.levels[k]
+        return self.op(row[lo], row[hi - (1 << k) + 1])
+
+
+class _DeviceSeries:
+    """Minute buckets for one device with prefix sums and min/max tables"""
+
+    def __init__(self):
+        self.minutes: List[int] = []
+        self.n = [0]
+        self.relay_on = [0]
+        self.sums = {m: [0.0] for m in METRICS}
+        self.mins = {m: _SparseTable(min) for m in METRICS}
+        self.maxs = {m: _SparseTable(max) for m in METRICS}
+
+    def put(self, bucket: Dict[str, Any]):
+        """Append a bucket, or replace the newest one if it is the same minute"""
+        minute = bucket["minute"]
+        if self.minutes and minute < self.minutes[-1]:
+            return  # late bucket for an older minute; rollups stay authoritative
+        if self.minutes and minute == self.minutes[-1]:
+            self.n[-1] = self.n[-2] + bucket["n"]
+            self.relay_on[-1] = self.relay_on[-2] + bucket["relay_on"]
+            for m in METRICS:
+                self.sums[m][-1] = self.sums[m][-2] + bucket[f"{m}_sum"]
+                self.mins[m].set_last(bucket[f"{m}_min"])
+                self.maxs[m].set_last(bucket[f"{m}_max"])
+        else:
+            self.minutes.append(minute)
+            self.n.append(self.n[-1] + bucket["n"])
+            self.relay_on.append(self.relay_on[-1] + bucket["relay_on"])
+            for m in METRICS:
+                self.sums[m].append(self.sums[m][-1] + bucket[f"{m}_sum"])
+                self.mins[m].append(bucket[f"{m}_min"])
+                self.maxs[m].append(bucket[f"{m}_max"])
+
+    def window(self, lo_minute: int) -> Optional[Dict[str, Any]]:
+        lo = bisect.bisect_left(self.minutes, lo_minute)
+        hi = len(self.minutes) - 1
+        if lo > hi:
+            return None
+        n = self.n[hi + 1] - self.n[lo]
+        if n <= 0:
+            return None
+        stats = {
+            m: {
+                "avg": round((self.sums[m][hi + 1] - self.sums[m][lo]) / n, 1),
+                "min": round(self.mins[m].query(lo, hi), 1),
+                "max": round(self.maxs[m].query(lo, hi), 1),
+            }
+            for m in METRICS
+        }
+        stats["relay_on_count"] = self.relay_on[hi + 1] - self.relay_on[lo]
+        stats["data_points"] = n
+        return stats
+
+    def buckets_since(self, lo_minute: int) -> List[Dict[str, Any]]:
+        """Rebuild raw buckets (used when compacting)"""
+        out = []
+        for i in range(bisect.bisect_left(self.minutes, lo_minute), len(self.minutes)):
+            bucket = {"minute": self.minutes[i], "n": self.n[i + 1] - self.n[i],
+                      "relay_on": self.relay_on[i + 1] - self.relay_on[i]}
+            for m in METRICS:
+                bucket[f"{m}_sum"] = self.sums[m][i + 1] - self.sums[m][i]
+                bucket[f"{m}_min"] = self.mins[m].levels[0][i]
+                bucket[f"{m}_max"] = self.maxs[m].levels[0][i]
+            out.append(bucket)
+        return out
+
+
+class WindowStatsService:
+    """Per-device minute series answering any window up to capacity_minutes"""
+
+    def __init__(self, capacity_minutes: int = 72 * 60):
+        self.capacity = capacity_minutes
+        self._series: Dict[str, _DeviceSeries] = {}
+        self._lock = threading.Lock()
+
+    def has(self, device: str) -> bool:
+        series = self._series.get(device)
+        return series is not None and bool(series.minutes)
+
+    def last_minute(self, device: str) -> Optional[int]:
+        series = self._series.get(device)
+        return series.minutes[-1] if series is not None and series.minutes else None
+
+    def load_rollups(self, device: str, rollups: "pd.DataFrame"):
+        """Append/replace buckets from sensor_rollup_1m rows (bucket, n, *_sum, *_min, *_max, relay_on)"""
+        if rollups is None or rollups.empty:
+            return
+        import pandas as pd
+
+        frame = rollups.sort_values("bucket")
+        minutes = pd.to_datetime(frame["bucket"], utc=True).to_numpy(dtype="datetime64[m]").astype("int64")
+        columns = ["n", "relay_on"] + [f"{m}_{a}" for m in METRICS for a in ("sum", "min", "max")]
+        values = {c: frame[c].astype(float).tolist() for c in columns}
+        with self._lock:
+            series = self._series.setdefault(device, _DeviceSeries())
+            for i, minute in enumerate(minutes.tolist()):
+                bucket = {c: values[c][i] for c in columns}
+                bucket["minute"] = minute
+                bucket["n"] = int(bucket["n"])
+                bucket["relay_on"] = int(bucket["relay_on"])
+                series.put(bucket)
+            self._compact(device)
+
+    def stats(self, device: str, hours: float, now: Optional[float] = None) -> Optional[Dict[str, Any]]:
+        """get_statistics-shaped dict for the last `hours`, None if no data in the window"""
+        now = time.time() if now is None else now
+        lo_minute = int(now // 60) - int(hours * 60) + 1
+        with self._lock:
+            series = self._series.get(device)
+            return series.window(lo_minute) if series is not None else None
+
+    def _compact(self, device: str):
+        # Rebuild from the newest `capacity` minutes once the series doubles
+        series = self._series[device]
+        if len(series.minutes) <= 2 * self.capacity:
+            return
+        fresh = _DeviceSeries()
+        for bucket in series.buckets_since(series.minutes[-1] - self.capacity + 1):
+            fresh.put(bucket)
+        self._series[device] = fresh
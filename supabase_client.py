@@ -1,30 +1,41 @@
 """
 SmartQuail - Supabase client for storing and fetching IoT readings.
-Table: readings (id, device, temp, rh, thi, relay, status, created_at)
+Table: readings (id, device, temp, rh, thi, relay, status, sampled_ms, created_at)
+sampled_ms is the sample time as epoch milliseconds; reads order and
+filter on it so charts need no date-string parsing.
 Create table in Supabase SQL Editor (see README).
 """
 
 import os
-from datetime import datetime, timedelta
+import threading
+import time
 from typing import Optional
 
-try:
-    from supabase import create_client, Client
-except ImportError:
-    create_client = None
-    Client = None
-
 from config import SUPABASE_URL, SUPABASE_KEY, HISTORY_HOURS
 
+_client = None
+_client_lock = threading.Lock()
+
 
 def get_client() -> Optional["Client"]:
-    if not create_client or not SUPABASE_URL or not SUPABASE_KEY:
+    """Shared client, created on first use (supabase is imported lazily)."""
+    global _client
+    if not SUPABASE_URL or not SUPABASE_KEY:
         return None
-    return create_client(SUPABASE_URL, SUPABASE_KEY)
+    if _client is None:
+        with _client_lock:
+            if _client is None:
+                try:
+                    from supabase import create_client
+                except ImportError:
+                    return None
+                _client = create_client(SUPABASE_URL, SUPABASE_KEY)
+    return _client
 
 
-def insert_reading(device: str, temp: float, rh: float, thi: float, relay: str, status: str) -> bool:
-    """Insert one reading. Returns True if success."""
+def insert_reading(device: str, temp: float, rh: float, thi: float, relay: str, status: str,
+                   sampled_ms: Optional[int] = None) -> bool:
+    """Insert one reading (sampled_ms defaults to now). Returns True if success."""
     client = get_client()
     if not client:
         return False
@@ -36,6 +47,7 @@ def insert_reading(device: str, temp: float, rh: float, thi: float, relay: str,
             "thi": round(thi, 1),
             "relay": relay,
             "status": status,
+            "sampled_ms": sampled_ms or int(time.time() * 1000),
         }).execute()
         return True
     except Exception:
@@ -48,13 +60,13 @@ def get_latest_reading(device: str = "esp32-01"):
     if not client:
         return None
     try:
-        since = (datetime.utcnow() - timedelta(hours=HISTORY_HOURS)).isoformat()
+        since_ms = int((time.time() - HISTORY_HOURS * 3600) * 1000)
         r = (
             client.table("readings")
             .select("*")
             .eq("device", device)
-            .gte("created_at", since)
-            .order("created_at", desc=True)
+            .gte("sampled_ms", since_ms)
+            .order("sampled_ms", desc=True)
             .limit(1)
             .execute()
         )
@@ -71,14 +83,14 @@ def get_history(device: str = "esp32-01", hours: int = None):
     if not client:
         return []
     hours = hours or HISTORY_HOURS
-    since = (datetime.utcnow() - timedelta(hours=hours)).isoformat()
+    since_ms = int((time.time() - hours * 3600) * 1000)
     try:
         r = (
             client.table("readings")
-            .select("created_at, temp, rh, thi, relay, status")
+            .select("sampled_ms, temp, rh, thi, relay, status")
             .eq("device", device)
-            .gte("created_at", since)
-            .order("created_at", desc=False)
+            .gte("sampled_ms", since_ms)
+            .order("sampled_ms", desc=False)
             .execute()
         )
         return r.data or []